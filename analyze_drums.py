@@ -1,7 +1,11 @@
 import librosa
 import numpy as np
-import json
 import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "drum-overlay-system" / "backend"))
+from separation_pipeline.trigger_stream import write_json_atomic
 
 def analyze_drum_stem(audio_path, drum_type):
     """Extract onset times and velocities from drum stem."""
@@ -38,8 +42,8 @@ drum_data = {
 output_path = os.path.join("src", "drum-data.json")
 os.makedirs("src", exist_ok=True)
 
-with open(output_path, "w") as f:
-    json.dump(drum_data, f, indent=2)
+# Readers never see a partial file
+write_json_atomic(output_path, drum_data)
 
 print(f"Analysis complete. Data saved to {output_path}")
 print(f"Stats: {len(drum_data['kick'])} kicks, {len(drum_data['snare'])} snares, {len(drum_data['hats'])} hats")
\ No newline at end of file
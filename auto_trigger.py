@@ -15,17 +15,29 @@ import os
 import sys
 import time
 import json
+import signal
+import hashlib
 import logging
+import argparse
 import subprocess
 import threading
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from http.server import HTTPServer, BaseHTTPRequestHandler
 import webbrowser
 
+# The job scheduler lives in the backend's separation_pipeline package
+sys.path.insert(0, str(Path(__file__).resolve().parent / "drum-overlay-system" / "backend"))
+from separation_pipeline.scheduler import PRIORITY_CLASSES, Job, Preempted, PriorityScheduler
+from separation_pipeline.job_queue import JobQueue
+from separation_pipeline.file_index import INDEX_NAME, FileIndex
+from separation_pipeline.manifest import file_sha256
+from separation_pipeline import TRACKS_DIR
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -37,15 +49,40 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+AUDIO_EXTENSIONS = {'.wav', '.mp3', '.flac', '.m4a', '.ogg'}
+
+def terminate_process_tree(proc: subprocess.Popen):
+    """Stop a shell-launched pipeline run together with the python process it started"""
+    if proc.poll() is not None:
+        return
+    if os.name == 'nt':
+        subprocess.run(['taskkill', '/T', '/F', '/PID', str(proc.pid)], capture_output=True)
+    else:
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
 class AudioFileHandler(FileSystemEventHandler):
     """Handles file system events for audio files"""
     
-    def __init__(self, project_root: Path):
+    def __init__(self, project_root: Path, scheduler: PriorityScheduler, queue_db: Optional[Path] = None,
+                 index: Optional[FileIndex] = None):
         self.project_root = project_root
         self.audio_workspace = project_root / "audio-workspace"
         self.frontend_public = project_root / "drum-overlay-system" / "frontend" / "public"
-        self.processing = False
+        self.scheduler = scheduler
+        # With a queue database, files go to queue_worker.py workers instead of the local scheduler
+        self.queue_db = queue_db
+        # Processed inputs, so restarts only pick up new and changed files
+        self.index = index or FileIndex(self.audio_workspace / INDEX_NAME)
+        self.watch_roots = [self.audio_workspace]
         self.last_processed_time = 0
+        # Files with a local job queued or running, so repeated events for one
+        # drop don't queue it again (the durable queue uses its dedupe_key)
+        self._pending: Dict[Path, Job] = {}
+        self._pending_lock = threading.Lock()
         
     def on_created(self, event):
         """Handle new file creation"""
@@ -53,9 +90,19 @@ class AudioFileHandler(FileSystemEventHandler):
             return
             
         file_path = Path(event.src_path)
-        if self.is_audio_file(file_path):
+        if self.is_watched_file(file_path) and self.needs_processing(file_path):
             logger.info(f"New audio file detected: {file_path.name}")
-            self.process_audio_file(file_path)
+            self.enqueue(file_path, "watched")
+    
+    def on_moved(self, event):
+        """Handle files moved or renamed into a watched folder"""
+        if event.is_directory:
+            return
+            
+        file_path = Path(event.dest_path)
+        if self.is_watched_file(file_path) and self.needs_processing(file_path):
+            logger.info(f"Audio file moved in: {file_path.name}")
+            self.enqueue(file_path, "watched")
     
     def on_modified(self, event):
         """Handle file modifications"""
@@ -63,18 +110,41 @@ class AudioFileHandler(FileSystemEventHandler):
             return
             
         file_path = Path(event.src_path)
-        if self.is_audio_file(file_path):
-            # Only process if file is complete (not being written to)
-            if self.is_file_complete(file_path):
-                current_time = time.time()
-                if current_time - self.last_processed_time > 5:  # Debounce
-                    logger.info(f"Audio file modified: {file_path.name}")
-                    self.process_audio_file(file_path)
+        if self.is_watched_file(file_path):
+            # Only process if file is complete (not being written to); metadata-only
+            # events for a file that's already done are skipped via the index
+            if self.is_file_complete(file_path) and self.needs_processing(file_path):
+                logger.info(f"Audio file modified: {file_path.name}")
+                self.enqueue(file_path, "watched")
     
     def is_audio_file(self, file_path: Path) -> bool:
         """Check if file is an audio file"""
-        audio_extensions = {'.wav', '.mp3', '.flac', '.m4a', '.ogg'}
-        return file_path.suffix.lower() in audio_extensions
+        return file_path.suffix.lower() in AUDIO_EXTENSIONS
+    
+    def is_watched_file(self, file_path: Path) -> bool:
+        """Audio files outside the per-job working directories (whose track.wav copies would loop)"""
+        return self.is_audio_file(file_path) and self.jobs_root not in file_path.resolve().parents
+    
+    @property
+    def jobs_root(self) -> Path:
+        return (self.audio_workspace / "jobs").resolve()
+    
+    def needs_processing(self, file_path: Path) -> bool:
+        try:
+            return self.index.needs_processing(file_path, file_path.stat())
+        except OSError:
+            return False
+    
+    def scan(self, roots: List[Path], recursive: bool) -> int:
+        """Queue every file under ``roots`` that is new or changed since it was last processed"""
+        start = time.time()
+        files, counts = self.index.scan(roots, AUDIO_EXTENSIONS, recursive=recursive, exclude=[self.jobs_root])
+        for audio_file in sorted(files):
+            self.enqueue(audio_file, "watched")
+        logger.info(f"🔎 Startup scan: {counts['seen']} files in {time.time() - start:.1f}s, "
+                    f"{counts['new']} new, {counts['changed']} changed, {counts['unchanged']} unchanged, "
+                    f"{counts['reused']} moved, renamed or touched copies of processed audio")
+        return len(files)
     
     def is_file_complete(self, file_path: Path) -> bool:
         """Check if file is completely written (not being modified)"""
@@ -87,25 +157,96 @@ class AudioFileHandler(FileSystemEventHandler):
         except:
             return False
     
-    def process_audio_file(self, audio_file: Path):
-        """Process an audio file through the pipeline"""
-        if self.processing:
-            logger.warning("Processing already in progress, skipping...")
-            return
-            
-        self.processing = True
+    def enqueue(self, audio_file: Path, priority: str) -> Dict:
+        """Queue a file for processing in the given priority class"""
+        if self.queue_db is not None:
+            return self.enqueue_durable(audio_file, priority)
+        key = audio_file.resolve()
+        with self._pending_lock:
+            job = self._pending.get(key)
+            if job is not None:
+                logger.info(f"{audio_file.name} is already {job.state} as job #{job.id}")
+                return job.describe()
+            job = self._pending[key] = self.scheduler.submit(self.run_job, audio_file, priority=priority,
+                                                             name=audio_file.name)
+        logger.info(f"Queued {audio_file.name} as {priority} job #{job.id}")
+        return job.describe()
+    
+    def run_job(self, job, audio_file: Path):
+        """Scheduler entry point: process the file, then let it be queued again"""
+        try:
+            result = self.process_audio_file(job, audio_file)
+        except BaseException as e:
+            if not (isinstance(e, Preempted) or job.preempt_requested):
+                self._forget(audio_file)
+            raise  # A preempted job goes back to the scheduler's queue and stays pending
+        self._forget(audio_file)
+        # Events during the run were skipped; catch an edit made while it ran
+        if self.needs_processing(audio_file):
+            logger.info(f"{audio_file.name} changed while it was processed; queueing it again")
+            self.enqueue(audio_file, job.priority)
+        return result
+    
+    def _forget(self, audio_file: Path):
+        with self._pending_lock:
+            self._pending.pop(audio_file.resolve(), None)
+    
+    def enqueue_durable(self, audio_file: Path, priority: str) -> Dict:
+        """Add a process_track job to the shared queue database"""
+        audio_file = audio_file.resolve()
+        st = audio_file.stat()
+        sha256 = file_sha256(audio_file)
+        args = [] if priority == "backfill" else ["--output", str(self.frontend_public / "drum-data.json")]
+        # sqlite connections are per thread, and this runs on watchdog and web server threads
+        queue = JobQueue(self.queue_db)
+        try:
+            # The same unchanged file is only queued once while a job for it is pending
+            job_id = queue.enqueue("process_track", {"audio_path": str(audio_file), "args": args},
+                                   priority=priority, dedupe_key=f"{audio_file}:{st.st_size}:{st.st_mtime_ns}")
+            job = queue.get(job_id)
+        finally:
+            queue.close()
+        # The queue owns the file from here (retries, then dead letters), and
+        # workers write into the track's content-addressed directory
+        self.index.record(audio_file, st, TRACKS_DIR / sha256[:16], sha256=sha256)
+        logger.info(f"Queued {audio_file.name} as {job['priority']} job #{job_id} in {self.queue_db}")
+        return {key: job[key] for key in ("id", "kind", "priority", "state", "attempts", "created_at")}
+    
+    def queue_stats(self) -> Optional[Dict]:
+        """Counts from the shared queue database, when one is used"""
+        if self.queue_db is None:
+            return None
+        queue = JobQueue(self.queue_db)
+        try:
+            return queue.stats()
+        finally:
+            queue.close()
+    
+    def job_dir(self, audio_file: Path) -> Path:
+        """Per-file working directory, so queued jobs don't share track.wav or checkpoints"""
+        key = hashlib.sha1(str(audio_file.resolve()).encode()).hexdigest()[:8]
+        return self.audio_workspace / "jobs" / f"{audio_file.stem}-{key}"
+    
+    def process_audio_file(self, job, audio_file: Path):
+        """Process an audio file through the pipeline (runs on a scheduler worker)"""
+        # Backfill results stay in the job directory; everything else goes live
+        publish = job.priority != "backfill"
+        work_dir = self.job_dir(audio_file)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        # Taken before processing, so edits made during the run are seen as changes
+        source_stat = audio_file.stat()
         try:
             logger.info("=" * 60)
-            logger.info(f"PROCESSING: {audio_file.name}")
+            logger.info(f"PROCESSING ({job.priority}): {audio_file.name}")
             logger.info("=" * 60)
             
-            # Step 1: Copy audio file to workspace
-            target_file = self.audio_workspace / "track.wav"
+            # Step 1: Copy audio file to the job's working directory
+            target_file = work_dir / "track.wav"
             if audio_file.suffix.lower() != '.wav':
                 # Convert to WAV if needed
                 logger.info("Converting audio file to WAV format...")
                 subprocess.run([
-                    'ffmpeg', '-i', str(audio_file), str(target_file)
+                    'ffmpeg', '-y', '-i', str(audio_file), str(target_file)
                 ], check=True, capture_output=True)
             else:
                 # Copy WAV file directly
@@ -115,54 +256,68 @@ class AudioFileHandler(FileSystemEventHandler):
             # Step 2: Run audio processing
             logger.info("Running drum analysis...")
             backend_dir = self.project_root / "drum-overlay-system" / "backend"
-            audio_workspace_dir = self.audio_workspace
+            process_track = self.audio_workspace / "process_track.py"
             
-            # Activate virtual environment and run processing
+            # Activate virtual environment and run processing. The pipeline
+            # publishes straight into the frontend: early hits stream to
+            # drum-data.partial.jsonl and drum-data.json is swapped in
+            # atomically, so clients never read a half-copied file.
+            drum_data_dest = self.frontend_public / "drum-data.json" if publish else work_dir / "drum-data.json"
             if os.name == 'nt':  # Windows
                 activate_script = backend_dir / "venv" / "Scripts" / "activate.bat"
-                cmd = f'cd /d "{backend_dir}" && call "{activate_script}" && cd /d "{audio_workspace_dir}" && python process_track.py track.wav'
+                cmd = f'cd /d "{backend_dir}" && call "{activate_script}" && cd /d "{work_dir}" && python "{process_track}" track.wav --output "{drum_data_dest}"'
+                popen_kwargs = {}
             else:  # Unix/Linux/Mac
                 activate_script = backend_dir / "venv" / "bin" / "activate"
-                cmd = f'cd "{backend_dir}" && source "{activate_script}" && cd "{audio_workspace_dir}" && python process_track.py track.wav'
+                cmd = f'cd "{backend_dir}" && . "{activate_script}" && cd "{work_dir}" && python "{process_track}" track.wav --output "{drum_data_dest}"'
+                popen_kwargs = {"start_new_session": True}  # own process group, so preemption stops python too
+            
+            proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    text=True, **popen_kwargs)
+            job.on_preempt(lambda: terminate_process_tree(proc))
+            try:
+                _, stderr = proc.communicate()
+            finally:
+                job.on_preempt(None)
             
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+            if job.preempt_requested:
+                logger.info(f"⏸ {audio_file.name} preempted by higher-priority work; it will resume from its checkpoints")
+                raise Preempted(audio_file.name)
             
-            if result.returncode != 0:
-                logger.error(f"Audio processing failed: {result.stderr}")
-                return
+            if proc.returncode != 0:
+                logger.error(f"Audio processing failed: {stderr}")
+                raise RuntimeError(f"process_track.py failed for {audio_file.name}")
             
             logger.info("Audio processing completed successfully")
             
-            # Step 3: Copy drum data to frontend
-            drum_data_src = self.audio_workspace / "drum-data.json"
-            drum_data_dest = self.frontend_public / "drum-data.json"
-            
-            if drum_data_src.exists():
-                import shutil
-                shutil.copy2(drum_data_src, drum_data_dest)
-                logger.info("Copied drum data to frontend")
+            # Step 3: Confirm drum data was published
+            if drum_data_dest.exists():
+                logger.info(f"Drum data published to {'frontend' if publish else drum_data_dest}")
             else:
                 logger.error("Drum data file not found after processing")
-                return
+                raise RuntimeError(f"No drum data produced for {audio_file.name}")
             
-            # Step 4: Update timestamp
+            # Step 4: Update timestamp and the processed-file index
             self.last_processed_time = time.time()
+            self.index.record(audio_file, source_stat, work_dir)
             
             logger.info("✅ Processing complete!")
-            logger.info(f"   Kicks: {self.get_hit_count('kicks')}")
-            logger.info(f"   Snares: {self.get_hit_count('snares')}")
-            logger.info(f"   Hats: {self.get_hit_count('hats')}")
+            logger.info(f"   Kicks: {self.get_hit_count('kick', drum_data_dest)}")
+            logger.info(f"   Snares: {self.get_hit_count('snare', drum_data_dest)}")
+            logger.info(f"   Hats: {self.get_hit_count('hats', drum_data_dest)}")
             logger.info("=" * 60)
+            return str(drum_data_dest)
             
+        except Preempted:
+            raise
         except Exception as e:
             logger.error(f"Error processing audio file: {e}")
-        finally:
-            self.processing = False
+            raise
     
-    def get_hit_count(self, hit_type: str) -> int:
+    def get_hit_count(self, hit_type: str, drum_data_file: Optional[Path] = None) -> int:
         """Get hit count from drum data"""
         try:
-            drum_data_file = self.frontend_public / "drum-data.json"
+            drum_data_file = drum_data_file or self.frontend_public / "drum-data.json"
             if drum_data_file.exists():
                 with open(drum_data_file, 'r') as f:
                     data = json.load(f)
@@ -172,21 +327,53 @@ class AudioFileHandler(FileSystemEventHandler):
         return 0
 
 
+def read_partial_progress(partial_file: Path) -> Optional[Dict]:
+    """Summarize an in-progress drum-data.partial.jsonl stream, or None when no run is in flight"""
+    if not partial_file.exists():
+        return None
+    
+    progress = {"state": "processing", "stats": {"kicks": 0, "snares": 0, "hats": 0}, "until": {}}
+    keys = {"kick": "kicks", "snare": "snares", "hats": "hats"}
+    try:
+        with open(partial_file, 'r') as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # Line still being written
+                record = json.loads(line)
+                if record["type"] == "hits":
+                    drum = record["drum"]
+                    if drum in keys:
+                        progress["stats"][keys[drum]] += len(record["hits"])
+                    progress["until"][drum] = record["until"]
+                elif record["type"] in ("complete", "failed"):
+                    progress["state"] = record["type"]
+                    progress["reason"] = record.get("reason")
+    except (OSError, ValueError, KeyError):
+        pass
+    return progress
+
+
 class AutoTriggerServer(BaseHTTPRequestHandler):
     """HTTP server for manual triggering and status"""
     
-    def __init__(self, project_root: Path, *args, **kwargs):
+    def __init__(self, project_root: Path, handler: AudioFileHandler, *args, **kwargs):
         self.project_root = project_root
+        self.handler = handler
         super().__init__(*args, **kwargs)
     
     def do_GET(self):
         """Handle GET requests"""
-        if self.path == '/':
+        url = urlparse(self.path)
+        if url.path == '/':
             self.send_html_response()
-        elif self.path == '/status':
+        elif url.path == '/status':
             self.send_json_response()
-        elif self.path == '/trigger':
+        elif url.path == '/trigger':
             self.trigger_processing()
+        elif url.path == '/enqueue':
+            self.enqueue_file(parse_qs(url.query))
+        elif url.path == '/density':
+            self.send_density(parse_qs(url.query))
         else:
             self.send_error(404)
     
@@ -214,6 +401,7 @@ class AutoTriggerServer(BaseHTTPRequestHandler):
                 .stat-card {{ background: #ecf0f1; padding: 15px; border-radius: 8px; text-align: center; }}
                 .stat-value {{ font-size: 24px; font-weight: bold; color: #2c3e50; }}
                 .stat-label {{ color: #7f8c8d; font-size: 14px; }}
+                .density {{ width: 100%; height: 120px; background: #ecf0f1; border-radius: 8px; margin: 20px 0; cursor: grab; }}
                 .log {{ background: #2c3e50; color: #ecf0f1; padding: 15px; border-radius: 8px; font-family: monospace; white-space: pre-wrap; }}
             </style>
         </head>
@@ -237,6 +425,9 @@ class AutoTriggerServer(BaseHTTPRequestHandler):
                 <!-- Stats will be loaded here -->
             </div>
             
+            <!-- Hit density of the published track: wheel to zoom, drag to scrub, double-click to reset -->
+            <canvas class="density" id="density-canvas" width="760" height="120"></canvas>
+            
             <div class="log" id="log-container">
                 <!-- Log will be loaded here -->
             </div>
@@ -250,30 +441,102 @@ class AutoTriggerServer(BaseHTTPRequestHandler):
                             const statsContainer = document.getElementById('stats-container');
                             
                             statusContainer.innerHTML = `
-                                <div class="status ${data.running ? 'running' : 'stopped'}">
-                                    <h3>Status: ${data.running ? '🟢 Running' : '🔴 Stopped'}</h3>
-                                    <p>Monitoring: ${data.watch_path}</p>
-                                    <p>Last Update: ${data.last_update}</p>
+                                <div class="status ${{data.running ? 'running' : 'stopped'}}">
+                                    <h3>Status: ${{data.running ? '🟢 Running' : '🔴 Stopped'}}</h3>
+                                    <p>Monitoring: ${{data.watch_path}}</p>
+                                    <p>Last Update: ${{data.last_update}}</p>
+                                    ${{data.partial ? `<p>Current run: ${{data.partial.state}}, ${{data.partial.stats.kicks}} kicks / ${{data.partial.stats.snares}} snares / ${{data.partial.stats.hats}} hats so far</p>` : ''}}
+                                    ${{Object.entries(data.queues.classes).map(([name, q]) => `<p>${{name}}: ${{q.running.length}} running, ${{q.queued}} queued, wait avg ${{q.wait_seconds.mean.toFixed(1)}}s / p95 ${{q.wait_seconds.p95.toFixed(1)}}s</p>`).join('')}}
+                                    ${{data.job_queue ? Object.entries(data.job_queue.classes).map(([name, q]) => `<p>shared queue ${{name}}: ${{q.leased}} running, ${{q.queued}} queued, ${{q.dead}} dead</p>`).join('') : ''}}
                                 </div>
                             `;
                             
                             statsContainer.innerHTML = `
                                 <div class="stat-card">
-                                    <div class="stat-value">${data.stats.kicks}</div>
+                                    <div class="stat-value">${{data.stats.kicks}}</div>
                                     <div class="stat-label">Kick Hits</div>
                                 </div>
                                 <div class="stat-card">
-                                    <div class="stat-value">${data.stats.snares}</div>
+                                    <div class="stat-value">${{data.stats.snares}}</div>
                                     <div class="stat-label">Snare Hits</div>
                                 </div>
                                 <div class="stat-card">
-                                    <div class="stat-value">${data.stats.hats}</div>
+                                    <div class="stat-value">${{data.stats.hats}}</div>
                                     <div class="stat-label">Hat Hits</div>
                                 </div>
                             `;
                         }});
                 }}
                 
+                // Bins come from the server's density pyramid, one per pixel,
+                // so redraws cost the same for a two-hour set as for a song
+                const densityView = {{ start: 0, end: null, shown: null }};
+                const densityColors = {{ kick: '231, 76, 60', snare: '52, 152, 219', hats: '241, 196, 15' }};
+                
+                function loadDensity() {{
+                    const canvas = document.getElementById('density-canvas');
+                    const params = new URLSearchParams({{ start: densityView.start, bins: canvas.width }});
+                    if (densityView.end !== null) params.set('end', densityView.end);
+                    fetch('/density?' + params)
+                        .then(r => r.ok ? r.json() : null)
+                        .then(data => {{
+                            densityView.shown = data;
+                            const ctx = canvas.getContext('2d');
+                            ctx.clearRect(0, 0, canvas.width, canvas.height);
+                            if (!data) return;
+                            const drums = Object.keys(data.drums);
+                            const rowHeight = canvas.height / Math.max(drums.length, 1);
+                            const binWidth = canvas.width / data.bins;
+                            drums.forEach((drum, row) => {{
+                                const counts = data.drums[drum].count;
+                                const peak = Math.max(1, ...counts);
+                                counts.forEach((count, i) => {{
+                                    if (!count) return;
+                                    const height = (count / peak) * (rowHeight - 2);
+                                    const alpha = 0.3 + 0.7 * data.drums[drum].mean_velocity[i];
+                                    ctx.fillStyle = `rgba(${{densityColors[drum] || '44, 62, 80'}}, ${{alpha}})`;
+                                    ctx.fillRect(i * binWidth, (row + 1) * rowHeight - height, Math.max(binWidth, 1), height);
+                                }});
+                            }});
+                        }});
+                }}
+                
+                function setupDensityControls() {{
+                    const canvas = document.getElementById('density-canvas');
+                    // Zoom and scrub from the requested view, not the last response,
+                    // so quick gestures don't jump while fetches are in flight
+                    const currentView = () => {{
+                        const end = densityView.end !== null ? densityView.end : densityView.shown.end;
+                        return {{ start: densityView.start, span: end - densityView.start }};
+                    }};
+                    canvas.addEventListener('wheel', event => {{
+                        if (!densityView.shown) return;
+                        event.preventDefault();
+                        const view = currentView();
+                        const anchor = view.start + (event.offsetX / canvas.clientWidth) * view.span;
+                        const scale = event.deltaY > 0 ? 1.25 : 0.8;
+                        densityView.start = Math.max(0, anchor - (anchor - view.start) * scale);
+                        densityView.end = densityView.start + Math.max(1, view.span * scale);
+                        loadDensity();
+                    }});
+                    let dragFrom = null;
+                    canvas.addEventListener('mousedown', event => {{ dragFrom = densityView.shown ? event.offsetX : null; }});
+                    window.addEventListener('mouseup', () => {{ dragFrom = null; }});
+                    canvas.addEventListener('mousemove', event => {{
+                        if (dragFrom === null) return;
+                        const view = currentView();
+                        densityView.start = Math.max(0, view.start + (dragFrom - event.offsetX) / canvas.clientWidth * view.span);
+                        densityView.end = densityView.start + view.span;
+                        dragFrom = event.offsetX;
+                        loadDensity();
+                    }});
+                    canvas.addEventListener('dblclick', () => {{
+                        densityView.start = 0;
+                        densityView.end = null;
+                        loadDensity();
+                    }});
+                }}
+                
                 function loadLog() {{
                     fetch('/log')
                         .then(r => r.text())
@@ -305,10 +568,13 @@ class AutoTriggerServer(BaseHTTPRequestHandler):
                 // Auto-refresh every 5 seconds
                 setInterval(loadStatus, 5000);
                 setInterval(loadLog, 10000);
+                setInterval(loadDensity, 5000);
                 
                 // Initial load
                 loadStatus();
                 loadLog();
+                setupDensityControls();
+                loadDensity();
             </script>
         </body>
         </html>
@@ -333,8 +599,8 @@ class AutoTriggerServer(BaseHTTPRequestHandler):
                 with open(drum_data_file, 'r') as f:
                     data = json.load(f)
                     stats = {
-                        "kicks": len(data.get("kicks", [])),
-                        "snares": len(data.get("snares", [])),
+                        "kicks": len(data.get("kick", [])),
+                        "snares": len(data.get("snare", [])),
                         "hats": len(data.get("hats", []))
                     }
             except:
@@ -342,9 +608,12 @@ class AutoTriggerServer(BaseHTTPRequestHandler):
         
         status_data = {
             "running": True,
-            "watch_path": str(self.project_root / "audio-workspace"),
+            "watch_path": ", ".join(str(root) for root in self.handler.watch_roots),
             "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "stats": stats
+            "stats": stats,
+            "partial": read_partial_progress(frontend_public / "drum-data.partial.jsonl"),
+            "queues": self.handler.scheduler.stats(),
+            "job_queue": self.handler.queue_stats()
         }
         
         self.send_response(200)
@@ -362,10 +631,72 @@ class AutoTriggerServer(BaseHTTPRequestHandler):
         self.send_header('Content-type', 'application/json')
         self.end_headers()
         self.wfile.write(json.dumps(response).encode())
+    
+    def send_density(self, query: Dict[str, List[str]]):
+        """Hit density of the published drum data: /density?start=0&end=7200&bins=760 (seconds)"""
+        # numpy is only needed here, so the watcher itself runs on just watchdog
+        try:
+            from separation_pipeline import density
+        except ImportError as e:
+            self.send_response(503)
+            self.send_header('Content-type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({"message": f"Hit density needs numpy: {e}"}).encode())
+            return
+        
+        frontend_public = self.project_root / "drum-overlay-system" / "frontend" / "public"
+        pyramid = density.pyramid_for(frontend_public / "drum-data.json")
+        try:
+            if pyramid is None:
+                status, response = 404, {"message": "No drum data published yet"}
+            else:
+                end = query.get('end', [None])[0]
+                response = density.query(pyramid, float(query.get('start', ['0'])[0]),
+                                          None if end is None else float(end),
+                                          int(query.get('bins', [density.DEFAULT_BINS])[0]))
+                status = 200
+        except ValueError as e:
+            status, response = 400, {"message": str(e)}
+        
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(response).encode())
+    
+    def enqueue_file(self, query: Dict[str, List[str]]):
+        """Queue a file by path: /enqueue?path=...&priority=interactive"""
+        path = Path(query.get('path', [''])[0])
+        priority = query.get('priority', ['interactive'])[0]
+        if not path.is_file() or priority not in PRIORITY_CLASSES:
+            status, response = 400, {"message": f"Need an existing file and a priority in {', '.join(PRIORITY_CLASSES)}"}
+        else:
+            job = self.handler.enqueue(path, priority)
+            status, response = 200, {"message": f"Queued {path.name} as {priority} job #{job['id']}", "job": job}
+        
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(response).encode())
 
 
 def main():
     """Main function to start the auto trigger system"""
+    parser = argparse.ArgumentParser(description="Watch audio-workspace and process new audio files.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="pipeline runs at a time across all priority classes (default: %(default)s)")
+    parser.add_argument("--backfill", nargs="+", default=[], metavar="DIR",
+                        help="queue every audio file under these folders as low-priority backfill")
+    parser.add_argument("--watch", type=Path, action="append", metavar="DIR",
+                        help="folder to watch; repeat for several (default: audio-workspace)")
+    parser.add_argument("--recursive", action="store_true",
+                        help="also watch and scan subfolders of the watched folders")
+    parser.add_argument("--no-scan", action="store_true",
+                        help="skip the startup scan for files added or changed while stopped")
+    parser.add_argument("--queue-db", type=Path, metavar="PATH",
+                        help="send jobs to this shared queue database for queue_worker.py workers "
+                             "instead of processing them here")
+    args = parser.parse_args()
+    
     project_root = Path(__file__).parent.absolute()
     logger.info(f"Starting Auto Trigger System in: {project_root}")
     
@@ -381,21 +712,37 @@ def main():
         logger.error(f"Frontend public directory not found: {frontend_public}")
         return
     
+    # Interactive requests jump ahead of watched drops, which jump ahead of
+    # backfill; running backfill is preempted when nothing else is free.
+    scheduler = PriorityScheduler(max_workers=args.workers)
+    
     # Start file system monitoring
-    event_handler = AudioFileHandler(project_root)
+    event_handler = AudioFileHandler(project_root, scheduler, args.queue_db)
+    watch_roots = event_handler.watch_roots = [root.resolve() for root in args.watch or [audio_workspace]]
     observer = Observer()
-    observer.schedule(event_handler, str(audio_workspace), recursive=False)
+    for root in watch_roots:
+        observer.schedule(event_handler, str(root), recursive=args.recursive)
+        logger.info(f"📁 Monitoring directory: {root}{' (recursive)' if args.recursive else ''}")
     observer.start()
     
-    logger.info(f"📁 Monitoring directory: {audio_workspace}")
+    # Watch first, then scan: a file arriving mid-scan is caught by one or the other
+    if not args.no_scan:
+        event_handler.scan(watch_roots, args.recursive)
+    
     logger.info("🚀 Auto trigger system started!")
-    logger.info("💡 Drop audio files into the audio-workspace folder to process them automatically")
+    logger.info("💡 Drop audio files into the watched folders to process them automatically")
+    
+    for backfill_dir in args.backfill:
+        files = sorted(p for p in Path(backfill_dir).rglob('*') if p.is_file() and event_handler.is_audio_file(p))
+        for audio_file in files:
+            event_handler.enqueue(audio_file, "backfill")
+        logger.info(f"📚 Queued {len(files)} backfill files from {backfill_dir}")
     
     # Start web server for status monitoring
     def run_server():
         try:
             server_address = ('', 8080)
-            httpd = HTTPServer(server_address, lambda *args, **kwargs: AutoTriggerServer(project_root, *args, **kwargs))
+            httpd = HTTPServer(server_address, lambda *args, **kwargs: AutoTriggerServer(project_root, event_handler, *args, **kwargs))
             logger.info("🌐 Web interface available at: http://localhost:8080")
             webbrowser.open('http://localhost:8080')
             httpd.serve_forever()
@@ -414,6 +761,7 @@ def main():
     except KeyboardInterrupt:
         logger.info("🛑 Stopping auto trigger system...")
         observer.stop()
+        scheduler.shutdown(wait=False)
     
     observer.join()
     logger.info("✅ Auto trigger system stopped")
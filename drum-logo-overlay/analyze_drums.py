@@ -1,34 +1,45 @@
-import librosa
 import numpy as np
-import json
 import sys
-import os
-from scipy.signal import butter, lfilter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "drum-overlay-system" / "backend"))
+from separation_pipeline.trigger_stream import write_json_atomic
+
+# librosa and scipy are imported where they're used so that usage errors
+# return immediately.
 
 def butter_lowpass(cutoff, fs, order=5):
+    from scipy.signal import butter
+    
     nyq = 0.5 * fs
     normal_cutoff = cutoff / nyq
-    b, a = butter(order, normal_cutoff, btype='low', analog=False)
-    return b, a
+    return butter(order, normal_cutoff, btype='low', analog=False, output='sos')
 
 def butter_highpass(cutoff, fs, order=5):
+    from scipy.signal import butter
+    
     nyq = 0.5 * fs
     normal_cutoff = cutoff / nyq
-    b, a = butter(order, normal_cutoff, btype='high', analog=False)
-    return b, a
+    return butter(order, normal_cutoff, btype='high', analog=False, output='sos')
 
 def butter_bandpass(lowcut, highcut, fs, order=5):
+    from scipy.signal import butter
+    
     nyq = 0.5 * fs
     low = lowcut / nyq
     high = highcut / nyq
-    b, a = butter(order, [low, high], btype='band')
-    return b, a
+    return butter(order, [low, high], btype='band', output='sos')
 
-def apply_filter(data, b, a):
-    return lfilter(b, a, data)
+def apply_filter(data, sos):
+    # Second-order sections stay stable at low cutoffs where (b, a) form doesn't
+    from scipy.signal import sosfilt
+    
+    return sosfilt(sos, data)
 
 def get_drum_hits(y, sr, delta=0.05):
     """Extract onset times and velocities following the directive's logic."""
+    import librosa
+    
     onset_frames = librosa.onset.onset_detect(
         y=y, 
         sr=sr,
@@ -50,6 +61,8 @@ def get_drum_hits(y, sr, delta=0.05):
     return []
 
 def analyze_drums(input_path, output_path):
+    import librosa
+    
     print(f"Analyzing {input_path}...")
     y, sr = librosa.load(input_path, sr=44100)
     
@@ -58,16 +71,13 @@ def analyze_drums(input_path, output_path):
         y = librosa.to_mono(y)
     
     # 1. Isolate Kick (< 100Hz)
-    bk, ak = butter_lowpass(100, sr)
-    y_kick = apply_filter(y, bk, ak)
+    y_kick = apply_filter(y, butter_lowpass(100, sr))
     
     # 2. Isolate Snare (200Hz - 3kHz)
-    bs, as_ = butter_bandpass(200, 3000, sr)
-    y_snare = apply_filter(y, bs, as_)
+    y_snare = apply_filter(y, butter_bandpass(200, 3000, sr))
     
     # 3. Isolate Hats (> 5kHz)
-    bh, ah = butter_highpass(5000, sr)
-    y_hats = apply_filter(y, bh, ah)
+    y_hats = apply_filter(y, butter_highpass(5000, sr))
     
     data = {
         "kick": get_drum_hits(y_kick, sr, delta=0.1),  # Slightly higher delta for kick to avoid false positives
@@ -75,8 +85,8 @@ def analyze_drums(input_path, output_path):
         "hats": get_drum_hits(y_hats, sr, delta=0.02)   # Lower delta for hats to catch subtle hits
     }
     
-    with open(output_path, 'w') as f:
-        json.dump(data, f, indent=2)
+    # Readers never see a partial file
+    write_json_atomic(output_path, data)
     
     print(f"Analysis complete. Found {len(data['kick'])} kicks, {len(data['snare'])} snares, {len(data['hats'])} hats.")
     print(f"Data saved to {output_path}")
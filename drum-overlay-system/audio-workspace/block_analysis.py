@@ -0,0 +1,134 @@
+"""
+Block-wise band analysis for long recordings.
+
+Walks an audio file in STFT-aligned blocks instead of loading the whole track
+and materializing a full complex STFT. Only the per-frame quantities the hit
+detector needs (band onset envelope and band energy) are kept for the whole
+track, so working memory is bounded by the block size rather than the track
+length. Frames are computed exactly as ``librosa.stft(center=True)`` would, and
+the flux of the first frame of each block is taken against the last frame of
+the previous block, so the envelopes match the in-memory path.
+"""
+import numpy as np
+
+N_FFT = 2048
+HOP_LENGTH = 512
+DEFAULT_MEMORY_BUDGET_MB = 256
+
+# Onset envelopes are delayed by the flux lag plus the STFT centering offset,
+# mirroring librosa.onset.onset_strength(center=True, lag=1).
+_ENVELOPE_PAD = 1 + N_FFT // (2 * HOP_LENGTH)
+
+
+def _bytes_per_frame(n_fft=N_FFT, hop_length=HOP_LENGTH):
+    """Rough working-set cost of one STFT frame while a block is in flight."""
+    n_bins = n_fft // 2 + 1
+    # complex64 STFT + float32 magnitude + band copies + audio buffers
+    return n_bins * (8 + 4 + 4) + hop_length * 4 * 3
+
+
+def frames_for_budget(memory_budget_mb, total_frames, n_bands):
+    """Number of STFT frames per block that keeps the analysis under budget."""
+    budget = int(memory_budget_mb * 1024 * 1024)
+    # Per-track outputs: an envelope and an energy curve per band.
+    budget -= total_frames * n_bands * 2 * 4
+    block_frames = budget // _bytes_per_frame()
+    if block_frames < 64:
+        raise MemoryError(
+            f"Memory budget of {memory_budget_mb} MB is too small for "
+            f"{total_frames} frames; raise --memory-budget-mb.")
+    return int(block_frames)
+
+
+def iter_mono_blocks(path, sr, block_samples):
+    """Yield float32 mono audio at ``sr`` in consecutive chunks."""
+    import soundfile as sf
+
+    with sf.SoundFile(str(path)) as f:
+        resampler = None
+        if f.samplerate != sr:
+            import soxr
+            resampler = soxr.ResampleStream(f.samplerate, sr, 1, dtype="float32", quality="HQ")
+
+        while True:
+            data = f.read(block_samples, dtype="float32", always_2d=True)
+            last = len(data) < block_samples
+            y = data.T.mean(axis=0) if data.shape[1] > 1 else data[:, 0]
+            if resampler is not None:
+                y = resampler.resample_chunk(y, last=last)
+            yield y
+            if last:
+                return
+
+
+def _magnitude(y, n_fft, hop_length):
+    import librosa
+    return np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length, center=False))
+
+
+def iter_stft_blocks(path, sr, block_frames, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    """
+    Yield magnitude spectrogram blocks of at most ``block_frames`` frames.
+
+    Blocks are contiguous in time and together cover the same frames as
+    ``np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length))``.
+    """
+    # Zero padding at both ends reproduces librosa's center=True framing.
+    buf = np.zeros(n_fft // 2, dtype=np.float32)
+    span = (block_frames - 1) * hop_length + n_fft
+
+    for chunk in iter_mono_blocks(path, sr, block_frames * hop_length):
+        buf = np.concatenate([buf, chunk])
+        while len(buf) >= span:
+            yield _magnitude(buf[:span], n_fft, hop_length)
+            buf = buf[block_frames * hop_length:]
+
+    buf = np.concatenate([buf, np.zeros(n_fft // 2, dtype=np.float32)])
+    if len(buf) >= n_fft:
+        n_frames = 1 + (len(buf) - n_fft) // hop_length
+        yield _magnitude(buf[:(n_frames - 1) * hop_length + n_fft], n_fft, hop_length)
+
+
+def band_features(path, sr, bands, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """
+    Compute per-band onset envelopes and frame energies block by block.
+
+    ``bands`` maps a drum name to a dict with ``fmin``/``fmax``. Returns a dict
+    mapping each drum name to ``(onset_env, energy)`` float32 arrays with one
+    value per STFT frame.
+    """
+    import librosa
+    import soundfile as sf
+
+    info = sf.info(str(path))
+    est_samples = int(np.ceil(info.frames * sr / info.samplerate))
+    total_frames = 1 + est_samples // HOP_LENGTH
+    block_frames = frames_for_budget(memory_budget_mb, total_frames, len(bands))
+
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=N_FFT)
+    masks = {name: (freqs >= p["fmin"]) & (freqs <= p["fmax"]) for name, p in bands.items()}
+
+    flux = {name: [] for name in bands}
+    energy = {name: [] for name in bands}
+    prev = {name: None for name in bands}
+    n_frames = 0
+
+    for mag in iter_stft_blocks(path, sr, block_frames):
+        n_frames += mag.shape[1]
+        for name, mask in masks.items():
+            band = mag[mask, :]
+            energy[name].append(np.sqrt(np.sum(np.ascontiguousarray(band.T) ** 2, axis=1)))
+
+            if prev[name] is not None:
+                band_ext = np.concatenate([prev[name], band], axis=1)
+            else:
+                band_ext = band
+            prev[name] = band[:, -1:]
+            flux[name].append(np.mean(np.maximum(0.0, band_ext[:, 1:] - band_ext[:, :-1]), axis=0))
+
+    features = {}
+    for name in bands:
+        onset_env = np.concatenate(
+            [np.zeros(_ENVELOPE_PAD, dtype=np.float32)] + flux[name])[:n_frames]
+        features[name] = (onset_env, np.concatenate(energy[name]))
+    return features
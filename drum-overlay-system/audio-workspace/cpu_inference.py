@@ -0,0 +1,238 @@
+"""
+CPU inference settings for Demucs separation.
+
+Our servers have no GPUs, so CPU separation throughput is our capacity. A CPU
+configuration covers:
+
+- intra-op threads per process (default: the available cores divided by
+  --jobs) and torch's inter-op pool;
+- optional pinning of each worker to its own cores, so sharded workers don't
+  migrate between, and contend for, the same cores;
+- the precision the model runs at. "int8" quantizes the Linear and LSTM
+  layers dynamically (the transformer and BLSTM weights); "bf16" runs under
+  CPU autocast, which pays off on CPUs with AVX-512 BF16 or AMX.
+
+A reduced precision is only used after it has been compared with float32 on
+an excerpt: the worst per-stem signal-to-distortion ratio against the float32
+stems must reach --min-accuracy-db, otherwise the run falls back to float32.
+Verdicts are cached in precision-checks.json per model, precision and torch
+version.
+
+Every run's throughput is recorded per configuration in throughput.json
+(see quality_tiers.py). To compare configurations on this machine before
+choosing one, run:
+
+    python cpu_inference.py track.wav --precision fp32 int8 bf16 --threads 4 8 --pin
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+PRECISIONS = ("fp32", "int8", "bf16")
+DEFAULT_MIN_ACCURACY_DB = 30.0
+CHECK_SECONDS = 10.0
+CHECKS_PATH = Path(__file__).resolve().parent / "precision-checks.json"
+
+
+def cpu_config(threads=None, interop_threads=None, precision="fp32", pin=False,
+               min_accuracy_db=DEFAULT_MIN_ACCURACY_DB):
+    """A CPU configuration; None thread counts mean "work it out from the cores and --jobs"."""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {', '.join(PRECISIONS)}")
+    return {"threads": threads, "interop_threads": interop_threads, "precision": precision,
+            "pin": pin, "min_accuracy_db": min_accuracy_db}
+
+
+def config_label(config):
+    """Short name of the non-default parts of ``config``, for throughput keys and reports."""
+    if config is None:
+        return ""
+    parts = [] if config["precision"] == "fp32" else [config["precision"]]
+    if config["threads"]:
+        parts.append(f"threads={config['threads']}")
+    if config["interop_threads"]:
+        parts.append(f"interop={config['interop_threads']}")
+    if config["pin"]:
+        parts.append("pinned")
+    return ",".join(parts)
+
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def worker_threads(config, jobs=1):
+    """Intra-op threads per process for ``jobs`` processes sharing the machine."""
+    if config and config["threads"]:
+        return config["threads"]
+    return max(1, len(available_cores()) // max(1, jobs))
+
+
+def configure_process(config, jobs=1, slot=0):
+    """
+    Apply ``config``'s threading and pinning to this process; ``slot`` is the
+    worker's index among ``jobs``. Call it before the model first runs.
+    Returns the number of intra-op threads.
+    """
+    import torch as th
+
+    config = config or cpu_config()
+    threads = worker_threads(config, jobs)
+    if config["pin"]:
+        if hasattr(os, "sched_setaffinity"):
+            cores = available_cores()
+            os.sched_setaffinity(0, {cores[(slot * threads + i) % len(cores)] for i in range(threads)})
+        elif slot == 0:
+            print("      Core pinning isn't supported on this platform, ignoring --pin-cores")
+    th.set_num_threads(threads)
+    if config["interop_threads"]:
+        try:
+            th.set_num_interop_threads(config["interop_threads"])
+        except RuntimeError:
+            pass  # Only possible before the first parallel op; an earlier call won
+    return threads
+
+
+def prepare_model(model, precision):
+    """The model to run at ``precision``; int8 returns a quantized copy."""
+    if precision == "int8":
+        import torch as th
+        return th.ao.quantization.quantize_dynamic(model, {th.nn.Linear, th.nn.LSTM}, dtype=th.qint8)
+    return model
+
+
+def inference_context(precision):
+    """Context to run the model in at ``precision``."""
+    if precision == "bf16":
+        import torch as th
+        return th.autocast("cpu", dtype=th.bfloat16)
+    return contextlib.nullcontext()
+
+
+def accuracy_db(reference, candidate):
+    """Worst per-source signal-to-distortion ratio of ``candidate`` against ``reference`` (sources first)."""
+    reference = np.asarray(reference, dtype=np.float64)
+    error = reference - np.asarray(candidate, dtype=np.float64)
+    axes = tuple(range(1, reference.ndim))
+    signal = np.sum(reference ** 2, axis=axes) + 1e-12
+    noise = np.sum(error ** 2, axis=axes) + 1e-12
+    return float(np.min(10 * np.log10(signal / noise)))
+
+
+def _check_key(model_name, precision):
+    import torch as th
+    return f"{model_name}/{precision}/torch-{th.__version__}"
+
+
+def cached_check(model_name, precision, path=CHECKS_PATH):
+    """The stored accuracy check of ``precision`` for ``model_name``, or None."""
+    try:
+        with open(path) as f:
+            return json.load(f).get(_check_key(model_name, precision))
+    except (OSError, ValueError):
+        return None
+
+
+def record_check(model_name, precision, db, error=None, path=CHECKS_PATH):
+    try:
+        with open(path) as f:
+            checks = json.load(f)
+    except (OSError, ValueError):
+        checks = {}
+    verdict = {"db": db, "error": error, "checked_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+    checks[_check_key(model_name, precision)] = verdict
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(checks, f, indent=2)
+    os.replace(tmp_path, path)
+    return verdict
+
+
+def passes(verdict, config):
+    return verdict is not None and verdict["db"] is not None and verdict["db"] >= config["min_accuracy_db"]
+
+
+def _bench_config(track, tier, config, seconds):
+    """Separate an excerpt of ``track`` with ``config`` in this (fresh) process; returns (seconds, stems)."""
+    import process_track
+
+    threads = configure_process(config)
+    args = process_track.separation_args(tier, config)
+    model = process_track.load_model(args)
+    wav = process_track.read_excerpt(track, model.audio_channels, model.samplerate, seconds)
+    # One untimed pass so one-off allocations and kernel selection don't count
+    process_track.apply_separation(model, wav[:, : model.samplerate].clone(), args, progress=False)
+    started = time.perf_counter()
+    sources = process_track.apply_separation(model, wav.clone(), args, progress=False)
+    elapsed = time.perf_counter() - started
+    return elapsed, threads, sources.numpy()
+
+
+def benchmark(track, tier, configs, seconds):
+    """Separate the same excerpt with each configuration, each in its own process; prints a table."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    ctx = multiprocessing.get_context("spawn")
+    # The default configuration is the float32 reference the others are compared with
+    reference = None
+    rows = []
+    for config in [cpu_config(), *(config for config in configs if config != cpu_config())]:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            try:
+                elapsed, threads, stems = pool.submit(_bench_config, track, tier, config, seconds).result()
+            except Exception as e:
+                print(f"   ✗ {config_label(config) or 'fp32'}: {e}")
+                continue
+        if reference is None:
+            reference, db = stems, None
+        else:
+            db = accuracy_db(reference, stems)
+        rows.append((config_label(config) or "fp32 (default)", threads, elapsed, db))
+        print(f"   ✓ {rows[-1][0]}: {seconds / elapsed:.2f}x realtime")
+
+    print(f"\n{'configuration':<32} {'threads':>7} {'s/s audio':>10} {'realtime':>9} {'vs fp32':>9}")
+    for label, threads, elapsed, db in rows:
+        accuracy = "-" if db is None else f"{db:.1f} dB"
+        print(f"{label:<32} {threads:>7} {elapsed / seconds:>10.3f} {seconds / elapsed:>8.2f}x {accuracy:>9}")
+    return rows
+
+
+def main():
+    from quality_tiers import DEFAULT_TIER, QUALITY_TIERS
+
+    parser = argparse.ArgumentParser(
+        description="Compare CPU inference configurations for Demucs on an excerpt of a track.")
+    parser.add_argument("track", help="audio file to take the excerpt from")
+    parser.add_argument("--quality", choices=[tier for tier in QUALITY_TIERS if tier != "fast"],
+                        default=DEFAULT_TIER, help="tier whose model to run (default: %(default)s)")
+    parser.add_argument("--precision", nargs="+", choices=PRECISIONS, default=list(PRECISIONS),
+                        help="precisions to try (default: all)")
+    parser.add_argument("--threads", nargs="+", type=int, default=[None],
+                        help="intra-op thread counts to try (default: all cores)")
+    parser.add_argument("--interop-threads", type=int, help="torch inter-op threads")
+    parser.add_argument("--pin", action="store_true", help="pin each run to its cores")
+    parser.add_argument("--seconds", type=float, default=30.0,
+                        help="length of the excerpt (default: %(default)s)")
+    args = parser.parse_args()
+
+    if not Path(args.track).exists():
+        print(f"❌ ERROR: Input audio file not found at '{args.track}'")
+        return 1
+    configs = [cpu_config(threads, args.interop_threads, precision, args.pin)
+               for precision in args.precision for threads in args.threads]
+    print(f"Benchmarking {len(configs)} configurations on {args.seconds:.0f}s of {Path(args.track).name}...")
+    benchmark(Path(args.track).resolve(), args.quality, configs, args.seconds)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+Region-level incremental reprocessing for edited versions of a track.
+
+Every separating run leaves a region cache in its checkpoints: hashes of the
+decoded audio in fixed-size blocks, the per-frame band features the hit
+detector works from, and the factor each stem was scaled by when it was saved
+(see stem_scale()), which new region cores get too. When a new version of the track comes in, its blocks are
+hashed and compared with the cache. Only the changed spans, widened by
+CORE_MARGIN_SECONDS on each side, go through Demucs and the STFT again.
+Everything else reuses the previous run's stems and features.
+
+Hits are not spliced directly. Peak picking normalizes the whole onset
+envelope, and velocities are scaled to the loudest hit of the track, so one
+edit can move hits anywhere. Instead, the features are spliced and hits are
+picked again over the whole track, which takes milliseconds.
+
+Two kinds of edit are handled:
+
+- **Same length** (a tweak, a re-balanced section): changed blocks are found
+  by position.
+- **Length change** (material inserted or removed): the common prefix is
+  found with hashes anchored at the start, and the common suffix with hashes
+  anchored at the end. The suffix can only be reused when the shift is a
+  whole number of hops, so its frames line up; otherwise everything from the
+  first change onwards is redone.
+
+When more than MAX_CHANGED_FRACTION of the track changed, for example
+because of a re-export with fresh dither, a full run is cheaper and is used
+instead.
+"""
+import hashlib
+import json
+
+import numpy as np
+
+CACHE_NAME = "regions.npz"
+
+# 2^16 samples (~1.5 s at 44.1 kHz), a whole number of 512-sample hops
+BLOCK_SAMPLES = 1 << 16
+
+# How far an edit's effect on the separated stems can reach: one Demucs
+# segment (7.8 s for htdemucs), since each output sample comes from the
+# segments that contain it.
+CORE_MARGIN_SECONDS = 8.0
+
+MAX_CHANGED_FRACTION = 0.5
+
+
+def block_hashes(audio, block_samples=BLOCK_SAMPLES):
+    """
+    Hashes of a (channels, samples) array in blocks anchored at the start and
+    at the end; the last block on each side may be short.
+    """
+    n_samples = audio.shape[1]
+
+    def digest(start, end):
+        return hashlib.blake2b(np.ascontiguousarray(audio[:, start:end]).tobytes(), digest_size=16).digest()
+
+    forward = [digest(start, min(start + block_samples, n_samples))
+               for start in range(0, n_samples, block_samples)]
+    backward = [digest(max(0, end - block_samples), end)
+                for end in range(n_samples, 0, -block_samples)]
+    return {"n_samples": n_samples, "block_samples": block_samples,
+            "forward": np.array(forward, dtype="S16"), "backward": np.array(backward, dtype="S16")}
+
+
+def stem_scale(peak):
+    """The factor demucs' save_audio(clip="rescale") applies to a stem whose absolute peak is ``peak``."""
+    return 1.0 / max(1.01 * peak, 1.0)
+
+
+def save_cache(path, fingerprint, features, samplerate, params, stem_scales):
+    """Store a run's fingerprint, band features and stem scales; ``params`` must match for reuse."""
+    arrays = {f"{band}_{kind}": np.asarray(values, dtype=np.float32)
+              for band, pair in features.items() for kind, values in zip(("env", "energy"), pair)}
+    tmp_path = path.with_name(path.name + ".tmp.npz")
+    np.savez(tmp_path, forward=fingerprint["forward"], backward=fingerprint["backward"],
+             meta=np.array(json.dumps({"n_samples": fingerprint["n_samples"],
+                                       "block_samples": fingerprint["block_samples"],
+                                       "samplerate": samplerate, "bands": list(features),
+                                       "stem_scales": stem_scales, "params": params}, sort_keys=True, default=str)),
+             **arrays)
+    tmp_path.replace(path)
+
+
+def load_cache(path, params):
+    """The cache at ``path`` if it was made with the same parameters, else None."""
+    try:
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            expected = json.loads(json.dumps(params, sort_keys=True, default=str))
+            if meta["params"] != expected:
+                return None
+            return {
+                "samplerate": meta["samplerate"],
+                "stem_scales": meta["stem_scales"],
+                "fingerprint": {"n_samples": meta["n_samples"], "block_samples": meta["block_samples"],
+                                "forward": data["forward"], "backward": data["backward"]},
+                "features": {band: (data[f"{band}_env"], data[f"{band}_energy"]) for band in meta["bands"]},
+            }
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _common_prefix(a, b):
+    n = min(len(a), len(b))
+    mismatch = np.flatnonzero(a[:n] != b[:n])
+    return int(mismatch[0]) if len(mismatch) else n
+
+
+def diff(old, new, hop_length=512):
+    """
+    Compare two fingerprints.
+
+    Returns ``(changed, offset)``: sample ranges of the new audio that differ,
+    and for the unchanged rest, how many samples the old audio is shifted by
+    after the first change (None when only the prefix can be reused).
+    """
+    block = new["block_samples"]
+    n_old, n_new = old["n_samples"], new["n_samples"]
+    if block != old["block_samples"]:
+        return [(0, n_new)], None
+
+    if n_old == n_new:
+        count = len(new["forward"])
+        changed = np.flatnonzero(old["forward"][:count] != new["forward"][:count])
+        return [(int(k) * block, min((int(k) + 1) * block, n_new)) for k in changed], 0
+
+    # Whole blocks only, and the prefix and suffix must not overlap in either version
+    prefix = min(_common_prefix(old["forward"], new["forward"]), min(n_old, n_new) // block)
+    suffix = _common_prefix(old["backward"], new["backward"])
+    suffix = min(suffix, (min(n_old, n_new) - prefix * block) // block)
+    shift = n_new - n_old
+    if suffix == 0 or shift % hop_length:
+        return [(prefix * block, n_new)], None
+    return [(prefix * block, n_new - suffix * block)], shift
+
+
+def plan_regions(changed, n_samples, samplerate, overlap_seconds, hop_length=512):
+    """
+    Widen the changed ranges into hop-aligned region cores and pad them with
+    context, merging cores that touch.
+
+    Returns ``(pad_start, core_start, core_end, pad_end)`` segments like
+    plan_segments() in process_track.py.
+    """
+    margin = int(CORE_MARGIN_SECONDS * samplerate)
+    context = max(4 * hop_length + 2048, int(overlap_seconds * samplerate) // hop_length * hop_length)
+
+    cores = []
+    for start, end in sorted(changed):
+        core_start = max(0, start - margin) // hop_length * hop_length
+        core_end = min(n_samples, -(-(end + margin) // hop_length) * hop_length)
+        if cores and core_start <= cores[-1][1]:
+            cores[-1][1] = max(cores[-1][1], core_end)
+        else:
+            cores.append([core_start, core_end])
+    return [(max(0, start - context), start, end, min(n_samples, end + context)) for start, end in cores]
+
+
+def kept_spans(segments, n_new, n_old, offset):
+    """
+    Sample spans of the new audio outside every region core, as
+    ``(new_start, new_end, old_start)``.
+    """
+    spans, position = [], 0
+    for _, core_start, core_end, _ in segments + [(n_new, n_new, n_new, n_new)]:
+        if core_start > position:
+            # Up to the first change the versions line up; after it, they're shifted by offset
+            shift = 0 if position == 0 else offset
+            if shift is None:
+                raise ValueError("Nothing after the first change can be reused")
+            spans.append((position, core_start, position - shift))
+        position = core_end
+    for new_start, new_end, old_start in spans:
+        if old_start < 0 or old_start + new_end - new_start > n_old:
+            raise ValueError(f"Kept span {new_start}-{new_end} falls outside the previous version")
+    return spans
+
+
+def changed_fraction(segments, n_samples):
+    return sum(core_end - core_start for _, core_start, core_end, _ in segments) / max(n_samples, 1)
+
+
+def splice_features(old_features, spans, region_features, segments, n_new, hop_length=512):
+    """
+    Per-frame band features of the new version: frames of the kept spans
+    from the old run, frames of each region core from ``region_features``.
+    """
+    n_frames = 1 + n_new // hop_length
+    features = {}
+    for band, (old_env, old_energy) in old_features.items():
+        env = np.full(n_frames, np.nan, dtype=np.float32)
+        energy = np.full(n_frames, np.nan, dtype=np.float32)
+        for new_start, new_end, old_start in spans:
+            first = new_start // hop_length
+            last = n_frames if new_end == n_new else new_end // hop_length
+            old_first = old_start // hop_length
+            count = min(last - first, len(old_env) - old_first)
+            env[first:first + count] = old_env[old_first:old_first + count]
+            energy[first:first + count] = old_energy[old_first:old_first + count]
+        for (_, core_start, _, _), owned in zip(segments, region_features):
+            region_env, region_energy = owned[band]
+            first = core_start // hop_length
+            env[first:first + len(region_env)] = region_env
+            energy[first:first + len(region_energy)] = region_energy
+        if np.isnan(env).any() or np.isnan(energy).any():
+            raise ValueError(f"Spliced {band} features have gaps")
+        features[band] = (env, energy)
+    return features
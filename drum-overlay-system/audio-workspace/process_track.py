@@ -1,16 +1,37 @@
+import os
 import sys
 import json
+import time
+import shutil
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from types import SimpleNamespace
 import numpy as np
-import librosa
-import soundfile as sf
-import torch as th
-from demucs.pretrained import get_model_from_args, ModelLoadingError
-from demucs.apply import apply_model
-from demucs.audio import convert_audio, save_audio, AudioFile
-import torchaudio as ta
 import subprocess
 
+# torch, torchaudio, demucs, librosa and soundfile are imported inside the
+# functions that use them, so --help, usage errors and fully checkpointed
+# reruns don't pay seconds of import time before doing anything.
+
+import block_analysis
+import cpu_inference
+import filterbank
+import incremental
+import quality_tiers
+import stem_transport
+from quality_tiers import DEFAULT_TIER, QUALITY_TIERS
+
+# The stage manifest lives in the backend's separation_pipeline package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from separation_pipeline import density
+from separation_pipeline.manifest import MANIFEST_NAME, StageManifest
+from separation_pipeline.trigger_stream import TriggerStreamWriter, write_json_atomic
+
+CHECKPOINT_DIR = Path("checkpoints")
+MODEL_INFO_PATH = Path(__file__).resolve().parent / "model-info.json"
+
 
 def print_header():
     print("=" * 60)
@@ -25,6 +46,9 @@ def print_footer():
 
 
 def load_track(track, audio_channels, samplerate):
+    from demucs.audio import AudioFile, convert_audio
+    import torchaudio as ta
+
     errors = {}
     wav = None
 
@@ -47,34 +71,42 @@ def load_track(track, audio_channels, samplerate):
             wav = convert_audio(wav, sr, samplerate, audio_channels)
 
     if wav is None:
-        print(f"Could not load file {track}. "
-              "Maybe it is not a supported file format? ")
-        for backend, error in errors.items():
-            print(f"When trying to load using {backend}, got the following error: {error}")
-        sys.exit(1)
+        details = "; ".join(f"{backend}: {error}" for backend, error in errors.items())
+        raise RuntimeError(f"Could not load file {track}. "
+                           f"Maybe it is not a supported file format? ({details})")
     return wav
 
 
-def separate_stems(audio_path: Path, model="htdemucs_6s"):
+def separation_args(tier=DEFAULT_TIER, cpu=None):
     """
-    Separates the audio file into stems using the Demucs Python API.
-    Saves them as WAV files in the current directory.
+    Demucs settings of a quality tier in the shape get_model_from_args()
+    expects, plus the precision to run at on CPU (see cpu_inference.py).
     """
-    print("[1/4] Initializing Demucs separator...")
-    
-    # Create dummy args for model loading
+    import torch as th
+
+    settings = QUALITY_TIERS[tier]
+    cuda = th.cuda.is_available()
+
     class Args:
-        name = model
+        name = settings["model"]
         repo = None
-        device = "cuda" if th.cuda.is_available() else "cpu"
-        shifts = 1
-        overlap = 0.25
-        split = True
-        segment = None
+        device = "cuda" if cuda else "cpu"
+        # Reduced precision is a CPU mode; GPUs always run the model as loaded
+        precision = "fp32" if cuda or cpu is None else cpu["precision"]
+        shifts = settings["shifts"]
+        overlap = settings["overlap"]
+        split = settings["split"]
+        segment = settings["segment"]
         jobs = 0
-        
+
+    return Args()
+
+
+def load_model(args):
+    from demucs.pretrained import get_model_from_args, ModelLoadingError
+
     try:
-        model = get_model_from_args(Args())
+        model = get_model_from_args(args)
     except ModelLoadingError as e:
         print(f"❌ Failed to initialize Demucs separator: {e}")
         print("   Please ensure you have a working internet connection for the first run to download models.")
@@ -83,33 +115,90 @@ def separate_stems(audio_path: Path, model="htdemucs_6s"):
         print(f"❌ Failed to initialize Demucs separator: {e}")
         raise
 
-    model.cpu()
+    model.to(args.device)
     model.eval()
+    return cpu_inference.prepare_model(model, args.precision)
 
-    print("[2/4] Separating stems (this can take 30-90 seconds)...")
+
+def model_info(tier, path=MODEL_INFO_PATH):
+    """
+    ``audio_channels``, ``samplerate`` and ``sources`` of ``tier``'s model, for
+    a process that only plans the work. Cached per model in model-info.json;
+    on a miss the model is loaded once and dropped again.
+    """
+    name = QUALITY_TIERS[tier]["model"]
     try:
-        wav = load_track(audio_path, model.audio_channels, model.samplerate)
-        
-        ref = wav.mean(0)
-        wav -= ref.mean()
-        wav /= ref.std()
-        
-        sources = apply_model(model, wav[None], device=Args().device, 
-                           shifts=Args().shifts, split=Args().split, 
-                           overlap=Args().overlap, progress=True,
-                           num_workers=Args().jobs, segment=Args().segment)[0]
-        
-        sources *= ref.std()
-        sources += ref.mean()
+        with open(path) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+    if name not in cached:
+        model = load_model(separation_args(tier))
+        cached[name] = {"audio_channels": model.audio_channels, "samplerate": model.samplerate,
+                        "sources": list(model.sources)}
+        model = None
+        write_json_atomic(path, cached)
+    return SimpleNamespace(**cached[name])
+
+
+def apply_separation(model, wav, args, progress=True):
+    """Run Demucs on a (channels, samples) tensor and return (sources, channels, samples)."""
+    from demucs.apply import apply_model
+
+    ref = wav.mean(0)
+    wav -= ref.mean()
+    wav /= ref.std()
+
+    with cpu_inference.inference_context(args.precision):
+        sources = apply_model(model, wav[None], device=args.device,
+                              shifts=args.shifts, split=args.split,
+                              overlap=args.overlap, progress=progress,
+                              num_workers=args.jobs, segment=args.segment)[0]
+    sources = sources.float()
+
+    sources *= ref.std()
+    sources += ref.mean()
+    return sources
 
+
+def separate_stems(audio_path: Path, tier=DEFAULT_TIER, cpu=None):
+    """
+    Separates the audio file into stems using the Demucs Python API.
+    Saves them as WAV files in the current directory. Returns the drums.wav
+    path, the sample rate, the float drum stem (mono, so analysis doesn't
+    decode drums.wav again), the factor each stem was rescaled by and the
+    track's region-cache fingerprint, hashed from the decoded input.
+    ``cpu`` is a cpu_inference configuration.
+    """
+    import torch as th
+    from demucs.audio import save_audio
+
+    print("[1/4] Initializing Demucs separator...")
+    cpu_inference.configure_process(cpu)
+    args = separation_args(tier, cpu)
+    model = load_model(args)
+
+    print("[2/4] Separating stems (this can take 30-90 seconds)...")
+    try:
+        # Decoded like the sharded and incremental paths, so the fingerprint matches theirs
+        with stem_transport.StemSpool() as spool:
+            _spool_source(audio_path, model.audio_channels, model.samplerate, spool)
+            decoded = spool.open("source")
+            fingerprint = incremental.block_hashes(decoded)
+            # A private copy, since apply_separation() normalizes its input in place
+            wav = th.from_numpy(np.array(decoded))
+            decoded = None
+        sources = apply_separation(model, wav, args)
     except Exception as e:
         print(f"❌ Demucs separation failed: {e}")
         raise
 
     print("[3/4] Saving separated stems...")
     saved_stems = []
+    scales = {}
     for source, stem_name in zip(sources, model.sources):
         stem_path = Path(f"{stem_name}.wav")
+        scales[stem_name] = incremental.stem_scale(float(source.abs().max()))
         save_audio(source, str(stem_path), samplerate=model.samplerate, 
                   bits_per_sample=16, clip="rescale")
         print(f"      ✓ Saved {stem_path.name}")
@@ -119,108 +208,827 @@ def separate_stems(audio_path: Path, model="htdemucs_6s"):
     if not drum_stem_path.exists():
         raise FileNotFoundError("drums.wav was not generated by Demucs.")
 
-    return drum_stem_path, model.samplerate
+    drums = sources[model.sources.index("drums")].numpy().mean(axis=0)
+    return drum_stem_path, model.samplerate, drums, scales, fingerprint
+
+
+# Configuration from TECHNICAL_SPECS.md
+HIT_CONFIG = {
+    "kick": {"fmin": 40, "fmax": 150, "delta": 0.05, "wait": 10},
+    "snare": {"fmin": 150, "fmax": 6000, "delta": 0.03, "wait": 8},
+    "hats": {"fmin": 6000, "fmax": 16000, "delta": 0.02, "wait": 5},
+}
 
 
-def analyze_drum_hits(drum_track_path: Path, sample_rate: int):
+def analyze_drum_hits(drum_track_path: Path, sample_rate: int, low_memory=False,
+                      memory_budget_mb=block_analysis.DEFAULT_MEMORY_BUDGET_MB, drums=None):
     """
     Analyzes the drum track for kick, snare, and hat onsets using Librosa,
     based on the frequency bands from TECHNICAL_SPECS.md.
+
+    ``drums`` is the mono stem as separated, when it's still in memory; it is
+    analyzed as is, like the sharded path does, instead of loading the file.
+    With ``low_memory`` the track is walked in blocks sized to
+    ``memory_budget_mb`` instead of being loaded whole; the hits are identical.
+    Returns the hits and the per-frame band features they were picked from.
     """
+    import librosa
+
     print("[4/4] Analyzing drum hits...")
 
     try:
-        y, sr = librosa.load(drum_track_path, sr=sample_rate)
+        if low_memory:
+            print(f"      Block-wise analysis (budget {memory_budget_mb} MB)")
+            features = block_analysis.band_features(
+                drum_track_path, sample_rate, HIT_CONFIG, memory_budget_mb)
+            sr = sample_rate
+        else:
+            if drums is not None:
+                y, sr = drums, sample_rate
+            else:
+                y, sr = librosa.load(drum_track_path, sr=sample_rate)
+            features = band_features_in_memory(y, sr)
     except Exception as e:
         print(f"❌ Failed to load drum track: {e}")
         raise
 
-    stft = librosa.stft(y, hop_length=512)
-    stft_mag = np.abs(stft)
+    return hits_from_band_features(features, sr), features
 
-    # Configuration from TECHNICAL_SPECS.md
-    hit_config = {
-        "kick": {"fmin": 40, "fmax": 150, "delta": 0.05, "wait": 10},
-        "snare": {"fmin": 150, "fmax": 6000, "delta": 0.03, "wait": 8},
-        "hats": {"fmin": 6000, "fmax": 16000, "delta": 0.02, "wait": 5},
-    }
 
+def hits_from_band_features(features, sr):
+    """Peak-pick every band of HIT_CONFIG into the trigger data."""
     all_hits = {}
-    all_velocities = {drum_type: [] for drum_type in hit_config}
+    for drum_type, params in HIT_CONFIG.items():
+        onset_env, energy = features[drum_type]
+        all_hits[drum_type] = hits_from_features(onset_env, energy, sr, params)
+        print(f"      ✓ {drum_type.capitalize()}: {len(all_hits[drum_type])} hits detected")
+    return all_hits
+
+
+def band_features_in_memory(y, sr):
+    """Onset envelope and per-frame energy of each band from a full STFT."""
+    import librosa
 
-    for drum_type, params in hit_config.items():
-        freq_range = librosa.fft_frequencies(sr=sr)
+    stft_mag = np.abs(librosa.stft(y, hop_length=512))
+    freq_range = librosa.fft_frequencies(sr=sr)
+
+    features = {}
+    for drum_type, params in HIT_CONFIG.items():
         freq_bins = (freq_range >= params["fmin"]) & (freq_range <= params["fmax"])
+        band = stft_mag[freq_bins, :]
 
         # Spectral flux in the frequency band
-        onset_env = librosa.onset.onset_strength(S=stft_mag[freq_bins, :], sr=sr)
-        onset_frames = librosa.onset.onset_detect(
-            onset_envelope=onset_env,
-            sr=sr,
-            hop_length=512,
-            units="frames",
-            delta=params["delta"],
-            wait=params["wait"],
-        )
-
-        # Calculate velocity based on energy at onset
-        hit_data = []
-        if len(onset_frames) > 0:
-            onset_times = librosa.frames_to_time(onset_frames, sr=sr, hop_length=512)
-            for i, frame in enumerate(onset_frames):
-                energy = np.sum(stft_mag[freq_bins, frame] ** 2)
-                velocity = np.sqrt(energy)
-                all_velocities[drum_type].append(velocity)
-                hit_data.append([onset_times[i], velocity])
-
-        all_hits[drum_type] = hit_data
-
-    # Normalize velocities for each drum type
-    for drum_type, hits in all_hits.items():
-        max_velocity = np.max(all_velocities[drum_type]) if all_velocities[drum_type] else 1.0
-        if max_velocity > 0:
-            for hit in hits:
-                hit[1] /= max_velocity # Normalize to 0-1 range
+        onset_env = librosa.onset.onset_strength(S=band, sr=sr)
+        energy = np.sqrt(np.sum(np.ascontiguousarray(band.T) ** 2, axis=1))
+        features[drum_type] = (onset_env, energy)
+    return features
+
+
+def hits_from_features(onset_env, energy, sr, params):
+    """Peak-pick an onset envelope into [time, velocity] hits, velocities normalized to 0-1."""
+    import librosa
+
+    onset_frames = librosa.onset.onset_detect(
+        onset_envelope=onset_env,
+        sr=sr,
+        hop_length=512,
+        units="frames",
+        delta=params["delta"],
+        wait=params["wait"],
+    )
+    if len(onset_frames) == 0:
+        return []
+
+    # Calculate velocity based on energy at onset
+    onset_times = librosa.frames_to_time(onset_frames, sr=sr, hop_length=512)
+    velocities = energy[onset_frames]
+    max_velocity = np.max(velocities)
+    if max_velocity > 0:
+        velocities = velocities / max_velocity  # Normalize to 0-1 range
+
+    return [[float(t), float(v)] for t, v in zip(onset_times, velocities)]
+
+
+def plan_segments(n_samples, samplerate, segment_seconds, overlap_seconds, hop_length=512):
+    """
+    Split a track into hop-aligned segments.
+
+    Returns (pad_start, core_start, core_end, pad_end) sample indices. Each
+    segment owns the frames of its core; the padded margins give Demucs and the
+    STFT enough context that frames near a seam come out as in a full-track run.
+    """
+    segment = max(hop_length, int(segment_seconds * samplerate) // hop_length * hop_length)
+    # At least one FFT window plus the onset envelope's lag on either side
+    margin = max(4 * hop_length + 2048, int(overlap_seconds * samplerate) // hop_length * hop_length)
+
+    segments = []
+    for core_start in range(0, n_samples, segment):
+        core_end = min(core_start + segment, n_samples)
+        segments.append((max(0, core_start - margin), core_start, core_end,
+                         min(n_samples, core_end + margin)))
+    return segments
+
+
+_shard_model = None
+_shard_args = None
+_shard_source = None
+_shard_stems = None
+
+
+def _init_shard_worker(tier, cpu, jobs, slots, source, stems):
+    """Set up threads and pinning, load the model and map the shared source buffer once per worker."""
+    global _shard_model, _shard_args, _shard_source, _shard_stems
+
+    with slots.get_lock():
+        slot = slots.value
+        slots.value += 1
+    cpu_inference.configure_process(cpu, jobs, slot)
+    _shard_args = separation_args(tier, cpu)
+    _shard_model = load_model(_shard_args)
+    _shard_source = stem_transport.attach(source)
+    _shard_stems = stems
+
+
+def _process_shard(index, segment, n_samples):
+    """Pool task: separate_segment() with this worker's model and buffers."""
+    peaks, owned = separate_segment(_shard_model, _shard_args, _shard_source, _shard_stems,
+                                    segment, n_samples)
+    return index, peaks, owned
+
+
+# Input buffer reused by every segment this process separates: sharded
+# workers and incremental regions. Only the input copy is reused (Demucs
+# allocates its outputs), and the default path separates the whole track in
+# one call, so it has no segments to share a buffer between.
+_segment_buffer = None
+
+
+def _segment_input(source, start, end):
+    """A private copy of ``source[:, start:end]`` in this process's reusable input buffer."""
+    global _segment_buffer
+    channels, n = source.shape[0], end - start
+    if _segment_buffer is None or _segment_buffer.size < channels * n:
+        _segment_buffer = np.empty(channels * n, dtype=np.float32)
+    wav = _segment_buffer[:channels * n].reshape(channels, n)
+    np.copyto(wav, source[:, start:end])
+    return wav
+
+
+def separate_segment(model, args, source, stems, segment, n_samples, hop_length=512):
+    """
+    Separate and analyze one segment of the ``source`` buffer. The core of each
+    stem is written into its buffer in ``stems``; returns the stem peaks and
+    the band features of the frames the core owns.
+    """
+    import torch as th
+
+    pad_start, core_start, core_end, pad_end = segment
+
+    # A private copy, since apply_separation() normalizes its input in place
+    wav = th.from_numpy(_segment_input(source, pad_start, pad_end))
+    sources = apply_separation(model, wav, args, progress=False)
+
+    lo, hi = core_start - pad_start, core_end - pad_start
+    peaks = {}
+    for separated, stem_name in zip(sources, model.sources):
+        core = separated[:, lo:hi].numpy()
+        stem_transport.write_columns(stems[stem_name], core_start, core)
+        peaks[stem_name] = float(np.abs(core).max()) if core.size else 0.0
+
+    drums = sources[model.sources.index("drums")].numpy().mean(axis=0)
+    features = band_features_in_memory(drums, model.samplerate)
+
+    # Keep only the frames this segment owns; the last one also owns the final frame.
+    first = pad_start // hop_length
+    frame_start = core_start // hop_length - first
+    frame_end = (core_end // hop_length if core_end < n_samples else n_samples // hop_length + 1) - first
+    owned = {drum_type: (env[frame_start:frame_end], energy[frame_start:frame_end])
+             for drum_type, (env, energy) in features.items()}
+    return peaks, owned
+
+
+# Samples per read or write when streaming between files and shared buffers
+_COPY_BLOCK = 1 << 20
+
+
+def _spool_source(audio_path, channels, samplerate, spool):
+    """
+    Put the track, at the model's rate and channel count, in a shared buffer
+    that workers slice from. Returns the number of samples.
+    """
+    import soundfile as sf
+
+    try:
+        info = sf.info(str(audio_path))
+        if info.samplerate == samplerate and info.channels == channels:
+            # Stream it in; the whole track never sits in this process's memory
+            source = spool.create("source", (info.channels, info.frames))
+            n_samples = 0
+            with sf.SoundFile(str(audio_path)) as f:
+                for block in f.blocks(blocksize=_COPY_BLOCK, dtype="float32", always_2d=True):
+                    stem_transport.write_columns(source, n_samples, block.T)
+                    n_samples += len(block)
+            return n_samples
+    except RuntimeError:
+        pass
+
+    wav = load_track(audio_path, channels, samplerate).numpy()
+    stem_transport.write_columns(spool.create("source", wav.shape), 0, wav)
+    return wav.shape[1]
+
+
+# Frames after the end of the known envelope that can still change a peak
+# (librosa's post_avg window plus slack)
+_PEAK_LOOKAHEAD_FRAMES = 16
+
+
+def _stream_provisional_hits(writer, results, samplerate, hop_length=512):
+    """Stream hits from the contiguous prefix of finished segments."""
+    prefix = []
+    for result in results:
+        if result is None:
+            break
+        prefix.append(result[1])
+    if not prefix:
+        return
+
+    for drum_type, params in HIT_CONFIG.items():
+        onset_env = np.concatenate([owned[drum_type][0] for owned in prefix])
+        energy = np.concatenate([owned[drum_type][1] for owned in prefix])
+        safe_until = (len(onset_env) - _PEAK_LOOKAHEAD_FRAMES) * hop_length / samplerate
+        writer.append(drum_type, hits_from_features(onset_env, energy, samplerate, params), safe_until)
+
+
+def separate_and_analyze_sharded(audio_path: Path, tier=DEFAULT_TIER, jobs=None,
+                                 segment_seconds=60.0, overlap_seconds=5.0, writer=None, cpu=None):
+    """
+    Sharded equivalent of separate_stems() followed by analyze_drum_hits().
+
+    The track is cut into overlapping segments that are separated and analyzed
+    across a process pool. Per-frame band features from each segment's core are
+    stitched back in order, so seams are de-duplicated by ownership and peak
+    picking and velocity normalization still see the whole track. With a
+    ``writer``, provisional hits are streamed as finished segments extend the
+    analyzed prefix of the track.
+
+    Audio moves between processes through a stem_transport spool: workers
+    slice the source from one shared buffer and write their stem cores into
+    another, so only band features and peaks go back through the pool. Each
+    worker gets its share of the cores, pinned with ``cpu["pin"]``.
+
+    Returns the drums.wav path, the sample rate, the hits, the band
+    features, the stem scales and the fingerprint of the spooled source.
+    """
+    import soundfile as sf
+
+    jobs = jobs or os.cpu_count() or 1
+    print(f"[1/4] Initializing Demucs separator ({jobs} workers)...")
+    # Workers load their own models; this process only needs the model's shape
+    model = model_info(tier)
+
+    with stem_transport.StemSpool() as spool:
+        n_samples = _spool_source(audio_path, model.audio_channels, model.samplerate, spool)
+        fingerprint = incremental.block_hashes(spool.open("source"))
+        for name in model.sources:
+            spool.create(name, (model.audio_channels, n_samples))
+        segments = plan_segments(n_samples, model.samplerate, segment_seconds, overlap_seconds)
+        workers = min(jobs, len(segments))
+
+        print(f"[2/4] Separating {len(segments)} segments...")
+        results = [None] * len(segments)
+        ctx = multiprocessing.get_context("spawn")
+        initargs = (tier, cpu, workers, ctx.Value("i", 0), spool.descriptor("source"),
+                    {name: spool.descriptor(name) for name in model.sources})
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_init_shard_worker, initargs=initargs) as pool:
+            futures = [pool.submit(_process_shard, i, segment, n_samples)
+                       for i, segment in enumerate(segments)]
+            for future in as_completed(futures):
+                index, peaks, owned = future.result()
+                results[index] = (peaks, owned)
+                print(f"      ✓ Segment {index + 1}/{len(segments)}")
+                if writer is not None:
+                    _stream_provisional_hits(writer, results, model.samplerate)
+
+        print("[3/4] Saving separated stems...")
+        scales = {}
+        for stem_name in model.sources:
+            # Same as save_audio(clip="rescale"), but over the whole stitched stem
+            scale = scales[stem_name] = incremental.stem_scale(max(peaks[stem_name] for peaks, _ in results))
+            stem_path = Path(f"{stem_name}.wav")
+            stem = spool.open(stem_name)
+            with sf.SoundFile(str(stem_path), "w", samplerate=model.samplerate,
+                              channels=model.audio_channels, subtype="PCM_16") as out:
+                for start in range(0, n_samples, _COPY_BLOCK):
+                    part = stem[:, start:start + _COPY_BLOCK]
+                    out.write((np.clip(part * scale, -1, 1) * (2 ** 15 - 1)).astype(np.int16).T)
+            print(f"      ✓ Saved {stem_path.name}")
+        # Unmap before the spool deletes the files (Windows won't delete mapped files)
+        stem = None
+
+    print("[4/4] Analyzing drum hits...")
+    features = {drum_type: (np.concatenate([owned[drum_type][0] for _, owned in results]),
+                            np.concatenate([owned[drum_type][1] for _, owned in results]))
+                for drum_type in HIT_CONFIG}
+    return (Path("drums.wav"), model.samplerate, hits_from_band_features(features, model.samplerate), features,
+            scales, fingerprint)
+
+
+def _fingerprint_track(audio_path, channels, samplerate):
+    """Block hashes of the track as the separator decodes it, for runs that reused the separation checkpoint."""
+    with stem_transport.StemSpool() as spool:
+        _spool_source(audio_path, channels, samplerate, spool)
+        source = spool.open("source")
+        fingerprint = incremental.block_hashes(source)
+        source = None
+    return fingerprint
+
+
+def _splice_stem(stem_name, stem, spans, segments, samplerate, previous_dir, scale):
+    """
+    Write the new version of ``<stem_name>.wav`` to a temporary file: kept
+    spans are copied from the previous version's file sample for sample,
+    region cores come from the ``stem`` buffer, scaled by ``scale`` like the
+    previous version was when it was saved. Returns the temporary path.
+    """
+    import soundfile as sf
+
+    tmp_path = Path(f"{stem_name}.wav.tmp")
+    pieces = sorted(list(spans) + [(core_start, core_end, None) for _, core_start, core_end, _ in segments])
+    with sf.SoundFile(str(previous_dir / f"{stem_name}.wav")) as old, \
+            sf.SoundFile(str(tmp_path), "w", samplerate=samplerate, channels=stem.shape[0],
+                         subtype="PCM_16", format="WAV") as out:
+        for new_start, new_end, old_start in pieces:
+            for start in range(new_start, new_end, _COPY_BLOCK):
+                end = min(start + _COPY_BLOCK, new_end)
+                if old_start is None:
+                    # The kept audio's scale, so levels match across the seams
+                    out.write((np.clip(stem[:, start:end] * scale, -1, 1) * (2 ** 15 - 1)).astype(np.int16).T)
+                else:
+                    old.seek(old_start + start - new_start)
+                    out.write(old.read(end - start, dtype="int16", always_2d=True))
+    return tmp_path
+
+
+def separate_and_analyze_incremental(audio_path: Path, tier, previous, previous_dir=Path("."),
+                                     overlap_seconds=5.0, cpu=None):
+    """
+    Reprocess an edited track from the region cache of its previous version,
+    whose run directory is ``previous_dir``.
+
+    Only the regions that changed (see incremental.py) are separated again,
+    one after another in this process. Their stem cores are spliced into the
+    existing stem files, and their band features into the cached ones, before
+    hits are picked over the whole track. Returns None when the previous
+    stems are missing or so much changed that a full run is the better deal;
+    otherwise ``(drums path, samplerate, hits, features, stem scales, fingerprint)``.
+    """
+    import soundfile as sf
+
+    print("[1/4] Initializing Demucs separator (incremental)...")
+    cpu_inference.configure_process(cpu)
+    args = separation_args(tier, cpu)
+    model = load_model(args)
+    old = previous["fingerprint"]
+    for stem_name in model.sources:
+        stem_path = previous_dir / f"{stem_name}.wav"
+        if (previous["samplerate"] != model.samplerate or not stem_path.exists()
+                or stem_name not in previous["stem_scales"]
+                or sf.info(str(stem_path)).frames != old["n_samples"]):
+            print(f"      {stem_path.name} doesn't match the region cache, running in full")
+            return None
+
+    with stem_transport.StemSpool() as spool:
+        n_samples = _spool_source(audio_path, model.audio_channels, model.samplerate, spool)
+        source = spool.open("source")
+        fingerprint = incremental.block_hashes(source)
+        changed, offset = incremental.diff(old, fingerprint)
+        segments = incremental.plan_regions(changed, n_samples, model.samplerate, overlap_seconds)
+        fraction = incremental.changed_fraction(segments, n_samples)
+        if fraction > incremental.MAX_CHANGED_FRACTION:
+            print(f"      {fraction:.0%} of the track changed, running in full")
+            source = None
+            return None
+        spans = incremental.kept_spans(segments, n_samples, old["n_samples"], offset)
+
+        print(f"[2/4] Separating {len(segments)} changed regions ({fraction:.0%} of the track)...")
+        stems = {name: spool.create(name, (model.audio_channels, n_samples)) for name in model.sources}
+        region_features = []
+        for i, segment in enumerate(segments):
+            _, owned = separate_segment(model, args, source, stems, segment, n_samples)
+            region_features.append(owned)
+            _, core_start, core_end, _ = segment
+            print(f"      ✓ Region {i + 1}/{len(segments)}: "
+                  f"{core_start / model.samplerate:.1f}s-{core_end / model.samplerate:.1f}s")
+
+        if segments or n_samples != old["n_samples"]:
+            print("[3/4] Splicing stems...")
+            tmp_paths = [_splice_stem(name, spool.open(name), spans, segments, model.samplerate, previous_dir,
+                                      previous["stem_scales"][name])
+                         for name in model.sources]
+            for tmp_path, stem_name in zip(tmp_paths, model.sources):
+                os.replace(tmp_path, f"{stem_name}.wav")
+                print(f"      ✓ Saved {stem_name}.wav")
+        elif previous_dir.resolve() != Path.cwd():
+            print("[3/4] ✓ Audio is unchanged, copying the stems")
+            for stem_name in model.sources:
+                shutil.copyfile(previous_dir / f"{stem_name}.wav", f"{stem_name}.wav")
+        else:
+            print("[3/4] ✓ Audio is unchanged, keeping the stems")
+        # Unmap before the spool deletes the files (Windows won't delete mapped files)
+        source = None
+
+    print("[4/4] Analyzing drum hits...")
+    features = incremental.splice_features(previous["features"], spans, region_features, segments, n_samples)
+    all_hits = hits_from_band_features(features, model.samplerate)
+    return Path("drums.wav"), model.samplerate, all_hits, features, previous["stem_scales"], fingerprint
+
+
+def separation_params(tier, jobs, segment_seconds, overlap_seconds, precision="fp32"):
+    """Everything that changes the stems, for the separation stage's manifest entry."""
+    params = {"model": QUALITY_TIERS[tier]["model"], **quality_tiers.tier_settings(tier)}
+    if jobs != 1:
+        params["sharding"] = {"segment_seconds": segment_seconds, "overlap_seconds": overlap_seconds}
+    if precision != "fp32":
+        params["precision"] = precision
+    return params
+
+
+def read_excerpt(audio_path, channels, samplerate, seconds):
+    """A (channels, samples) tensor of ``seconds`` from the middle of the track."""
+    import soundfile as sf
+    import torch as th
+
+    n = int(seconds * samplerate)
+    try:
+        info = sf.info(str(audio_path))
+        if info.samplerate == samplerate and info.channels == channels:
+            data, _ = sf.read(str(audio_path), start=max(0, (info.frames - n) // 2), frames=n,
+                              dtype="float32", always_2d=True)
+            return th.from_numpy(np.ascontiguousarray(data.T))
+    except RuntimeError:
+        pass
+    wav = load_track(audio_path, channels, samplerate)
+    start = max(0, (wav.shape[1] - n) // 2)
+    return wav[:, start:start + n].clone()
+
+
+def _check_precision(track_path, tier, cpu):
+    """Compare ``cpu``'s precision with float32 on an excerpt of the track and cache the verdict."""
+    model_name = QUALITY_TIERS[tier]["model"]
+    precision = cpu["precision"]
+    print(f"      Checking {precision} against float32 on {cpu_inference.CHECK_SECONDS:.0f}s of the track...")
+    # No pinning here: sharded workers would inherit this process's affinity
+    cpu_inference.configure_process({**cpu, "pin": False})
+    reference_args = separation_args(tier, {**cpu, "precision": "fp32"})
+    model = load_model(reference_args)
+    wav = read_excerpt(track_path, model.audio_channels, model.samplerate, cpu_inference.CHECK_SECONDS)
+    reference = apply_separation(model, wav.clone(), reference_args, progress=False).numpy()
+    try:
+        candidate = apply_separation(cpu_inference.prepare_model(model, precision), wav.clone(),
+                                     separation_args(tier, cpu), progress=False).numpy()
+    except Exception as e:
+        return cpu_inference.record_check(model_name, precision, None, str(e) or type(e).__name__)
+    return cpu_inference.record_check(model_name, precision, cpu_inference.accuracy_db(reference, candidate))
+
+
+def verify_precision(track_path, tier, cpu, run_check=True):
+    """
+    ``cpu`` as it will actually run: with float32 instead of a reduced
+    precision that failed its accuracy check or can't be checked on GPU. The
+    first run of a model at a precision checks it on ``track_path`` (unless
+    ``run_check`` is off, which only consults earlier verdicts).
+    """
+    if cpu is None or cpu["precision"] == "fp32":
+        return cpu
+    import torch as th
+
+    if th.cuda.is_available():
+        return {**cpu, "precision": "fp32"}
+    verdict = cpu_inference.cached_check(QUALITY_TIERS[tier]["model"], cpu["precision"])
+    if verdict is None:
+        if not run_check:
+            return cpu
+        verdict = _check_precision(track_path, tier, cpu)
+    if not cpu_inference.passes(verdict, cpu):
+        reason = verdict["error"] or f"{verdict['db']:.1f} dB against float32"
+        print(f"⚠️  {cpu['precision']} isn't accurate enough ({reason}, need {cpu['min_accuracy_db']:.0f} dB);"
+              f" running in fp32")
+        return {**cpu, "precision": "fp32"}
+    if run_check:
+        print(f"      ✓ {cpu['precision']}: {verdict['db']:.1f} dB against float32")
+    return cpu
+
+
+def _resumed_precision(manifest, cpu):
+    """
+    ``cpu`` at the precision the separation checkpoint settled on for the same
+    request, or None when the checkpoint was made for a different one.
+    """
+    try:
+        checked = manifest.meta("separate").get("precision_check")
+    except KeyError:
+        return None
+    if checked is None or (checked["requested"], checked["min_accuracy_db"]) != (cpu["precision"], cpu["min_accuracy_db"]):
+        return None
+    return {**cpu, "precision": checked["used"]}
+
+
+def run_pipeline(track_path: Path, quality=DEFAULT_TIER, low_memory=False,
+                 memory_budget_mb=block_analysis.DEFAULT_MEMORY_BUDGET_MB, jobs=1,
+                 segment_seconds=60.0, overlap_seconds=5.0,
+                 output_path=Path("drum-data.json"), force=False, stream=True, reuse_regions=True,
+                 previous_run=None, cpu=None):
+    """
+    Run separation, analysis and export as checkpointed stages.
+
+    Completed stages are recorded in pipeline-manifest.json together with their
+    inputs and parameters. A rerun resumes from the first stage whose inputs,
+    parameters or artifacts changed, so tweaking HIT_CONFIG skips separation.
+    Where hits are known before the end (sharded separation), provisional
+    hits are streamed to the partial file beside ``output_path`` unless
+    ``stream`` is off; the final JSON is committed atomically either way,
+    followed by its hit-density pyramid (see density.py).
+    ``quality`` is a tier from quality_tiers.py; the "fast" tier replaces
+    the Demucs stages with a filterbank analysis of the mix. An
+    edited track only has its changed regions reprocessed unless
+    ``reuse_regions`` is off or ``force`` is set; ``previous_run`` points at
+    the directory of an earlier version when it wasn't processed in this one.
+    ``cpu`` is the cpu_inference configuration Demucs runs with.
+    Returns the trigger data; failures raise instead of exiting.
+    """
+    manifest = StageManifest(Path(MANIFEST_NAME))
+    if force:
+        manifest.clear()
+    CHECKPOINT_DIR.mkdir(exist_ok=True)
+
+    writer = TriggerStreamWriter(output_path, HIT_CONFIG) if stream else None
+    try:
+        if quality == "fast":
+            trigger_data = _fast_analyze(manifest, track_path)
+        else:
+            trigger_data = _separate_and_analyze(manifest, writer, track_path, quality, low_memory,
+                                                 memory_budget_mb, jobs, segment_seconds, overlap_seconds,
+                                                 reuse_regions=reuse_regions and not force,
+                                                 previous_run=previous_run, cpu=cpu)
+        if writer is not None:
+            writer.commit(trigger_data)
+        else:
+            write_json_atomic(output_path, trigger_data)
+    except BaseException as e:
+        if writer is not None:
+            writer.abort(str(e) or type(e).__name__)
+        raise
+
+    # Stage 3: export
+    density_path = density.density_path_for(output_path)
+    density.write_pyramid(density_path, density.build_pyramid(trigger_data))
+    manifest.record("export", {"hits": CHECKPOINT_DIR / "hits.json"}, {"output": str(output_path)},
+                    {"trigger_data": output_path, "density": density_path})
+    print(f"\n✓ Successfully saved trigger data to {output_path}")
+    return trigger_data
+
+
+def region_cache_params(tier, precision="fp32"):
+    """What the region cache's stems and features depend on; sharding doesn't matter."""
+    return {"separation": separation_params(tier, 1, None, None, precision),
+            "hit_config": HIT_CONFIG, "hop_length": 512}
+
+
+def _separate_and_analyze(manifest, writer, track_path, tier, low_memory, memory_budget_mb,
+                          jobs, segment_seconds, overlap_seconds, reuse_regions=True, previous_run=None,
+                          cpu=None):
+    """
+    Stages 1 and 2 of run_pipeline(), each skipped while its checkpoint is current.
+
+    When the track changed since the last run in this directory (or in
+    ``previous_run``, the directory of an earlier version), only its changed
+    regions are reprocessed if the region cache allows it (``reuse_regions``;
+    see separate_and_analyze_incremental()).
+    """
+    started = time.time()
+    cache_path = CHECKPOINT_DIR / incremental.CACHE_NAME
+    requested = cpu or cpu_inference.cpu_config()
+    # A checkpoint made for this request records the precision it ran at, so
+    # resuming doesn't load torch to consult the precision checks again
+    cpu = _resumed_precision(manifest, requested) or verify_precision(track_path, tier, requested, run_check=False)
+
+    # Stage 1: separation
+    separate_inputs = {"track": track_path}
+    separate_params = separation_params(tier, jobs, segment_seconds, overlap_seconds, cpu["precision"])
+    trigger_data = None
+    drums = None
+    features = None
+    fingerprint = None
+    separated = False
+    if manifest.is_complete("separate", separate_inputs, separate_params):
+        drum_stem_path = manifest.artifact("separate", "drums")
+        sample_rate = manifest.meta("separate")["samplerate"]
+        stem_scales = manifest.meta("separate").get("stem_scales")
+        print(f"[1-3/4] ✓ Separation checkpoint is current, reusing {drum_stem_path.name}")
+    else:
+        cpu = verify_precision(track_path, tier, requested)
+        separate_params = separation_params(tier, jobs, segment_seconds, overlap_seconds, cpu["precision"])
+        started = time.time()
+        result = None
+        previous = None
+        previous_dir = Path(previous_run) if previous_run and not cache_path.exists() else Path(".")
+        if reuse_regions:
+            previous = incremental.load_cache(previous_dir / cache_path, region_cache_params(tier, cpu["precision"]))
+        # The stems are about to change, so the cache no longer describes them
+        cache_path.unlink(missing_ok=True)
+        if previous is not None:
+            result = separate_and_analyze_incremental(track_path, tier, previous, previous_dir,
+                                                      overlap_seconds, cpu)
+        if result is not None:
+            drum_stem_path, sample_rate, trigger_data, features, stem_scales, fingerprint = result
+        elif jobs != 1:
+            # Separate and analyze segments across a process pool
+            drum_stem_path, sample_rate, trigger_data, features, stem_scales, fingerprint = \
+                separate_and_analyze_sharded(track_path, tier, jobs=jobs, segment_seconds=segment_seconds,
+                                             overlap_seconds=overlap_seconds, writer=writer, cpu=cpu)
+            separated = True
+        else:
+            drum_stem_path, sample_rate, drums, stem_scales, fingerprint = separate_stems(track_path, tier, cpu)
+            separated = True
+        manifest.record("separate", separate_inputs, separate_params,
+                        {"drums": drum_stem_path},
+                        meta={"samplerate": sample_rate, "stem_scales": stem_scales,
+                              "precision_check": {"requested": requested["precision"],
+                                                  "min_accuracy_db": requested["min_accuracy_db"],
+                                                  "used": cpu["precision"]}})
+
+    # Stage 2: analysis
+    hits_path = CHECKPOINT_DIR / "hits.json"
+    analyze_inputs = {"drums": drum_stem_path}
+    analyze_params = {"hit_config": HIT_CONFIG, "samplerate": sample_rate, "hop_length": 512}
+    if trigger_data is None and manifest.is_complete("analyze", analyze_inputs, analyze_params):
+        print("[4/4] ✓ Analysis checkpoint is current, skipping")
+        with open(manifest.artifact("analyze", "hits")) as f:
+            trigger_data = json.load(f)
+    else:
+        if trigger_data is None:
+            trigger_data, features = analyze_drum_hits(drum_stem_path, sample_rate, low_memory=low_memory,
+                                                       memory_budget_mb=memory_budget_mb, drums=drums)
+        write_json_atomic(hits_path, trigger_data, indent=None)
+        manifest.record("analyze", analyze_inputs, analyze_params, {"hits": hits_path})
+
+    # Leave a region cache behind for the next edit of this track (not when
+    # the separation checkpoint predates recording the stem scales)
+    if features is not None and stem_scales is not None:
+        if fingerprint is None:
+            import soundfile as sf
+            fingerprint = _fingerprint_track(track_path, sf.info(str(drum_stem_path)).channels, sample_rate)
+        incremental.save_cache(cache_path, fingerprint, features, sample_rate,
+                               region_cache_params(tier, cpu["precision"]), stem_scales)
+
+    if separated:
+        # Only full runs say anything about this machine's throughput
+        elapsed = time.time() - started
+        duration = quality_tiers.track_duration(track_path)
+        label = cpu_inference.config_label(cpu)
+        print(f"      ⏱ {duration / max(elapsed, 1e-6):.2f}x realtime "
+              f"({tier}, {label or 'fp32, default threads'}, jobs={jobs})")
+        quality_tiers.record_run(tier, duration, elapsed, jobs, config=label)
+    return trigger_data
+
+
+def _fast_analyze(manifest, track_path):
+    """Filterbank analysis of the mix as the only stage before export; no separation."""
+    hits_path = CHECKPOINT_DIR / "hits.json"
+    analyze_inputs = {"track": track_path}
+    analyze_params = {"mode": "fast", "bands": filterbank.FAST_BANDS, "hop_length": filterbank.HOP_LENGTH}
+    if manifest.is_complete("analyze", analyze_inputs, analyze_params):
+        print("[1/1] ✓ Analysis checkpoint is current, skipping")
+        with open(manifest.artifact("analyze", "hits")) as f:
+            return json.load(f)
+
+    print("[1/1] Analyzing the mix with the filterbank (fast mode, no separation)...")
+    started = time.time()
+    trigger_data = filterbank.analyze(track_path)
+    quality_tiers.record_run("fast", quality_tiers.track_duration(track_path), time.time() - started)
+    for drum_type, hits in trigger_data.items():
         print(f"      ✓ {drum_type.capitalize()}: {len(hits)} hits detected")
+    write_json_atomic(hits_path, trigger_data, indent=None)
+    manifest.record("analyze", analyze_inputs, analyze_params, {"hits": hits_path})
+    return trigger_data
 
-    return all_hits
+
+def resolve_quality(track_path, quality, deadline, jobs, cpu=None):
+    """The tier to run: ``quality`` itself, or for "auto" the best one estimated to meet ``deadline``."""
+    if quality != "auto":
+        return quality
+    duration = quality_tiers.track_duration(track_path)
+    tier, estimate = quality_tiers.choose_tier(duration, deadline, jobs=jobs,
+                                               config=cpu_inference.config_label(cpu))
+    budget = f"{deadline:.0f}s deadline" if deadline is not None else "no deadline"
+    print(f"Auto quality: '{tier}' for {duration:.0f}s of audio (~{estimate:.0f}s, {budget})")
+    return tier
+
+
+def start_background_upgrade(track_path, tier, args):
+    """Rerun the track at ``tier`` in a detached process once the quick result is published."""
+    command = [sys.executable, str(Path(__file__).resolve()), str(track_path),
+               "--quality", tier, "--output", args.output, "--jobs", str(args.jobs),
+               "--segment-seconds", str(args.segment_seconds),
+               "--overlap-seconds", str(args.overlap_seconds), "--no-stream"]
+    if args.low_memory:
+        command += ["--low-memory", "--memory-budget-mb", str(args.memory_budget_mb)]
+    command += ["--precision", args.precision, "--min-accuracy-db", str(args.min_accuracy_db)]
+    if args.threads:
+        command += ["--threads", str(args.threads)]
+    if args.interop_threads:
+        command += ["--interop-threads", str(args.interop_threads)]
+    if args.pin_cores:
+        command.append("--pin-cores")
+
+    kwargs = {}
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    with open("upgrade.log", "w") as log:
+        proc = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT,
+                                stdin=subprocess.DEVNULL, **kwargs)
+    print(f"↻ Upgrading to '{tier}' in the background (pid {proc.pid}, log: upgrade.log)")
 
 
 def main():
     """
     Main orchestration function.
     """
-    if len(sys.argv) < 2:
-        print("❌ ERROR: Please provide the path to an audio file.")
-        print(f"   Usage: python {sys.argv[0]} your_track.wav")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Separate a track and extract drum trigger data.")
+    parser.add_argument("track", help="audio file to process")
+    parser.add_argument("--quality", choices=[*QUALITY_TIERS, "auto"], default=DEFAULT_TIER,
+                        help="fast (filterbank, no Demucs), light (4-stem), standard (6-stem) or "
+                             "full (6-stem with shifts); auto picks one for --deadline (default: %(default)s)")
+    parser.add_argument("--fast", action="store_const", const="fast", dest="quality",
+                        help="same as --quality fast")
+    parser.add_argument("--deadline", type=float,
+                        help="seconds the run may take; with --quality auto the best tier estimated to fit is used")
+    parser.add_argument("--upgrade-to", choices=[tier for tier in QUALITY_TIERS if tier != "fast"],
+                        help="after publishing, rerun at this tier in the background if the run used a lower one")
+    parser.add_argument("--no-stream", action="store_true",
+                        help="don't write the partial hit stream (background upgrades keep the published result in use)")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="analyze the drum stem block by block instead of loading it whole")
+    parser.add_argument("--memory-budget-mb", type=int, default=block_analysis.DEFAULT_MEMORY_BUDGET_MB,
+                        help="working-set budget for --low-memory analysis (default: %(default)s)")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="worker processes; above 1 the track is split into segments (0 = all CPUs)")
+    parser.add_argument("--threads", type=int,
+                        help="intra-op threads per worker process (default: CPUs / --jobs)")
+    parser.add_argument("--interop-threads", type=int,
+                        help="torch inter-op threads per worker process (default: torch's)")
+    parser.add_argument("--pin-cores", action="store_true",
+                        help="pin each worker process to its own cores (Linux)")
+    parser.add_argument("--precision", choices=cpu_inference.PRECISIONS, default="fp32",
+                        help="CPU inference precision; int8 and bf16 are checked against fp32 on the "
+                             "first run and fall back to it if not accurate enough (default: %(default)s)")
+    parser.add_argument("--min-accuracy-db", type=float, default=cpu_inference.DEFAULT_MIN_ACCURACY_DB,
+                        help="worst per-stem SDR against fp32 that --precision must reach (default: %(default)s)")
+    parser.add_argument("--segment-seconds", type=float, default=60.0,
+                        help="segment length when --jobs is above 1 (default: %(default)s)")
+    parser.add_argument("--overlap-seconds", type=float, default=5.0,
+                        help="context margin on each side of a segment (default: %(default)s)")
+    parser.add_argument("--output", default="drum-data.json",
+                        help="where to publish the trigger data (default: %(default)s)")
+    parser.add_argument("--force", action="store_true",
+                        help="ignore checkpoints from earlier runs and redo every stage")
+    parser.add_argument("--no-incremental", action="store_true",
+                        help="separate an edited track in full instead of only its changed regions")
+    parser.add_argument("--previous-run",
+                        help="working directory of an earlier version of the track, to reuse its unchanged "
+                             "regions from (default: this directory)")
+    args = parser.parse_args()
 
-    track_path = Path(sys.argv[1]).resolve()
+    track_path = Path(args.track).resolve()
     if not track_path.exists():
         print(f"❌ ERROR: Input audio file not found at '{track_path}'")
-        sys.exit(1)
+        return 1
 
     print_header()
 
+    cpu = cpu_inference.cpu_config(args.threads, args.interop_threads, args.precision,
+                                   args.pin_cores, args.min_accuracy_db)
     try:
-        # 1. Separate audio into stems
-        drum_stem_path, sample_rate = separate_stems(track_path)
-
-        # 2. Analyze drum hits from the drum stem
-        trigger_data = analyze_drum_hits(drum_stem_path, sample_rate)
-
-        # 3. Save trigger data to JSON
-        output_json_path = Path("drum-data.json")
-        with open(output_json_path, "w") as f:
-            json.dump(trigger_data, f, indent=2)
-        print(f"\n✓ Successfully saved trigger data to {output_json_path}")
-
+        quality = resolve_quality(track_path, args.quality, args.deadline, args.jobs, cpu)
+        run_pipeline(track_path, quality=quality, low_memory=args.low_memory,
+                     memory_budget_mb=args.memory_budget_mb, jobs=args.jobs,
+                     segment_seconds=args.segment_seconds, overlap_seconds=args.overlap_seconds,
+                     output_path=Path(args.output), force=args.force, stream=not args.no_stream,
+                     reuse_regions=not args.no_incremental, previous_run=args.previous_run, cpu=cpu)
     except Exception as e:
         print(f"\nERROR: Audio processing failed. Reason: {e}")
-        sys.exit(1)
+        print("   Completed stages are checkpointed; rerun the same command to resume.")
+        return 1
+
+    if args.upgrade_to and quality_tiers.is_better(args.upgrade_to, quality):
+        start_background_upgrade(track_path, args.upgrade_to, args)
 
     print_footer()
+    return 0
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
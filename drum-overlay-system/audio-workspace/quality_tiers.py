@@ -0,0 +1,118 @@
+"""
+Quality tiers and deadline-driven tier selection.
+
+Tiers run from the filterbank fast path (no separation) through a 4-stem
+model to the 6-stem model with several shifts. Each completed run records how
+many seconds of processing one second of audio took on this machine, per
+worker count and CPU inference configuration (see cpu_inference.py), and
+``--quality auto`` uses those measurements to pick the best tier whose
+estimated runtime fits the requested deadline.
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+# Cheapest first. "fast" has no model: the mix goes through filterbank.py.
+QUALITY_TIERS = {
+    "fast": {"model": None},
+    "light": {"model": "htdemucs", "shifts": 0, "overlap": 0.1, "split": True, "segment": None},
+    "standard": {"model": "htdemucs_6s", "shifts": 1, "overlap": 0.25, "split": True, "segment": None},
+    "full": {"model": "htdemucs_6s", "shifts": 4, "overlap": 0.25, "split": True, "segment": None},
+}
+DEFAULT_TIER = "standard"
+
+# Used until a tier has been measured on this machine: fixed startup cost
+# (model load) plus seconds per second of audio, conservative CPU numbers.
+PRIOR_COST = {
+    "fast": {"overhead": 1.0, "seconds_per_second": 0.01},
+    "light": {"overhead": 5.0, "seconds_per_second": 0.25},
+    "standard": {"overhead": 5.0, "seconds_per_second": 0.5},
+    "full": {"overhead": 5.0, "seconds_per_second": 2.0},
+}
+
+THROUGHPUT_PATH = Path(__file__).resolve().parent / "throughput.json"
+
+# Weight of the newest measurement in the running average
+_SMOOTHING = 0.5
+
+
+def tier_settings(tier):
+    """Demucs apply_model() settings of a separating tier."""
+    return {key: value for key, value in QUALITY_TIERS[tier].items() if key != "model"}
+
+
+def _cost_key(tier, jobs, config=""):
+    key = tier if jobs == 1 else f"{tier}/jobs={jobs}"
+    return f"{key}/{config}" if config else key
+
+
+def load_throughput(path=THROUGHPUT_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def estimate_seconds(tier, duration, jobs=1, throughput=None, config=""):
+    """Expected wall time of a run of ``tier`` on ``duration`` seconds of audio."""
+    throughput = load_throughput() if throughput is None else throughput
+    measured = (throughput.get(_cost_key(tier, jobs, config)) or throughput.get(_cost_key(tier, jobs))
+                or throughput.get(tier))
+    rate = measured["seconds_per_second"] if measured else PRIOR_COST[tier]["seconds_per_second"]
+    return PRIOR_COST[tier]["overhead"] + rate * duration
+
+
+def record_run(tier, duration, elapsed, jobs=1, path=THROUGHPUT_PATH, config=""):
+    """
+    Fold a completed run's wall time into this machine's throughput for
+    ``tier``, ``jobs`` and the CPU configuration labelled ``config``.
+    """
+    if duration <= 0:
+        return
+    throughput = load_throughput(path)
+    rate = max(elapsed - PRIOR_COST[tier]["overhead"], 0.0) / duration
+    key = _cost_key(tier, jobs, config)
+    previous = throughput.get(key)
+    if previous:
+        rate = _SMOOTHING * rate + (1 - _SMOOTHING) * previous["seconds_per_second"]
+    throughput[key] = {"seconds_per_second": rate, "runs": (previous or {}).get("runs", 0) + 1,
+                       "updated_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(throughput, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def choose_tier(duration, deadline, jobs=1, max_tier="full", config=""):
+    """
+    Best tier up to ``max_tier`` whose estimate fits ``deadline`` seconds.
+
+    Returns ``(tier, estimate)``; falls back to "fast" when nothing fits.
+    """
+    throughput = load_throughput()
+    names = list(QUALITY_TIERS)
+    for tier in reversed(names[:names.index(max_tier) + 1]):
+        estimate = estimate_seconds(tier, duration, jobs, throughput, config)
+        if deadline is None or estimate <= deadline:
+            return tier, estimate
+    return "fast", estimate_seconds("fast", duration, jobs, throughput)
+
+
+def track_duration(path):
+    """Length of an audio file in seconds, from its header where possible."""
+    import soundfile as sf
+
+    try:
+        info = sf.info(str(path))
+        return info.frames / info.samplerate
+    except RuntimeError:
+        import librosa
+        return librosa.get_duration(path=str(path))
+
+
+def is_better(tier, other):
+    names = list(QUALITY_TIERS)
+    return names.index(tier) > names.index(other)
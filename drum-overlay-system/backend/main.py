@@ -1,21 +1,43 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, HTTPException
 from separation_pipeline import separate_for_overlay
+from separation_pipeline.scheduler import PRIORITY_CLASSES, PriorityScheduler
+import asyncio
+import os
 import shutil
 from pathlib import Path
 
 app = FastAPI()
 
+# Uploads from the frontend are "interactive" and jump ahead of queued
+# watched-folder and backfill work; SEPARATION_WORKERS sets the pool size.
+scheduler = PriorityScheduler(max_workers=int(os.environ.get("SEPARATION_WORKERS", "1")))
+
+
+def _run_separation(job, audio_path):
+    return separate_for_overlay(audio_path, job=job)
+
+
 @app.post("/separate")
-async def separate_audio(file: UploadFile = File(...)):
+async def separate_audio(file: UploadFile = File(...), priority: str = "interactive"):
+    if priority not in PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(PRIORITY_CLASSES)}")
+
     temp_path = Path("temp_audio") / file.filename
     temp_path.parent.mkdir(exist_ok=True)
 
     with open(temp_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
 
-    result = separate_for_overlay(temp_path)
+    job = scheduler.submit(_run_separation, temp_path, priority=priority, name=file.filename)
+    result = await asyncio.wrap_future(job.future)
     return {
         "track_id": result["track_id"],
         "manifest": str(result["manifest_path"]),
         "drum_stem": str(result["drum_stem"]),
-    }
\ No newline at end of file
+    }
+
+
+@app.get("/queues")
+async def queue_status():
+    """Per-priority-class queue depth, running jobs and wait times."""
+    return scheduler.stats()
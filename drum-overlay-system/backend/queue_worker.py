@@ -0,0 +1,253 @@
+"""
+Worker and admin CLI for the durable job queue (separation_pipeline/job_queue.py).
+
+Start workers on as many machines as you like, all pointing at the same
+database on a shared volume; each process leases one job at a time, keeps the
+lease alive with heartbeats while the job runs, and hands the job back on
+shutdown:
+
+    python queue_worker.py work --db /shared/jobs.sqlite --processes 4
+    python queue_worker.py enqueue --db /shared/jobs.sqlite /shared/music/song.wav --priority interactive
+    python queue_worker.py stats --db /shared/jobs.sqlite
+    python queue_worker.py requeue-dead --db /shared/jobs.sqlite
+
+Audio paths in jobs must be readable from every worker machine.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+
+from separation_pipeline import separate_for_overlay
+from separation_pipeline.job_queue import (DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, BACKOFF_BASE_SECONDS,
+                                           JobQueue, LeaseLost, default_worker_id)
+from separation_pipeline.scheduler import PRIORITY_CLASSES
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("queue_worker")
+
+
+class LeaseGuard:
+    """
+    Heartbeats one job's lease from a background thread while it runs.
+
+    Quacks like a scheduler Job (``on_preempt``/``preempt_requested``), so
+    separate_for_overlay() stops its subprocess when the lease is lost or the
+    worker is shutting down.
+    """
+
+    def __init__(self, db, job_id, worker_id, lease_seconds, stopping: threading.Event):
+        self.db = db
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.stopping = stopping
+        self.lost = False
+        self._hook = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._beat, daemon=True)
+        self._thread.start()
+
+    @property
+    def preempt_requested(self):
+        return self.lost or self.stopping.is_set()
+
+    def on_preempt(self, hook):
+        self._hook = hook
+        if hook is not None and self.preempt_requested:
+            hook()
+
+    def _beat(self):
+        # sqlite connections belong to one thread, so the heartbeat has its own
+        queue = JobQueue(self.db)
+        next_beat = time.monotonic() + self.lease_seconds / 3
+        interrupted = False
+        try:
+            # Wake often enough to pass a shutdown on promptly; renew every third of the lease
+            while not self._done.wait(min(0.5, self.lease_seconds / 3)):
+                if self.stopping.is_set() and not interrupted:
+                    interrupted = True
+                    self._interrupt()
+                if time.monotonic() < next_beat:
+                    continue
+                next_beat += self.lease_seconds / 3
+                try:
+                    queue.heartbeat(self.job_id, self.worker_id, self.lease_seconds)
+                except LeaseLost:
+                    logger.warning(f"Lost the lease on job {self.job_id}; stopping it")
+                    self.lost = True
+                    self._interrupt()
+                    return
+        finally:
+            queue.close()
+
+    def _interrupt(self):
+        if self._hook is not None:
+            self._hook()
+
+    def close(self):
+        self._done.set()
+        self._thread.join()
+
+
+def run_process_track(payload, guard):
+    """Separate and analyze one track; ``args`` are passed through to process_track.py."""
+    result = separate_for_overlay(Path(payload["audio_path"]), extra_args=payload.get("args", []), job=guard)
+    return {key: str(value) for key, value in result.items()}
+
+
+HANDLERS = {
+    "process_track": run_process_track,
+}
+
+
+def run_worker(db, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS, poll_seconds=2.0,
+               backoff_base_seconds=BACKOFF_BASE_SECONDS, drain=False):
+    """Lease and run jobs until SIGTERM/SIGINT, or with ``drain`` until the queue is empty."""
+    stopping = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stopping.set())
+
+    queue = JobQueue(db, backoff_base_seconds=backoff_base_seconds)
+    logger.info(f"Worker {worker_id} polling {db}")
+    while not stopping.is_set():
+        job = queue.claim(worker_id, lease_seconds, kinds=list(HANDLERS))
+        if job is None:
+            if drain and not _pending(queue):
+                break
+            stopping.wait(poll_seconds)
+            continue
+
+        logger.info(f"Job {job['id']} ({job['kind']}, {job['priority']}, attempt {job['attempts']}/{job['max_attempts']})")
+        guard = LeaseGuard(db, job["id"], worker_id, lease_seconds, stopping)
+        try:
+            result = HANDLERS[job["kind"]](job["payload"], guard)
+        except Exception as e:
+            outcome = "failed"
+            error = f"{type(e).__name__}: {e}"
+        else:
+            outcome = "done"
+        finally:
+            guard.close()
+
+        try:
+            if guard.lost:
+                logger.warning(f"Job {job['id']} was reclaimed by another worker; dropping this attempt")
+            elif stopping.is_set() and outcome == "failed":
+                queue.release(job["id"], worker_id)
+                logger.info(f"Job {job['id']} handed back for another worker")
+            elif outcome == "done":
+                queue.complete(job["id"], worker_id, result)
+                logger.info(f"✓ Job {job['id']} done")
+            else:
+                queue.fail(job["id"], worker_id, error)
+                logger.error(f"✗ Job {job['id']} failed: {error}")
+        except LeaseLost as e:
+            logger.warning(str(e))
+
+    queue.close()
+    logger.info(f"Worker {worker_id} stopped")
+
+
+def _pending(queue):
+    """Whether any job can still run: queued (including ones waiting out a backoff) or leased."""
+    return any(counts["queued"] or counts["leased"] for counts in queue.stats()["classes"].values())
+
+
+def cmd_work(args):
+    if args.processes == 1:
+        run_worker(args.db, args.worker_id or default_worker_id(), args.lease_seconds, args.poll_seconds,
+                   args.backoff_base_seconds, args.drain)
+        return 0
+
+    ctx = multiprocessing.get_context("spawn")
+    base_id = args.worker_id or default_worker_id()
+    workers = [ctx.Process(target=run_worker, name=f"worker-{i}",
+                           args=(args.db, f"{base_id}-{i}", args.lease_seconds, args.poll_seconds,
+                                 args.backoff_base_seconds, args.drain))
+               for i in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    # Pass a stop request on; each child hands its current job back before exiting
+    signal.signal(signal.SIGTERM, lambda *_: [worker.terminate() for worker in workers if worker.is_alive()])
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # Children got the same SIGINT and are handing their jobs back
+        for worker in workers:
+            worker.join()
+    return 0
+
+
+def cmd_enqueue(args):
+    queue = JobQueue(args.db)
+    for audio in args.audio:
+        path = Path(audio).resolve()
+        st = path.stat()
+        job_id = queue.enqueue("process_track", {"audio_path": str(path), "args": args.pipeline_args},
+                               priority=args.priority, max_attempts=args.max_attempts,
+                               dedupe_key=f"{path}:{st.st_size}:{st.st_mtime_ns}")
+        print(f"Queued {path.name} as job {job_id} ({args.priority})")
+    return 0
+
+
+def cmd_stats(args):
+    queue = JobQueue(args.db)
+    print(json.dumps({**queue.stats(), "dead_letters": queue.dead_letters(args.limit)}, indent=2))
+    return 0
+
+
+def cmd_requeue_dead(args):
+    count = JobQueue(args.db).requeue_dead(args.job_id)
+    print(f"Requeued {count} dead-lettered job(s)")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Durable separation job queue.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    work = sub.add_parser("work", help="run worker processes")
+    work.add_argument("--processes", type=int, default=1, help="worker processes on this machine")
+    work.add_argument("--worker-id", help="defaults to <hostname>-<pid>")
+    work.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                      help="lease length; heartbeats renew it every third of this (default: %(default)s)")
+    work.add_argument("--poll-seconds", type=float, default=2.0, help="idle wait between claims")
+    work.add_argument("--backoff-base-seconds", type=float, default=BACKOFF_BASE_SECONDS,
+                      help="first retry delay; doubles per attempt (default: %(default)s)")
+    work.add_argument("--drain", action="store_true", help="exit once no job is queued or running")
+    work.set_defaults(func=cmd_work)
+
+    enqueue = sub.add_parser("enqueue", help="queue audio files for process_track.py; "
+                                             "arguments after -- are passed to process_track.py")
+    enqueue.add_argument("audio", nargs="+")
+    enqueue.add_argument("--priority", choices=PRIORITY_CLASSES, default="watched")
+    enqueue.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+    enqueue.set_defaults(func=cmd_enqueue)
+
+    stats = sub.add_parser("stats", help="queue counts and recent dead letters")
+    stats.add_argument("--limit", type=int, default=20)
+    stats.set_defaults(func=cmd_stats)
+
+    requeue = sub.add_parser("requeue-dead", help="retry dead-lettered jobs")
+    requeue.add_argument("job_id", type=int, nargs="?", help="one job (default: all)")
+    requeue.set_defaults(func=cmd_requeue_dead)
+
+    for subparser in (work, enqueue, stats, requeue):
+        subparser.add_argument("--db", type=Path, required=True, help="queue database (on a shared volume for several machines)")
+
+    argv = sys.argv[1:]
+    split = argv.index("--") if "--" in argv else len(argv)
+    args = parser.parse_args(argv[:split])
+    args.pipeline_args = argv[split + 1:]
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Separation pipeline entry point for the backend.
+
+Importing this package is cheap: the torch/demucs/librosa work happens in a
+``process_track.py`` subprocess, so the API starts instantly and the heavy
+modules are only loaded while a track is actually processed.
+"""
+import hashlib
+import subprocess
+import sys
+from pathlib import Path
+
+from .manifest import MANIFEST_NAME, file_sha256
+from .scheduler import Preempted
+
+AUDIO_WORKSPACE = Path(__file__).resolve().parents[2] / "audio-workspace"
+PROCESS_TRACK = AUDIO_WORKSPACE / "process_track.py"
+TRACKS_DIR = AUDIO_WORKSPACE / "tracks"
+# Which track directory each source path was last processed into
+LATEST_DIR = TRACKS_DIR / "latest"
+
+
+def _latest_file(audio_path: Path) -> Path:
+    return LATEST_DIR / hashlib.sha1(str(audio_path).encode()).hexdigest()[:16]
+
+
+def separate_for_overlay(audio_path: Path, extra_args=(), job=None) -> dict:
+    """
+    Separate and analyze ``audio_path`` in its own working directory.
+
+    Each track gets a directory keyed by its content hash, so re-submitting
+    the same audio resumes from that directory's checkpoints. When a file
+    that was processed before comes back edited, the previous version's
+    directory is passed as ``--previous-run`` so only the changed regions
+    are separated again. When run as a
+    scheduler ``job``, preempting it terminates the subprocess and raises
+    Preempted; the requeued run picks up from the checkpoints.
+    """
+    audio_path = Path(audio_path).resolve()
+    track_id = file_sha256(audio_path)[:16]
+    workdir = TRACKS_DIR / track_id
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    extra_args = list(extra_args)
+    latest = _latest_file(audio_path)
+    if latest.exists():
+        previous = TRACKS_DIR / latest.read_text().strip()
+        if previous != workdir and previous.is_dir():
+            extra_args += ["--previous-run", str(previous)]
+
+    proc = subprocess.Popen(
+        [sys.executable, str(PROCESS_TRACK), str(audio_path), *extra_args],
+        cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+    )
+    if job is not None:
+        job.on_preempt(proc.terminate)
+    try:
+        stdout, stderr = proc.communicate()
+    finally:
+        if job is not None:
+            job.on_preempt(None)
+    if job is not None and job.preempt_requested:
+        raise Preempted(f"Preempted while processing {audio_path.name}")
+    if proc.returncode != 0:
+        tail = "\n".join((stdout + stderr).strip().splitlines()[-20:])
+        raise RuntimeError(f"process_track.py failed for {audio_path.name}:\n{tail}")
+
+    LATEST_DIR.mkdir(parents=True, exist_ok=True)
+    latest.write_text(track_id)
+
+    return {
+        "track_id": track_id,
+        "manifest_path": workdir / MANIFEST_NAME,
+        "drum_stem": workdir / "drums.wav",
+        "trigger_data": workdir / "drum-data.json",
+    }
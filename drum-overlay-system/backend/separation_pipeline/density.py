@@ -0,0 +1,189 @@
+"""
+Multi-resolution hit-density pyramid for overview rendering.
+
+Drawing a hit-density timeline of a two-hour set from the raw hit lists means
+walking every hit on every redraw. Instead, every export also writes a pyramid
+next to the trigger data (``drum-data.density.npz`` for ``drum-data.json``):
+
+- level 0 holds, per drum and per BASE_SECONDS window, the hit count, the
+  loudest velocity and the velocity sum (so means combine exactly);
+- each further level merges pairs of windows of the level below, up to a
+  single window covering the whole set.
+
+query() answers "``bins`` bins between ``start`` and ``end``" from the coarsest
+level whose windows are no wider than a bin, so it touches at most about two
+windows per bin: the cost follows the number of pixels, not the number of
+hits. Windows are assigned whole to the bin holding their midpoint, so a hit
+can land in the neighbouring bin when bin edges don't line up with windows.
+
+The pyramid covers the set up to its last hit; bins past that are empty.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .trigger_stream import replace_atomic
+
+BASE_SECONDS = 0.05
+DEFAULT_BINS = 1000
+MAX_BINS = 10000
+STATS = ("count", "max", "sum")
+
+
+def density_path_for(output_path: Path) -> Path:
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.stem + ".density.npz")
+
+
+def _merge_pairs(count, vmax, vsum):
+    """The next level up: each window merged with its right neighbour."""
+    if len(count) % 2:
+        count, vmax, vsum = (np.append(a, a.dtype.type(0)) for a in (count, vmax, vsum))
+    return (count.reshape(-1, 2).sum(axis=1, dtype=np.uint32),
+            vmax.reshape(-1, 2).max(axis=1),
+            vsum.reshape(-1, 2).sum(axis=1))
+
+
+def build_pyramid(trigger_data: Dict[str, List[list]], base_seconds: float = BASE_SECONDS) -> dict:
+    """Build the pyramid for ``{drum: [[time, velocity], ...]}`` trigger data."""
+    hits = {drum: np.asarray(drum_hits, dtype=np.float64).reshape(-1, 2)
+            for drum, drum_hits in trigger_data.items()}
+    last = max((float(h[:, 0].max()) for h in hits.values() if len(h)), default=0.0)
+    n_windows = int(last // base_seconds) + 1
+
+    drums = {}
+    for drum, h in hits.items():
+        index = np.clip((h[:, 0] // base_seconds).astype(np.int64), 0, n_windows - 1)
+        velocity = h[:, 1].astype(np.float32)
+        count = np.bincount(index, minlength=n_windows).astype(np.uint32)
+        vsum = np.bincount(index, weights=velocity, minlength=n_windows).astype(np.float32)
+        vmax = np.zeros(n_windows, dtype=np.float32)
+        np.maximum.at(vmax, index, velocity)
+
+        levels = [(count, vmax, vsum)]
+        while len(levels[-1][0]) > 1:
+            levels.append(_merge_pairs(*levels[-1]))
+        drums[drum] = {stat: [level[i] for level in levels] for i, stat in enumerate(STATS)}
+    return {"base_seconds": base_seconds, "windows": n_windows, "drums": drums}
+
+
+def write_pyramid(path: Path, pyramid: dict):
+    """Store ``pyramid`` as one array per drum and statistic, levels concatenated."""
+    path = Path(path)
+    arrays = {f"{drum}_{stat}": np.concatenate(levels[stat])
+              for drum, levels in pyramid["drums"].items() for stat in STATS}
+    meta = {"base_seconds": pyramid["base_seconds"], "windows": pyramid["windows"],
+            "drums": list(pyramid["drums"])}
+    tmp_path = path.with_name(f".{path.stem}.tmp.npz")
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(f, meta=np.array(json.dumps(meta)), **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    replace_atomic(tmp_path, path)
+
+
+def load_pyramid(path: Path) -> Optional[dict]:
+    """The pyramid stored at ``path``, or None if it's missing or unreadable."""
+    try:
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            # Level k has ceil(windows / 2^k) windows, down to a single one
+            sizes = [meta["windows"]]
+            while sizes[-1] > 1:
+                sizes.append((sizes[-1] + 1) // 2)
+            bounds = np.cumsum([0] + sizes)
+            drums = {}
+            for drum in meta["drums"]:
+                drums[drum] = {}
+                for stat in STATS:
+                    flat = data[f"{drum}_{stat}"]
+                    drums[drum][stat] = [flat[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+    except (OSError, KeyError, ValueError):
+        return None
+    return {"base_seconds": meta["base_seconds"], "windows": meta["windows"], "drums": drums}
+
+
+_cache: Dict[str, tuple] = {}
+
+
+def pyramid_for(trigger_path: Path) -> Optional[dict]:
+    """
+    The pyramid for the trigger data at ``trigger_path``, cached until either
+    file changes. Trigger data without a current pyramid beside it (from an
+    older run, or analyze_drums.py) has one built from its hits instead.
+    """
+    trigger_path = Path(trigger_path)
+    density_path = density_path_for(trigger_path)
+    try:
+        trigger_mtime = trigger_path.stat().st_mtime_ns
+    except OSError:
+        return None
+    try:
+        density_mtime = density_path.stat().st_mtime_ns
+    except OSError:
+        density_mtime = None
+
+    key = str(trigger_path.resolve())
+    cached = _cache.get(key)
+    if cached is not None and cached[:2] == (trigger_mtime, density_mtime):
+        return cached[2]
+
+    # Exports write the trigger data first, so an older pyramid is stale
+    pyramid = None
+    if density_mtime is not None and density_mtime >= trigger_mtime:
+        pyramid = load_pyramid(density_path)
+    if pyramid is None:
+        try:
+            with open(trigger_path) as f:
+                pyramid = build_pyramid(json.load(f))
+        except (OSError, ValueError):
+            return None
+    _cache[key] = (trigger_mtime, density_mtime, pyramid)
+    return pyramid
+
+
+def query(pyramid: dict, start: float = 0.0, end: Optional[float] = None, bins: int = DEFAULT_BINS) -> dict:
+    """
+    Hit count, loudest and mean velocity per drum in ``bins`` equal bins from
+    ``start`` to ``end`` seconds (default: the whole set). Bins are never
+    narrower than BASE_SECONDS, so fewer may come back than were asked for.
+    """
+    base = pyramid["base_seconds"]
+    if end is None:
+        end = pyramid["windows"] * base
+    if not (np.isfinite(start) and np.isfinite(end) and end > start >= 0):
+        raise ValueError("Need finite times with 0 <= start < end")
+    bins = max(1, min(int(bins), MAX_BINS, int(np.ceil((end - start) / base - 1e-9))))
+    bin_seconds = (end - start) / bins
+
+    # The coarsest level whose windows still fit in a bin
+    n_levels = len(next(iter(pyramid["drums"].values()))["count"]) if pyramid["drums"] else 1
+    level = min(n_levels - 1, max(0, int(np.floor(np.log2(bin_seconds / base) + 1e-9))))
+    window = base * 2 ** level
+
+    # Windows overlapping [start, end), allowing for float error at edges that line up
+    first = int(np.floor(start / window + 1e-9))
+    last = int(np.ceil(end / window - 1e-9))
+    result = {"start": start, "end": end, "bins": bins, "bin_seconds": bin_seconds,
+              "level": level, "window_seconds": window, "drums": {}}
+    for drum, levels in pyramid["drums"].items():
+        count = levels["count"][level][first:last]
+        vmax = levels["max"][level][first:last]
+        vsum = levels["sum"][level][first:last]
+        midpoints = (np.arange(first, first + len(count)) + 0.5) * window
+        target = np.clip(((midpoints - start) // bin_seconds).astype(np.int64), 0, bins - 1)
+
+        bin_count = np.bincount(target, weights=count, minlength=bins)
+        bin_sum = np.bincount(target, weights=vsum, minlength=bins)
+        bin_max = np.zeros(bins)
+        np.maximum.at(bin_max, target, vmax)
+        mean = np.divide(bin_sum, bin_count, out=np.zeros(bins), where=bin_count > 0)
+        result["drums"][drum] = {
+            "count": bin_count.astype(int).tolist(),
+            "max_velocity": np.round(bin_max, 4).tolist(),
+            "mean_velocity": np.round(mean, 4).tolist(),
+        }
+    return result
@@ -0,0 +1,166 @@
+"""
+Persistent index of processed input files, for watchers that restart.
+
+Each processed file is recorded with its size, mtime and content hash and
+where its result went. On startup, scan() walks the watch roots and returns
+only the files that are new or changed since they were processed, so nothing
+dropped while the watcher was down is missed and nothing already done is
+redone.
+
+The scan is built for large libraries: the index is read in one query, the
+walk uses os.scandir, and unchanged files cost one stat each. Content is
+hashed only where it can change the answer: a file whose mtime moved but
+whose size did not (touched, or edited in place), and a new file whose size
+matches some processed file (a moved or renamed copy of audio that is already
+done, which reuses that result instead of being reprocessed).
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .manifest import file_sha256
+
+INDEX_NAME = "processed-index.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    result TEXT,
+    processed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_size ON files (size);
+"""
+
+
+def iter_files(roots: Iterable[Path], extensions, recursive: bool = True,
+               exclude: Iterable[Path] = ()) -> Iterator[Tuple[Path, os.stat_result]]:
+    """Yield ``(path, stat)`` for files under ``roots`` with one of ``extensions``."""
+    excluded = {str(Path(p).resolve()) for p in exclude}
+    pending = [str(Path(root).resolve()) for root in roots]
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and entry.path not in excluded and not entry.name.startswith("."):
+                        pending.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in extensions:
+                    yield Path(entry.path), entry.stat()
+            except OSError:
+                continue  # Removed while we were looking
+
+
+class FileIndex:
+    """SQLite-backed record of processed inputs; safe to share between threads."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def get(self, path: Path) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM files WHERE path = ?", (str(Path(path).resolve()),)).fetchone()
+        return dict(row) if row else None
+
+    def record(self, path: Path, stat: os.stat_result, result, sha256: Optional[str] = None):
+        """
+        Mark ``path`` as processed, as it was when ``stat`` was taken.
+
+        Pass the stat from before processing started: if the file changed
+        during the run, the next scan sees the difference and processes it again.
+        """
+        path = Path(path).resolve()
+        self.record_many([(path, stat, result, sha256 or file_sha256(path))])
+
+    def record_many(self, entries: Iterable[Tuple[Path, os.stat_result, object, str]]):
+        """Record ``(path, stat, result, sha256)`` entries in one transaction."""
+        now = time.time()
+        rows = [(str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns, sha256,
+                 None if result is None else str(result), now)
+                for path, stat, result, sha256 in entries]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256, result, processed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def is_current(self, path: Path, stat: os.stat_result) -> bool:
+        """Whether ``path`` was processed at this size and mtime (no hashing)."""
+        entry = self.get(path)
+        return entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+    def needs_processing(self, path: Path, stat: os.stat_result) -> bool:
+        """Like a one-file scan(): False for unchanged files and for touched or moved copies of processed audio."""
+        path = Path(path).resolve()
+        with self._lock:
+            rows = self._conn.execute("SELECT path, size, mtime_ns, sha256, result FROM files"
+                                      " WHERE path = ? OR size = ?", (str(path), stat.st_size)).fetchall()
+        return bool(self._reconcile([(path, stat)], rows)[0])
+
+    def scan(self, roots: Iterable[Path], extensions, recursive: bool = True,
+             exclude: Iterable[Path] = ()) -> Tuple[List[Path], Dict[str, int]]:
+        """
+        Walk ``roots`` and return ``(files to process, counts)``.
+
+        Files whose content was already processed under another path or
+        mtime are recorded against the existing result and not returned.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT path, size, mtime_ns, sha256, result FROM files").fetchall()
+        return self._reconcile(iter_files(roots, extensions, recursive, exclude), rows)
+
+    # Internals
+
+    def _reconcile(self, files, rows):
+        known = {row["path"]: row for row in rows}
+        by_size = defaultdict(list)
+        for row in rows:
+            by_size[row["size"]].append(row)
+
+        counts = {"seen": 0, "unchanged": 0, "reused": 0, "new": 0, "changed": 0, "hashed": 0}
+        todo, reuse = [], []
+        for path, st in files:
+            counts["seen"] += 1
+            entry = known.get(str(path))
+            if entry is not None and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                counts["unchanged"] += 1
+                continue
+
+            candidates = [entry] if entry is not None and entry["size"] == st.st_size else []
+            candidates += [row for row in by_size.get(st.st_size, ()) if row is not entry]
+            match, digest = None, None
+            if candidates:
+                try:
+                    digest = file_sha256(path)
+                except OSError:
+                    continue
+                counts["hashed"] += 1
+                match = next((row for row in candidates if row["sha256"] == digest), None)
+
+            if match is not None:
+                counts["reused"] += 1
+                reuse.append((path, st, match["result"], digest))
+            else:
+                counts["changed" if entry is not None else "new"] += 1
+                todo.append(path)
+
+        if reuse:
+            self.record_many(reuse)
+        return todo, counts
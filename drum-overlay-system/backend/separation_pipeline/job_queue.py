@@ -0,0 +1,276 @@
+"""
+Durable job queue in SQLite.
+
+Jobs survive crashes and restarts, and any number of worker processes, on one
+machine or on several sharing the database file, can pull from the same
+queue (see queue_worker.py):
+
+- claim() leases the best available job to one worker for ``lease_seconds``;
+  the worker extends the lease with heartbeat() while it runs.
+- A job whose lease runs out (the worker crashed or hung) goes back to the
+  queue and counts as a failed attempt.
+- fail() retries with exponential backoff until ``max_attempts`` is reached,
+  then the job is dead-lettered and kept for inspection and requeue_dead().
+
+Priority classes match the in-process scheduler: interactive before watched
+before backfill, oldest first within a class.
+
+Every state change is a single short BEGIN IMMEDIATE transaction, so two
+workers can never lease the same job. The default rollback journal is kept
+because WAL mode does not work on network shares.
+"""
+import json
+import os
+import random
+import socket
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+from .scheduler import PRIORITY_CLASSES
+
+DEFAULT_LEASE_SECONDS = 60.0
+DEFAULT_MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 5.0
+BACKOFF_MAX_SECONDS = 600.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    heartbeat_at REAL,
+    dedupe_key TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    last_error TEXT,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, priority, available_at, id);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe_key)
+    WHERE dedupe_key IS NOT NULL AND state IN ('queued', 'leased');
+"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def backoff_seconds(attempts: int, base: float = BACKOFF_BASE_SECONDS) -> float:
+    """Delay before retry number ``attempts``: doubling from ``base``, capped, with jitter."""
+    delay = min(BACKOFF_MAX_SECONDS, base * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class LeaseLost(Exception):
+    """The worker no longer holds the job's lease (it expired and was reclaimed)."""
+
+
+class JobQueue:
+    """A SQLite-backed job table shared by producers and workers."""
+
+    def __init__(self, path: Path, timeout: float = 30.0, backoff_base_seconds: float = BACKOFF_BASE_SECONDS):
+        self.path = Path(path)
+        self.backoff_base_seconds = backoff_base_seconds
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=timeout, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _transaction(self):
+        return _Transaction(self._conn)
+
+    def enqueue(self, kind: str, payload: dict, priority: str = "watched",
+                max_attempts: int = DEFAULT_MAX_ATTEMPTS, dedupe_key: Optional[str] = None) -> int:
+        """
+        Add a job and return its id. With ``dedupe_key``, a job that is
+        already queued or running under the same key is returned instead.
+        """
+        now = time.time()
+        with self._transaction():
+            if dedupe_key is not None:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE dedupe_key = ? AND state IN ('queued', 'leased')",
+                    (dedupe_key,)).fetchone()
+                if row:
+                    return row["id"]
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (kind, payload, priority, max_attempts, available_at, dedupe_key, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload), PRIORITY_CLASSES.index(priority), max_attempts, now,
+                 dedupe_key, now))
+            return cursor.lastrowid
+
+    def claim(self, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+              kinds=None) -> Optional[dict]:
+        """Lease the highest-priority ready job to ``worker_id``; None when nothing is ready."""
+        now = time.time()
+        with self._transaction():
+            self._reap_expired(now)
+            query = "SELECT * FROM jobs WHERE state = 'queued' AND available_at <= ?"
+            params = [now]
+            if kinds:
+                query += f" AND kind IN ({', '.join('?' * len(kinds))})"
+                params += list(kinds)
+            row = self._conn.execute(query + " ORDER BY priority, available_at, id LIMIT 1", params).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET state = 'leased', attempts = attempts + 1, lease_owner = ?,"
+                " lease_expires = ?, heartbeat_at = ?, started_at = ? WHERE id = ?",
+                (worker_id, now + lease_seconds, now, now, row["id"]))
+        job = dict(row)
+        job["attempts"] += 1
+        job["payload"] = json.loads(job["payload"])
+        job["priority"] = PRIORITY_CLASSES[job["priority"]]
+        return job
+
+    def heartbeat(self, job_id: int, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        """Extend the lease; raises LeaseLost if another worker has taken the job over."""
+        now = time.time()
+        with self._transaction():
+            updated = self._conn.execute(
+                "UPDATE jobs SET lease_expires = ?, heartbeat_at = ?"
+                " WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (now + lease_seconds, now, job_id, worker_id)).rowcount
+        if not updated:
+            raise LeaseLost(f"Job {job_id} is no longer leased to {worker_id}")
+
+    def complete(self, job_id: int, worker_id: str, result=None):
+        self._finish(job_id, worker_id,
+                     "UPDATE jobs SET state = 'done', finished_at = ?, result = ?, lease_owner = NULL,"
+                     " lease_expires = NULL WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                     (time.time(), json.dumps(result), job_id, worker_id))
+
+    def fail(self, job_id: int, worker_id: str, error: str, retry: bool = True):
+        """Record a failed attempt: retry after a backoff, or dead-letter once attempts run out."""
+        now = time.time()
+        with self._transaction():
+            row = self._conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (job_id, worker_id)).fetchone()
+            if row is None:
+                raise LeaseLost(f"Job {job_id} is no longer leased to {worker_id}")
+            self._retry_or_bury(job_id, row["attempts"], row["max_attempts"] if retry else 0, error, now)
+
+    def release(self, job_id: int, worker_id: str):
+        """Hand a job back without counting the attempt (e.g. the worker is shutting down)."""
+        self._finish(job_id, worker_id,
+                     "UPDATE jobs SET state = 'queued', attempts = attempts - 1, lease_owner = NULL,"
+                     " lease_expires = NULL WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                     (job_id, worker_id))
+
+    def requeue_dead(self, job_id: Optional[int] = None) -> int:
+        """
+        Give dead-lettered jobs (one, or all) a fresh set of attempts; returns
+        how many. A dead job whose ``dedupe_key`` is already queued or running
+        again (e.g. the watcher re-enqueued the file) is left dead, and of
+        several dead jobs with the same key only the newest is requeued.
+        """
+        query = "SELECT id, dedupe_key FROM jobs WHERE state = 'dead'"
+        params = []
+        if job_id is not None:
+            query += " AND id = ?"
+            params.append(job_id)
+        requeued = 0
+        with self._transaction():
+            for row in self._conn.execute(query + " ORDER BY id DESC", params).fetchall():
+                if row["dedupe_key"] is not None and self._conn.execute(
+                        "SELECT 1 FROM jobs WHERE dedupe_key = ? AND state IN ('queued', 'leased')",
+                        (row["dedupe_key"],)).fetchone():
+                    continue
+                self._conn.execute(
+                    "UPDATE jobs SET state = 'queued', attempts = 0, available_at = ?, finished_at = NULL"
+                    " WHERE id = ?", (time.time(), row["id"]))
+                requeued += 1
+        return requeued
+
+    def get(self, job_id: int) -> Optional[dict]:
+        row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def dead_letters(self, limit: int = 100):
+        rows = self._conn.execute(
+            "SELECT * FROM jobs WHERE state = 'dead' ORDER BY finished_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def stats(self) -> dict:
+        """Job counts per state and priority class, plus the oldest ready job's wait."""
+        now = time.time()
+        counts = {cls: {"queued": 0, "leased": 0, "done": 0, "dead": 0} for cls in PRIORITY_CLASSES}
+        for row in self._conn.execute("SELECT priority, state, COUNT(*) AS n FROM jobs GROUP BY priority, state"):
+            counts[PRIORITY_CLASSES[row["priority"]]][row["state"]] = row["n"]
+        oldest = self._conn.execute(
+            "SELECT MIN(available_at) AS t FROM jobs WHERE state = 'queued' AND available_at <= ?",
+            (now,)).fetchone()["t"]
+        workers = [row["lease_owner"] for row in self._conn.execute(
+            "SELECT DISTINCT lease_owner FROM jobs WHERE state = 'leased'")]
+        return {"classes": counts, "oldest_ready_seconds": now - oldest if oldest else 0.0,
+                "active_workers": workers}
+
+    # Internals
+
+    def _finish(self, job_id, worker_id, query, params):
+        with self._transaction():
+            if not self._conn.execute(query, params).rowcount:
+                raise LeaseLost(f"Job {job_id} is no longer leased to {worker_id}")
+
+    def _reap_expired(self, now):
+        """Requeue (or dead-letter) leased jobs whose worker stopped heartbeating."""
+        expired = self._conn.execute(
+            "SELECT id, attempts, max_attempts, lease_owner FROM jobs WHERE state = 'leased' AND lease_expires < ?",
+            (now,)).fetchall()
+        for row in expired:
+            self._retry_or_bury(row["id"], row["attempts"], row["max_attempts"],
+                                f"Lease held by {row['lease_owner']} expired", now)
+
+    def _retry_or_bury(self, job_id, attempts, max_attempts, error, now):
+        if attempts < max_attempts:
+            self._conn.execute(
+                "UPDATE jobs SET state = 'queued', available_at = ?, last_error = ?, lease_owner = NULL,"
+                " lease_expires = NULL WHERE id = ?",
+                (now + backoff_seconds(attempts, self.backoff_base_seconds), error, job_id))
+        else:
+            self._conn.execute(
+                "UPDATE jobs SET state = 'dead', finished_at = ?, last_error = ?, lease_owner = NULL,"
+                " lease_expires = NULL WHERE id = ?",
+                (now, error, job_id))
+
+    @staticmethod
+    def _row_to_dict(row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["priority"] = PRIORITY_CLASSES[job["priority"]]
+        return job
+
+
+class _Transaction:
+    """
+    BEGIN IMMEDIATE ... COMMIT around a block, rolled back on error. Taking the
+    write lock up front means a read-then-write never fails to upgrade its lock.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        return False
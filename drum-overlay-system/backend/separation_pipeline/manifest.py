@@ -0,0 +1,120 @@
+"""
+Stage manifest for resumable pipeline runs.
+
+Each stage records the content hashes of its inputs, the parameters it ran
+with and the artifacts it produced. On a rerun a stage is reused only while
+all three still match, so changing analysis parameters skips separation, and
+a new separation (different drum stem) invalidates analysis automatically.
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+MANIFEST_NAME = "pipeline-manifest.json"
+MANIFEST_VERSION = 1
+
+_HASH_CHUNK = 1 << 20
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def params_digest(params: dict) -> str:
+    """Stable hash of a JSON-serializable parameter dict."""
+    encoded = json.dumps(params, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class StageManifest:
+    """Persistent record of completed pipeline stages in one working directory."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.data = {"version": MANIFEST_VERSION, "stages": {}, "hashes": {}}
+        if self.path.exists():
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = None  # Unreadable manifest: every stage reruns
+            if data and data.get("version") == MANIFEST_VERSION:
+                self.data = data
+
+    def fingerprint(self, path: Path) -> dict:
+        """Size, mtime and content hash of a file; the hash is cached while size and mtime hold."""
+        path = Path(path)
+        st = path.stat()
+        key = str(path.resolve())
+        cached = self.data["hashes"].get(key)
+        if cached and cached["size"] == st.st_size and cached["mtime_ns"] == st.st_mtime_ns:
+            return cached
+
+        fp = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_sha256(path)}
+        self.data["hashes"][key] = fp
+        return fp
+
+    def is_complete(self, stage: str, inputs: Dict[str, Path], params: dict) -> bool:
+        """Whether ``stage`` already ran on these inputs and params and its artifacts are intact."""
+        entry = self.data["stages"].get(stage)
+        if entry is None or entry["params_digest"] != params_digest(params):
+            return False
+
+        if set(entry["inputs"]) != set(inputs):
+            return False
+        for name, path in inputs.items():
+            if not Path(path).exists():
+                return False
+            if self.fingerprint(path)["sha256"] != entry["inputs"][name]["sha256"]:
+                return False
+
+        for artifact in entry["artifacts"].values():
+            path = Path(artifact["path"])
+            if not path.exists():
+                return False
+            st = path.stat()
+            if st.st_size != artifact["size"] or st.st_mtime_ns != artifact["mtime_ns"]:
+                return False
+        return True
+
+    def record(self, stage: str, inputs: Dict[str, Path], params: dict,
+               artifacts: Dict[str, Path], meta: Optional[dict] = None):
+        """Mark ``stage`` complete and persist the manifest."""
+        recorded_artifacts = {}
+        for name, path in artifacts.items():
+            st = Path(path).stat()
+            recorded_artifacts[name] = {"path": str(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+        self.data["stages"][stage] = {
+            "inputs": {name: {"path": str(path), **self.fingerprint(path)} for name, path in inputs.items()},
+            "params": params,
+            "params_digest": params_digest(params),
+            "artifacts": recorded_artifacts,
+            "meta": meta or {},
+            "completed_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self.save()
+
+    def artifact(self, stage: str, name: str) -> Path:
+        return Path(self.data["stages"][stage]["artifacts"][name]["path"])
+
+    def meta(self, stage: str) -> dict:
+        return self.data["stages"][stage]["meta"]
+
+    def clear(self):
+        self.data["stages"] = {}
+        self.save()
+
+    def save(self):
+        """Write the manifest atomically so an interrupted run never leaves it half-written."""
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
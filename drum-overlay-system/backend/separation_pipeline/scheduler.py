@@ -0,0 +1,242 @@
+"""
+Priority scheduling for separation jobs.
+
+Jobs are submitted in one of three priority classes, highest first:
+
+    interactive  uploads from the frontend (App.tsx -> /separate)
+    watched      files dropped into a watched folder
+    backfill     bulk catalog reprocessing
+
+Workers always take the oldest job of the highest class that is under its
+concurrency limit, so interactive work jumps ahead of everything queued. When
+all workers are busy and higher-priority work is waiting, running backfill
+jobs that registered a preempt hook are stopped and requeued at the front of
+their class; process_track.py checkpoints its stages, so the rerun resumes
+where it was stopped. Per-class queue wait times are kept for status pages.
+"""
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+PRIORITY_CLASSES = ("interactive", "watched", "backfill")
+DEFAULT_LIMITS = {"interactive": 1, "watched": 1, "backfill": 1}
+PREEMPTIBLE_CLASSES = {"backfill"}
+
+# Recent waits kept per class for the wait-time summary
+WAIT_HISTORY = 200
+
+logger = logging.getLogger(__name__)
+
+
+class Preempted(Exception):
+    """Raised by a job function that stopped because the scheduler preempted it."""
+
+
+class Job:
+    """One unit of work; ``future`` resolves with the function's result."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, fn, args, kwargs, priority, name):
+        self.id = next(self._ids)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.name = name or getattr(fn, "__name__", "job")
+        self.future = Future()
+        self.state = "queued"
+        self.submitted_at = time.time()
+        self.queued_at = self.submitted_at
+        self.started_at = None
+        self.finished_at = None
+        self.preemptions = 0
+        self.preempt_requested = False
+        self._preempt_hook = None
+        self._scheduler = None
+
+    def on_preempt(self, hook: Optional[Callable[[], None]]):
+        """Register how to stop this job early (e.g. terminate its subprocess); None clears it."""
+        self._preempt_hook = hook
+        if hook is not None and self.preempt_requested:
+            hook()
+        elif hook is not None and self._scheduler is not None:
+            # Work may already be waiting on this job's worker
+            self._scheduler._reconsider()
+
+    def wait(self, timeout=None):
+        return self.future.result(timeout)
+
+    def describe(self) -> dict:
+        return {"id": self.id, "name": self.name, "priority": self.priority, "state": self.state,
+                "submitted_at": self.submitted_at, "started_at": self.started_at,
+                "finished_at": self.finished_at, "preemptions": self.preemptions}
+
+
+class PriorityScheduler:
+    """Thread pool that runs jobs by priority class with per-class concurrency limits."""
+
+    def __init__(self, max_workers: int = 1, limits: Optional[Dict[str, int]] = None, preempt: bool = True):
+        self.max_workers = max_workers
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.preempt = preempt
+        self._cond = threading.Condition()
+        self._queues = {cls: deque() for cls in PRIORITY_CLASSES}
+        self._running = {cls: [] for cls in PRIORITY_CLASSES}
+        self._waits = {cls: deque(maxlen=WAIT_HISTORY) for cls in PRIORITY_CLASSES}
+        self._counts = {cls: {"completed": 0, "failed": 0, "preempted": 0} for cls in PRIORITY_CLASSES}
+        self._shutdown = False
+        self._threads = [threading.Thread(target=self._worker, name=f"scheduler-{i}", daemon=True)
+                         for i in range(max_workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args, priority: str = "watched", name: Optional[str] = None, **kwargs) -> Job:
+        """
+        Queue ``fn(job, *args, **kwargs)`` in ``priority``'s class.
+
+        The function gets its Job first so it can register a preempt hook.
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class '{priority}' (expected one of {', '.join(PRIORITY_CLASSES)})")
+        job = Job(fn, args, kwargs, priority, name)
+        job._scheduler = self
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Scheduler is shut down")
+            self._queues[priority].append(job)
+            self._preempt_for_waiting()
+            self._cond.notify_all()
+        return job
+
+    def stats(self) -> dict:
+        """Per-class queue depth, running jobs, outcomes and queue wait times (seconds)."""
+        now = time.time()
+        with self._cond:
+            classes = {}
+            for cls in PRIORITY_CLASSES:
+                waits = sorted(self._waits[cls])
+                queued = self._queues[cls]
+                classes[cls] = {
+                    "limit": self.limits[cls],
+                    "queued": len(queued),
+                    "running": [job.describe() for job in self._running[cls]],
+                    **self._counts[cls],
+                    "wait_seconds": {
+                        "count": len(waits),
+                        "mean": sum(waits) / len(waits) if waits else 0.0,
+                        "p95": waits[min(len(waits) - 1, int(0.95 * len(waits)))] if waits else 0.0,
+                        "max": waits[-1] if waits else 0.0,
+                    },
+                    "oldest_queued_seconds": now - min(job.queued_at for job in queued) if queued else 0.0,
+                }
+            return {"max_workers": self.max_workers, "classes": classes}
+
+    def shutdown(self, wait: bool = True):
+        """Stop taking new work; queued jobs are cancelled, running ones finish."""
+        with self._cond:
+            self._shutdown = True
+            for queue in self._queues.values():
+                while queue:
+                    job = queue.popleft()
+                    if not job.future.cancel():
+                        # Requeued after preemption, so its future is already running
+                        job.future.set_exception(RuntimeError("Scheduler shut down"))
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    # Internals; everything below runs with self._cond held unless noted.
+
+    def _running_total(self):
+        return sum(len(jobs) for jobs in self._running.values())
+
+    def _next_job(self):
+        for cls in PRIORITY_CLASSES:
+            if self._queues[cls] and len(self._running[cls]) < self.limits[cls]:
+                return self._queues[cls].popleft()
+        return None
+
+    def _preempt_for_waiting(self):
+        """Stop enough preemptible lower-class jobs to give waiting higher-class jobs a worker."""
+        if not self.preempt:
+            return
+        # Workers that are free now or will be once already-preempted jobs stop
+        available = self.max_workers - self._running_total()
+        available += sum(job.preempt_requested for jobs in self._running.values() for job in jobs)
+        for rank, cls in enumerate(PRIORITY_CLASSES):
+            runnable = max(0, min(len(self._queues[cls]), self.limits[cls] - len(self._running[cls])))
+            take = min(runnable, available)
+            available -= take
+            needed = runnable - take
+            if needed <= 0:
+                continue
+
+            candidates = [job for lower_cls in reversed(PRIORITY_CLASSES[rank + 1:])
+                          if lower_cls in PREEMPTIBLE_CLASSES
+                          for job in sorted(self._running[lower_cls], key=lambda j: j.started_at, reverse=True)
+                          if not job.preempt_requested and job._preempt_hook is not None]
+            for job in candidates[:needed]:
+                logger.info(f"Preempting {job.priority} job {job.name} for waiting {cls} work")
+                job.preempt_requested = True
+                try:
+                    job._preempt_hook()
+                except Exception as e:
+                    logger.warning(f"Preempt hook of {job.name} failed: {e}")
+
+    def _reconsider(self):
+        with self._cond:
+            self._preempt_for_waiting()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None and not self._shutdown:
+                    self._cond.wait()
+                    job = self._next_job()
+                if job is None:
+                    return
+                # A requeued job's future is already running and stays that way
+                if job.preemptions == 0 and not job.future.set_running_or_notify_cancel():
+                    continue
+                job.state = "running"
+                job.started_at = time.time()
+                self._waits[job.priority].append(job.started_at - job.queued_at)
+                self._running[job.priority].append(job)
+
+            # The job itself runs without the lock held
+            outcome, value = "completed", None
+            try:
+                value = job.fn(job, *job.args, **job.kwargs)
+            except BaseException as e:
+                # A job whose hook killed its work may fail with its own error instead of Preempted
+                if isinstance(e, Preempted) or job.preempt_requested:
+                    outcome = "preempted"
+                else:
+                    outcome, value = "failed", e
+
+            with self._cond:
+                self._running[job.priority].remove(job)
+                job._preempt_hook = None
+                self._counts[job.priority][outcome] += 1
+                if outcome == "preempted":
+                    # Back to the front of its class; the checkpointed rerun resumes
+                    job.state = "queued"
+                    job.preemptions += 1
+                    job.preempt_requested = False
+                    job.queued_at = time.time()
+                    self._queues[job.priority].appendleft(job)
+                else:
+                    job.state = "done" if outcome == "completed" else "failed"
+                    job.finished_at = time.time()
+                    if outcome == "completed":
+                        job.future.set_result(value)
+                    else:
+                        job.future.set_exception(value)
+                self._cond.notify_all()
@@ -0,0 +1,151 @@
+"""
+Incremental trigger-data output.
+
+While a track is processed, hits are appended in time order to a JSON-lines
+file next to the final output (``drum-data.partial.jsonl`` for
+``drum-data.json``) so the overlay and status page can show results early:
+
+    {"type": "start", "drums": ["kick", "snare", "hats"], "started_at": "..."}
+    {"type": "hits", "drum": "kick", "until": 12.5, "hits": [[t, v], ...]}
+    {"type": "complete", "output": "drum-data.json"}
+
+``until`` means every hit of that drum before that time has been written
+(``null`` once the drum is complete).
+Partial velocities are provisional (normalized to the loudest hit so far).
+The stream is only started once the first provisional hits arrive, so a run
+that only has hits at the end publishes ``drum-data.json`` directly. Each run
+renames its own new stream file into place, and only removes the partial file
+while it is still its own, so two runs publishing to the same output don't
+truncate or retire each other's stream.
+The final JSON is written to a temp file and renamed into place, so readers
+never see a half-written ``drum-data.json``.
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+HITS_PER_LINE = 500
+
+
+def partial_path_for(output_path: Path) -> Path:
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.stem + ".partial.jsonl")
+
+
+def replace_atomic(tmp_path: Path, path: Path, retries: int = 10):
+    """os.replace() that retries while Windows readers briefly hold the target open."""
+    for attempt in range(retries):
+        try:
+            os.replace(tmp_path, path)
+            return
+        except PermissionError:
+            if attempt == retries - 1:
+                raise
+            time.sleep(0.1)
+
+
+def write_json_atomic(path: Path, data, indent=2):
+    """Write ``data`` as JSON to a temp file in the same directory, then rename it over ``path``."""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    replace_atomic(tmp_path, path)
+
+
+def _json_time(t):
+    return None if t == float("inf") else t
+
+
+class TriggerStreamWriter:
+    """Append-only hit stream for one run, committed to the final JSON file at the end."""
+
+    def __init__(self, output_path: Path, drums: Iterable[str]):
+        self.output_path = Path(output_path)
+        self.partial_path = partial_path_for(self.output_path)
+        self.until = {drum: 0.0 for drum in drums}
+        self._file = None
+
+    def _open(self):
+        # A new file renamed over the path, rather than truncating one another run may still be writing
+        tmp_path = self.partial_path.with_name(f".{self.partial_path.name}.{os.getpid()}-{id(self)}.tmp")
+        self._file = open(tmp_path, "w")
+        self._write({"type": "start", "drums": list(self.until),
+                     "started_at": time.strftime("%Y-%m-%d %H:%M:%S")})
+        try:
+            replace_atomic(tmp_path, self.partial_path)
+        except PermissionError:
+            # Windows: another run has its stream open. Leave it be; this run publishes at the end
+            self._file.close()
+            os.remove(tmp_path)
+            self._file = False
+
+    def _owns_partial(self) -> bool:
+        try:
+            return os.path.samestat(os.fstat(self._file.fileno()), os.stat(self.partial_path))
+        except OSError:
+            return False
+
+    def _write(self, record: dict):
+        # One write per complete line; readers skip a trailing line without "\n".
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def append(self, drum: str, hits: List[list], until: float):
+        """
+        Stream the hits of ``drum`` that fall between the previous ``until`` and
+        this one. Hits before the previous ``until`` were already streamed and
+        are skipped, so callers can pass a growing hit list each time.
+        """
+        if self._file is None:
+            self._open()
+        if self._file is False:
+            return
+        start = self.until[drum]
+        new_hits = [hit for hit in hits if start <= hit[0] < until]
+        for i in range(0, len(new_hits), HITS_PER_LINE):
+            chunk = new_hits[i:i + HITS_PER_LINE]
+            chunk_until = until if i + HITS_PER_LINE >= len(new_hits) else new_hits[i + HITS_PER_LINE][0]
+            self._write({"type": "hits", "drum": drum, "until": _json_time(chunk_until), "hits": chunk})
+        if not new_hits and until > start:
+            self._write({"type": "hits", "drum": drum, "until": _json_time(until), "hits": []})
+        self.until[drum] = max(start, until)
+
+    def commit(self, trigger_data: Dict[str, List[list]]):
+        """Atomically publish the final trigger data and retire this run's partial stream."""
+        if not self._file:
+            write_json_atomic(self.output_path, trigger_data)
+            _remove_finished_stream(self.partial_path)
+            return
+        for drum, hits in trigger_data.items():
+            self.append(drum, hits, float("inf"))
+        write_json_atomic(self.output_path, trigger_data)
+        self._write({"type": "complete", "output": self.output_path.name})
+        owned = self._owns_partial()
+        self._file.close()
+        if owned:
+            try:
+                os.remove(self.partial_path)
+            except OSError:
+                pass
+
+    def abort(self, reason: str):
+        """Leave the partial stream in place, marked as failed."""
+        if self._file and not self._file.closed:
+            self._write({"type": "failed", "reason": reason})
+            self._file.close()
+
+
+def _remove_finished_stream(partial_path: Path):
+    """Remove a stream an earlier run left behind once it ended (e.g. failed), but not a live one."""
+    try:
+        with open(partial_path) as f:
+            lines = f.read().splitlines()
+        if lines and json.loads(lines[-1])["type"] in ("complete", "failed"):
+            os.remove(partial_path)
+    except (OSError, ValueError, KeyError):
+        pass
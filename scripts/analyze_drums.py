@@ -1,22 +1,32 @@
-import librosa
 import numpy as np
-import json
+import argparse
 import sys
-import os
-import mido
-from mido import Message, MidiFile, MidiTrack
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "drum-overlay-system" / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "drum-overlay-system" / "audio-workspace"))
+from block_analysis import iter_stft_blocks
+from separation_pipeline.trigger_stream import write_json_atomic
+
+# librosa, soundfile and mido are imported where they're used so that --help
+# and usage errors return immediately.
+
+HOP_LENGTH = 512
+N_FFT = 2048
+DEFAULT_MEMORY_BUDGET_MB = 256
+
+# Frequency-specific onset detection
+PARAMS = {
+    'kick': {'fmin': 40, 'fmax': 150, 'delta': 0.05},
+    'snare': {'fmin': 150, 'fmax': 6000, 'delta': 0.03},
+    'hats': {'fmin': 6000, 'fmax': 16000, 'delta': 0.02}
+}
 
 def analyze_onsets(audio, sr=44100, drum_type='kick'):
     """Extract onset times + velocities with optimized parameters per drum."""
+    import librosa
     
-    # Frequency-specific onset detection
-    params = {
-        'kick': {'fmin': 40, 'fmax': 150, 'delta': 0.05},
-        'snare': {'fmin': 150, 'fmax': 6000, 'delta': 0.03},
-        'hats': {'fmin': 6000, 'fmax': 16000, 'delta': 0.02}
-    }
-    
-    config = params.get(drum_type, params['kick'])
+    config = PARAMS.get(drum_type, PARAMS['kick'])
     
     # Onset detection with frequency filtering
     onset_frames = librosa.onset.onset_detect(
@@ -29,9 +39,6 @@ def analyze_onsets(audio, sr=44100, drum_type='kick'):
         wait=10  # Minimum 10 frames between onsets
     )
     
-    # Convert to timestamps
-    onset_times = librosa.frames_to_time(onset_frames, sr=sr, hop_length=512)
-    
     # Calculate velocities using spectral flux in target frequency range
     S = np.abs(librosa.stft(audio, hop_length=512))
     freqs = librosa.fft_frequencies(sr=sr)
@@ -42,6 +49,13 @@ def analyze_onsets(audio, sr=44100, drum_type='kick'):
     
     # Spectral flux
     flux = np.sqrt(np.sum(np.diff(S_band, axis=1)**2, axis=0))
+    return hits_from_flux(onset_frames, flux, sr)
+
+def hits_from_flux(onset_frames, flux, sr):
+    """Pair onset frames with their band flux as normalized [time, velocity] hits."""
+    import librosa
+    
+    onset_times = librosa.frames_to_time(onset_frames, sr=sr, hop_length=HOP_LENGTH)
     valid_frames = onset_frames[onset_frames < flux.shape[0]]
     velocities = flux[valid_frames]
     
@@ -58,8 +72,88 @@ def analyze_onsets(audio, sr=44100, drum_type='kick'):
     
     return hits
 
+def mel_db(S, sr):
+    """Log-power mel spectrogram of a magnitude block, before top_db clipping."""
+    import librosa
+    
+    mel = librosa.feature.melspectrogram(S=S**2, sr=sr, n_fft=N_FFT, fmax=0.5 * sr)
+    return librosa.power_to_db(mel, top_db=None)
+
+def analyze_drums_blockwise(input_path, sr=44100, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """
+    Low-memory equivalent of running analyze_onsets() for every drum.
+
+    The track is read twice in blocks sized to the memory budget: the first
+    pass finds the loudest mel bin (librosa clips the onset spectrogram 80 dB
+    below it), the second builds the full-band onset envelope and each band's
+    flux. Only those per-frame curves are kept, and the previous block's last
+    frame is carried over so flux across block edges is exact.
+    """
+    import librosa
+    import soundfile as sf
+    
+    # complex64 STFT, float32 magnitude, power and mel copies, band copies
+    bytes_per_frame = (N_FFT // 2 + 1) * 24 + 128 * 12 + HOP_LENGTH * 12
+    info = sf.info(input_path)
+    total_frames = 1 + int(np.ceil(info.frames * sr / info.samplerate)) // HOP_LENGTH
+    budget = memory_budget_mb * 1024 * 1024 - total_frames * (len(PARAMS) + 1) * 4
+    block_frames = int(budget // bytes_per_frame)
+    if block_frames < 64:
+        raise MemoryError(f"Memory budget of {memory_budget_mb} MB is too small for this track")
+
+    db_max = -np.inf
+    for S in iter_stft_blocks(input_path, sr, block_frames):
+        db_max = max(db_max, mel_db(S, sr).max())
+    db_floor = db_max - 80.0
+
+    freqs = librosa.fft_frequencies(sr=sr)
+    masks = {d: (freqs >= p['fmin']) & (freqs <= p['fmax']) for d, p in PARAMS.items()}
+    env_parts = []
+    flux_parts = {d: [] for d in PARAMS}
+    prev_db = None
+    prev_band = {}
+
+    for S in iter_stft_blocks(input_path, sr, block_frames):
+        D = np.maximum(mel_db(S, sr), db_floor)
+        if prev_db is not None:
+            D_ext = np.concatenate([prev_db, D], axis=1)
+        else:
+            D_ext = D
+        prev_db = D[:, -1:]
+        env_parts.append(np.mean(np.maximum(0.0, D_ext[:, 1:] - D_ext[:, :-1]), axis=0))
+
+        for drum_type, mask in masks.items():
+            S_band = S[mask, :]
+            if drum_type in prev_band:
+                S_band_ext = np.concatenate([prev_band[drum_type], S_band], axis=1)
+            else:
+                S_band_ext = S_band
+            prev_band[drum_type] = S_band[:, -1:]
+            flux_parts[drum_type].append(np.sqrt(np.sum(np.diff(S_band_ext, axis=1)**2, axis=0)))
+
+    # Same lag + centering offset as librosa.onset.onset_strength
+    n_frames = 1 + sum(len(p) for p in env_parts)
+    pad = 1 + N_FFT // (2 * HOP_LENGTH)
+    onset_env = np.concatenate([np.zeros(pad, dtype=np.float32)] + env_parts)[:n_frames]
+
+    triggers = {}
+    for drum_type, config in PARAMS.items():
+        onset_frames = librosa.onset.onset_detect(
+            onset_envelope=onset_env,
+            sr=sr,
+            units='frames',
+            hop_length=HOP_LENGTH,
+            backtrack=True,
+            delta=config['delta'],
+            wait=10
+        )
+        triggers[drum_type] = hits_from_flux(onset_frames, np.concatenate(flux_parts[drum_type]), sr)
+    return triggers
+
 def export_midi(triggers, output_path):
     """Convert trigger data to a Standard MIDI File."""
+    from mido import Message, MidiFile, MidiTrack
+    
     mid = MidiFile()
     track = MidiTrack()
     mid.tracks.append(track)
@@ -103,23 +197,29 @@ def export_midi(triggers, output_path):
     mid.save(output_path)
     print(f"MIDI exported to {output_path}")
 
-def analyze_drums(input_path, output_path):
-    print(f"Analyzing {input_path}...")
-    y, sr = librosa.load(input_path, sr=44100)
+def analyze_drums(input_path, output_path, low_memory=False, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    import librosa
     
-    # If stereo, convert to mono
-    if len(y.shape) > 1:
-        y = librosa.to_mono(y)
-    
-    triggers = {
-        'kick': analyze_onsets(y, sr, drum_type='kick'),
-        'snare': analyze_onsets(y, sr, drum_type='snare'),
-        'hats': analyze_onsets(y, sr, drum_type='hats')
-    }
+    print(f"Analyzing {input_path}...")
+    if low_memory:
+        print(f"Block-wise analysis (budget {memory_budget_mb} MB)")
+        triggers = analyze_drums_blockwise(input_path, 44100, memory_budget_mb)
+    else:
+        y, sr = librosa.load(input_path, sr=44100)
+        
+        # If stereo, convert to mono
+        if len(y.shape) > 1:
+            y = librosa.to_mono(y)
+        
+        triggers = {
+            'kick': analyze_onsets(y, sr, drum_type='kick'),
+            'snare': analyze_onsets(y, sr, drum_type='snare'),
+            'hats': analyze_onsets(y, sr, drum_type='hats')
+        }
     
     # Save JSON
-    with open(output_path, 'w') as f:
-        json.dump(triggers, f, indent=2)
+    # Readers never see a partial file
+    write_json_atomic(output_path, triggers)
     
     # Save MIDI
     midi_path = output_path.replace('.json', '.mid')
@@ -129,8 +229,13 @@ def analyze_drums(input_path, output_path):
     print(f"Data saved to {output_path} and {midi_path}")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python analyze_drums.py <input_wav> <output_json>")
-        sys.exit(1)
-    
-    analyze_drums(sys.argv[1], sys.argv[2])
+    parser = argparse.ArgumentParser(usage="python analyze_drums.py <input_wav> <output_json> [--low-memory]")
+    parser.add_argument("input_wav")
+    parser.add_argument("output_json")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="walk the track in blocks instead of loading it whole")
+    parser.add_argument("--memory-budget-mb", type=int, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help="working-set budget for --low-memory (default: %(default)s)")
+    args = parser.parse_args()
+    
+    analyze_drums(args.input_wav, args.output_json, args.low_memory, args.memory_budget_mb)
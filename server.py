@@ -1,6 +1,13 @@
 import http.server
+import json
 import socketserver
 import os
+import sys
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+# Hit-density pyramids live in the backend's separation_pipeline package
+sys.path.insert(0, str(Path(__file__).resolve().parent / "drum-overlay-system" / "backend"))
 
 PORT = 8000
 DIRECTORY = "."
@@ -9,11 +16,48 @@ class Handler(http.server.SimpleHTTPRequestHandler):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=DIRECTORY, **kwargs)
 
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/density":
+            self.send_density(parse_qs(url.query))
+        else:
+            super().do_GET()
+
+    def send_density(self, query):
+        """Hit density of drum-data.json: /density?start=0&end=7200&bins=1200 (seconds)"""
+        try:
+            # Imported here so serving the overlay doesn't need numpy
+            from separation_pipeline import density
+        except ImportError as e:
+            self.send_json(503, {"message": f"Hit density needs numpy: {e}"})
+            return
+
+        pyramid = density.pyramid_for(Path(DIRECTORY) / "drum-data.json")
+        try:
+            if pyramid is None:
+                status, body = 404, {"message": "No drum-data.json to summarize"}
+            else:
+                end = query.get("end", [None])[0]
+                status, body = 200, density.query(pyramid, float(query.get("start", ["0"])[0]),
+                                                  None if end is None else float(end),
+                                                  int(query.get("bins", [density.DEFAULT_BINS])[0]))
+        except ValueError as e:
+            status, body = 400, {"message": str(e)}
+        self.send_json(status, body)
+
+    def send_json(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-type", "application/json")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
 print(f"Serving at http://localhost:{PORT}")
 print(f"Open http://localhost:{PORT}/index.html to view the overlay.")
+print(f"Hit density for overviews: http://localhost:{PORT}/density?bins=1000")
 
 with socketserver.TCPServer(("", PORT), Handler) as httpd:
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
-        print("\nServer stopped.")
\ No newline at end of file
+        print("\nServer stopped.")
@@ -0,0 +1,118 @@
+"""
+Checks for the hit-density pyramid behind overview timelines.
+
+Uses synthetic hits, so nothing heavy is needed: bins that line up with the
+pyramid's windows match a histogram of the raw hits exactly, any zoom level
+keeps every hit, a query only reads about two windows per bin, and the
+stored pyramid is replaced by one built from the hits when the trigger data
+is newer than it.
+
+"""
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from testing_support import run_tests
+from separation_pipeline import density
+
+SET_SECONDS = 2 * 3600
+
+
+def trigger_data(seed=0):
+    rng = np.random.default_rng(seed)
+    data = {}
+    for drum, rate in (("kick", 2.0), ("snare", 1.0), ("hats", 4.0)):
+        times = np.sort(rng.uniform(0, SET_SECONDS, int(rate * SET_SECONDS)))
+        data[drum] = [[float(t), float(v)] for t, v in zip(times, rng.uniform(0, 1, len(times)))]
+    return data
+
+
+def test_aligned_bins_match_the_hits():
+    data = trigger_data()
+    pyramid = density.build_pyramid(data)
+    bin_seconds = density.BASE_SECONDS * 2 ** 7
+    start = 100 * bin_seconds
+    result = density.query(pyramid, start, start + 500 * bin_seconds, bins=500)
+
+    assert result["bins"] == 500 and result["window_seconds"] == bin_seconds
+    edges = start + np.arange(501) * bin_seconds
+    for drum, hits in data.items():
+        hits = np.array(hits)
+        index = np.searchsorted(edges, hits[:, 0], side="right") - 1
+        inside = (index >= 0) & (index < 500)
+        count = np.bincount(index[inside], minlength=500)
+        vmax = np.zeros(500)
+        np.maximum.at(vmax, index[inside], hits[inside, 1])
+        vsum = np.bincount(index[inside], weights=hits[inside, 1], minlength=500)
+
+        got = result["drums"][drum]
+        assert got["count"] == count.tolist(), drum
+        assert np.allclose(got["max_velocity"], vmax, atol=1e-4), drum
+        mean = np.divide(vsum, count, out=np.zeros(500), where=count > 0)
+        assert np.allclose(got["mean_velocity"], mean, atol=1e-4), drum
+
+
+def test_every_zoom_keeps_every_hit():
+    data = trigger_data(1)
+    pyramid = density.build_pyramid(data)
+    for bins in (1, 7, 333, 1000, 4096):
+        result = density.query(pyramid, bins=bins)
+        for drum, hits in data.items():
+            assert sum(result["drums"][drum]["count"]) == len(hits), (bins, drum)
+        # The finest level whose windows fit in a bin: at most ~2 windows per bin
+        assert result["window_seconds"] <= result["bin_seconds"] + 1e-9
+        assert result["window_seconds"] * 2 > result["bin_seconds"] or result["level"] == 0
+
+
+def test_bins_and_ranges():
+    pyramid = density.build_pyramid({"kick": [[0.01, 0.5], [0.2, 1.0]], "snare": []})
+    result = density.query(pyramid, 0, 1.0, bins=1000)
+    assert result["bins"] == 20, "bins narrower than the base window are merged"
+    assert result["drums"]["kick"]["count"][0] == 1 and result["drums"]["kick"]["count"][4] == 1
+    assert sum(result["drums"]["snare"]["count"]) == 0
+
+    past_the_end = density.query(pyramid, 100, 200, bins=10)
+    assert sum(past_the_end["drums"]["kick"]["count"]) == 0
+    for start, end in ((5, 5), (-1, 3), (0, float("inf")), (float("nan"), 3)):
+        try:
+            density.query(pyramid, start, end)
+        except ValueError:
+            continue
+        raise AssertionError(f"query({start}, {end}) should be rejected")
+
+
+def test_stored_pyramid_and_staleness():
+    with tempfile.TemporaryDirectory() as tmp:
+        trigger_path = Path(tmp) / "drum-data.json"
+        density_path = density.density_path_for(trigger_path)
+        assert density_path.name == "drum-data.density.npz"
+
+        data = trigger_data(2)
+        trigger_path.write_text(json.dumps(data))
+        density.write_pyramid(density_path, density.build_pyramid(data))
+        stored = density.load_pyramid(density_path)
+        built = density.build_pyramid(data)
+        for drum in data:
+            for stat in density.STATS:
+                assert all(np.array_equal(a, b) for a, b in zip(stored["drums"][drum][stat],
+                                                                built["drums"][drum][stat]))
+        assert density.pyramid_for(trigger_path)["windows"] == built["windows"]
+
+        # New trigger data with an old pyramid beside it: built from the hits instead
+        newer = {"kick": [[1.0, 1.0]]}
+        trigger_path.write_text(json.dumps(newer))
+        os.utime(density_path, ns=(0, 0))
+        pyramid = density.pyramid_for(trigger_path)
+        assert list(pyramid["drums"]) == ["kick"]
+        assert sum(density.query(pyramid, bins=10)["drums"]["kick"]["count"]) == 1
+
+        assert density.pyramid_for(Path(tmp) / "missing.json") is None
+        assert density.load_pyramid(Path(tmp) / "missing.npz") is None
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
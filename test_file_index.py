@@ -0,0 +1,94 @@
+"""
+Checks for the processed-file index behind auto_trigger.py's startup scan.
+
+A rescan must return only new and changed files: touched files and moved or
+renamed copies of processed audio are recognised by content, the per-job
+working directories are skipped, and a warm scan of a large library (20,000
+files across nested folders by default) stays fast.
+
+SCAN_FILES and SCAN_BUDGET_SECONDS override the size and time budget.
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from testing_support import run_tests
+from separation_pipeline.file_index import FileIndex
+from separation_pipeline.manifest import file_sha256
+
+EXTENSIONS = {".wav", ".mp3", ".flac"}
+SCAN_FILES = int(os.environ.get("SCAN_FILES", "20000"))
+SCAN_BUDGET_SECONDS = float(os.environ.get("SCAN_BUDGET_SECONDS", "2.0"))
+
+
+def process_all(index, files):
+    index.record_many((path, path.stat(), f"result/{path.name}", file_sha256(path)) for path in files)
+
+
+def test_rescan_finds_only_new_and_changed():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        music, jobs = tmp / "music", tmp / "music" / "jobs"
+        (music / "live").mkdir(parents=True)
+        jobs.mkdir()
+        for name, content in [("a.wav", b"aaaa"), ("live/b.flac", b"bbbbbb"), ("notes.txt", b"x")]:
+            (music / name).write_bytes(content)
+        (jobs / "track.wav").write_bytes(b"job copy")
+
+        index = FileIndex(tmp / "index.sqlite")
+        todo, counts = index.scan([music], EXTENSIONS, exclude=[jobs])
+        assert sorted(p.name for p in todo) == ["a.wav", "b.flac"], todo
+        assert counts["new"] == 2 and counts["hashed"] == 0
+        process_all(index, todo)
+
+        flat, _ = index.scan([music], EXTENSIONS, recursive=False)
+        assert flat == []
+
+        # Touched (same bytes), edited, renamed copy of processed audio, and new
+        os.utime(music / "a.wav", ns=(1, 1))
+        (music / "live" / "b.flac").write_bytes(b"bbbbbc")
+        (music / "live" / "a-copy.wav").write_bytes(b"aaaa")
+        (music / "c.mp3").write_bytes(b"cc")
+        todo, counts = index.scan([music], EXTENSIONS, exclude=[jobs])
+        assert sorted(p.name for p in todo) == ["b.flac", "c.mp3"], todo
+        assert counts["reused"] == 2 and counts["changed"] == 1 and counts["new"] == 1, counts
+        assert index.get(music / "live" / "a-copy.wav")["result"] == "result/a.wav"
+
+        process_all(index, todo)
+        todo, counts = index.scan([music], EXTENSIONS, exclude=[jobs])
+        assert todo == [] and counts["unchanged"] == 4, counts
+        index.close()
+
+
+def test_large_library_scan():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        files = []
+        for i in range(SCAN_FILES):
+            folder = tmp / "library" / f"artist{i // 500}" / f"album{i // 25}"
+            if i % 25 == 0:
+                folder.mkdir(parents=True)
+            path = folder / f"{i}.wav"
+            path.write_bytes(i.to_bytes(4, "little"))
+            files.append(path)
+
+        index = FileIndex(tmp / "index.sqlite")
+        start = time.perf_counter()
+        todo, counts = index.scan([tmp / "library"], EXTENSIONS)
+        cold = time.perf_counter() - start
+        assert len(todo) == SCAN_FILES
+
+        process_all(index, todo[: SCAN_FILES - 10])
+        start = time.perf_counter()
+        todo, counts = index.scan([tmp / "library"], EXTENSIONS)
+        warm = time.perf_counter() - start
+        assert len(todo) == 10 and counts["unchanged"] == SCAN_FILES - 10, counts
+        print(f"  {SCAN_FILES} files: cold scan {cold * 1000:.0f} ms, warm scan {warm * 1000:.0f} ms")
+        assert warm < SCAN_BUDGET_SECONDS, f"warm scan took {warm:.2f}s (budget {SCAN_BUDGET_SECONDS:.2f}s)"
+        index.close()
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
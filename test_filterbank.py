@@ -0,0 +1,84 @@
+"""
+Parity checks for the fast path's peak picker (filterbank.peak_pick).
+
+peak_pick() reimplements librosa's onset peak picking without librosa, so it
+must choose the same frames as librosa.util.peak_pick with onset_detect's
+windows, and as onset_detect itself, on random, spiky, flat and very short
+envelopes at the band parameters and sample rates the fast path uses. Also
+pins down the rates the bands are decimated to.
+"""
+import sys
+
+import numpy as np
+
+from testing_support import AUDIO_WORKSPACE, run_tests
+
+sys.path.insert(0, str(AUDIO_WORKSPACE))
+import filterbank  # noqa: E402
+
+HOP = filterbank.HOP_LENGTH
+
+
+def envelopes(seed=0):
+    rng = np.random.default_rng(seed)
+    n = 4000
+    spikes = np.zeros(n)
+    spikes[rng.choice(n, 150, replace=False)] = rng.uniform(0.2, 1.0, 150)
+    yield "noise", rng.random(n)
+    yield "spikes", spikes + 0.05 * rng.random(n)
+    # Plateaus: equal neighbouring maxima
+    yield "steps", np.repeat(rng.integers(0, 5, n // 8), 8).astype(float)
+    yield "onset envelope", filterbank.onset_envelope(np.abs(rng.standard_normal(n)).cumsum() % 7)
+    yield "constant", np.full(100, 0.3)
+    yield "short", rng.random(3)
+
+
+def librosa_peaks(env, sr, delta, wait):
+    """librosa.util.peak_pick with the windows and normalization onset_detect uses."""
+    import librosa
+
+    x = env - env.min()
+    if x.max() > 0:
+        x = x / x.max()
+    return librosa.util.peak_pick(
+        x, pre_max=int(0.03 * sr // HOP), post_max=int(0.00 * sr // HOP + 1),
+        pre_avg=int(0.10 * sr // HOP), post_avg=int(0.10 * sr // HOP + 1), delta=delta, wait=wait)
+
+
+def test_peak_pick_matches_librosa():
+    for sr in (22050, 44100, 48000):
+        for band, params in filterbank.FAST_BANDS.items():
+            for name, env in envelopes():
+                ours = filterbank.peak_pick(env, sr, params["delta"], params["wait"], HOP)
+                theirs = librosa_peaks(env, sr, params["delta"], params["wait"])
+                assert np.array_equal(ours, theirs), \
+                    f"{name} envelope, {band} at {sr} Hz: {len(ours)} peaks vs librosa's {len(theirs)}"
+
+
+def test_peak_pick_matches_onset_detect():
+    import librosa
+
+    for name, env in envelopes(seed=1):
+        if env.max() == env.min():
+            continue  # onset_detect returns early on a flat envelope
+        for delta, wait in ((0.02, 5), (0.05, 8), (0.1, 10)):
+            ours = filterbank.peak_pick(env, 44100, delta, wait, HOP)
+            theirs = librosa.onset.onset_detect(onset_envelope=env, sr=44100, hop_length=HOP,
+                                                delta=delta, wait=wait, units="frames")
+            assert np.array_equal(ours, theirs), f"{name} envelope, delta={delta}: {len(ours)} vs {len(theirs)}"
+
+
+def test_decimated_band_rates():
+    rates = {sr: {band: sr / filterbank.decimation_factor(params, sr) for band, params in filterbank.FAST_BANDS.items()}
+             for sr in (44100, 48000)}
+    assert rates[44100] == {"kick": 689.0625, "snare": 22050.0, "hats": 44100.0}, rates[44100]
+    assert rates[48000] == {"kick": 750.0, "snare": 12000.0, "hats": 48000.0}, rates[48000]
+    # Every decimated band keeps MIN_RATE_FACTOR x its upper edge
+    for sr, bands in rates.items():
+        for band, rate in bands.items():
+            cutoff = filterbank.FAST_BANDS[band]["cutoff"]
+            assert rate == sr or rate >= filterbank.MIN_RATE_FACTOR * max(np.atleast_1d(cutoff))
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,240 @@
+"""
+Checks for the region diffing behind incremental reprocessing of edited tracks.
+
+Uses synthetic audio and features, so neither Demucs nor librosa is needed:
+an edit in place marks only its blocks as changed, inserted or removed
+material reuses both sides of the change when the shift is a whole number of
+hops, and features spliced from the old run and the region cores come out
+equal to the new version's own. Spliced stems scale their new cores like the
+kept audio, and run_pipeline() (with Demucs stubbed out) leaves a region cache
+behind that the next edit of the track is reprocessed from.
+"""
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from testing_support import AUDIO_WORKSPACE, run_tests
+
+sys.path.insert(0, str(AUDIO_WORKSPACE))
+import incremental  # noqa: E402
+
+SR = 44100
+HOP = 512
+
+
+def audio(seconds, seed=0):
+    return np.random.default_rng(seed).standard_normal((2, int(seconds * SR))).astype(np.float32)
+
+
+def frame_features(y):
+    """Stand-in for the band features: one value per hop frame that only depends on nearby audio."""
+    n_frames = 1 + y.shape[1] // HOP
+    padded = np.pad(y[0], (0, HOP))
+    values = padded[: n_frames * HOP].reshape(n_frames, HOP).sum(axis=1)
+    return {"kick": (values, values * 2)}
+
+
+def reprocess(old_audio, new_audio):
+    old = incremental.block_hashes(old_audio)
+    new = incremental.block_hashes(new_audio)
+    changed, offset = incremental.diff(old, new, HOP)
+    n_new = new_audio.shape[1]
+    segments = incremental.plan_regions(changed, n_new, SR, overlap_seconds=1.0, hop_length=HOP)
+    spans = incremental.kept_spans(segments, n_new, old_audio.shape[1], offset)
+
+    full = frame_features(new_audio)
+    region_features = []
+    for _, core_start, core_end, _ in segments:
+        first = core_start // HOP
+        last = core_end // HOP if core_end < n_new else n_new // HOP + 1
+        region_features.append({band: (env[first:last], energy[first:last]) for band, (env, energy) in full.items()})
+    spliced = incremental.splice_features(frame_features(old_audio), spans, region_features, segments, n_new, HOP)
+    return segments, spans, spliced, full
+
+
+def test_edit_in_place():
+    old = audio(120)
+    new = old.copy()
+    new[:, 60 * SR:61 * SR] *= 0.5
+    segments, spans, spliced, full = reprocess(old, new)
+
+    assert len(segments) == 1, segments
+    core = segments[0][2] - segments[0][1]
+    assert core < 22 * SR, f"core of {core / SR:.1f}s for a 1s edit"
+    assert all(new_start == old_start for new_start, _, old_start in spans)
+    assert np.array_equal(spliced["kick"][0], full["kick"][0])
+    assert incremental.changed_fraction(segments, new.shape[1]) < incremental.MAX_CHANGED_FRACTION
+
+
+def test_insert_whole_hops_reuses_both_sides():
+    old = audio(120)
+    cut = 50 * SR
+    new = np.concatenate([old[:, :cut], audio(2, seed=1)[:, : 100 * HOP], old[:, cut:]], axis=1)
+    segments, spans, spliced, full = reprocess(old, new)
+
+    assert len(spans) == 2, spans
+    assert spans[1][0] - spans[1][2] == 100 * HOP
+    assert np.array_equal(spliced["kick"][0], full["kick"][0])
+
+
+def test_delete_off_hop_redoes_the_tail():
+    old = audio(120)
+    cut = 100 * SR
+    new = np.concatenate([old[:, :cut], old[:, cut + 777:]], axis=1)
+    segments, spans, spliced, full = reprocess(old, new)
+
+    assert len(spans) == 1 and spans[0][0] == 0, spans
+    assert segments[-1][2] == new.shape[1]
+    assert np.array_equal(spliced["kick"][0], full["kick"][0])
+
+
+def test_unchanged_and_fully_changed():
+    old = audio(30)
+    segments, spans, spliced, full = reprocess(old, old.copy())
+    assert segments == [] and spans == [(0, old.shape[1], 0)]
+    assert np.array_equal(spliced["kick"][1], full["kick"][1])
+
+    dithered = old + np.float32(1e-6)
+    segments, _, _, _ = reprocess(old, dithered)
+    assert incremental.changed_fraction(segments, old.shape[1]) == 1.0
+
+
+def test_cache_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / incremental.CACHE_NAME
+        y = audio(10)
+        params = {"model": "htdemucs_6s", "hit_config": {"kick": {"fmin": 40}}}
+        incremental.save_cache(path, incremental.block_hashes(y), frame_features(y), SR, params,
+                               {"drums": incremental.stem_scale(1.5), "bass": 1.0})
+
+        cache = incremental.load_cache(path, params)
+        assert cache["samplerate"] == SR and cache["fingerprint"]["n_samples"] == y.shape[1]
+        assert cache["stem_scales"] == {"drums": 1 / 1.515, "bass": 1.0}
+        assert np.allclose(cache["features"]["kick"][0], frame_features(y)["kick"][0])
+        assert incremental.load_cache(path, {**params, "model": "htdemucs"}) is None
+        assert incremental.load_cache(Path(tmp) / "missing.npz", params) is None
+
+
+def import_process_track():
+    # Ahead of the root-level process_track.py
+    sys.path.insert(0, str(AUDIO_WORKSPACE))
+    import process_track
+    return process_track
+
+
+def test_splice_scales_new_cores_like_the_kept_audio():
+    import soundfile as sf
+    process_track = import_process_track()
+
+    def pcm16(y, scale):
+        return (np.clip(y * scale, -1, 1) * (2 ** 15 - 1)).astype(np.int16)
+
+    stem = audio(30) * 1.5
+    scale = incremental.stem_scale(float(np.abs(stem).max()))
+    n = stem.shape[1]
+    segments = [(9 * SR, 10 * SR, 12 * SR, 13 * SR)]
+    spans = [(0, 10 * SR, 0), (12 * SR, n, 12 * SR)]
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        previous_dir = Path(tmp) / "previous"
+        previous_dir.mkdir()
+        sf.write(str(previous_dir / "drums.wav"), pcm16(stem, scale).T, SR, subtype="PCM_16")
+        os.chdir(tmp)
+        try:
+            # The audio didn't change, so the spliced stem must match the old one exactly
+            tmp_path = process_track._splice_stem("drums", stem, spans, segments, SR, previous_dir, scale)
+            spliced, _ = sf.read(str(tmp_path), dtype="int16", always_2d=True)
+        finally:
+            os.chdir(cwd)
+    assert np.array_equal(spliced.T, pcm16(stem, scale))
+
+
+class FakeModel:
+    """What the pipeline reads off a Demucs model; the stubs below do the separating."""
+    audio_channels = 2
+    samplerate = SR
+    sources = ["drums", "bass"]
+
+
+def fake_separate(mix):
+    """Stand-in for Demucs that only depends on each sample, like the stems of unchanged audio."""
+    return {"drums": 0.5 * mix, "bass": 0.25 * mix}
+
+
+def test_pipeline_reprocesses_an_edit_from_the_region_cache():
+    import soundfile as sf
+    import stem_transport
+    process_track = import_process_track()
+
+    def separate_stems(audio_path, tier, cpu=None):
+        mix, _ = sf.read(str(audio_path), dtype="float32", always_2d=True)
+        scales = {}
+        for name, stem in fake_separate(mix.T).items():
+            scales[name] = incremental.stem_scale(float(np.abs(stem).max()))
+            sf.write(f"{name}.wav", (np.clip(stem * scales[name], -1, 1) * (2 ** 15 - 1)).astype(np.int16).T,
+                     SR, subtype="PCM_16")
+        fingerprint = process_track._fingerprint_track(audio_path, 2, SR)
+        return Path("drums.wav"), SR, fake_separate(mix.T)["drums"].mean(axis=0), scales, fingerprint
+
+    def separate_segment(model, args, source, stems, segment, n_samples, hop_length=512):
+        pad_start, core_start, core_end, _ = segment
+        separated = fake_separate(np.array(source[:, pad_start:segment[3]]))
+        for name, stem in separated.items():
+            stem_transport.write_columns(stems[name], core_start, stem[:, core_start - pad_start:core_end - pad_start])
+        features = process_track.band_features_in_memory(separated["drums"].mean(axis=0), SR)
+        first = pad_start // hop_length
+        frame_start = core_start // hop_length - first
+        frame_end = (core_end // hop_length if core_end < n_samples else n_samples // hop_length + 1) - first
+        return None, {drum: (env[frame_start:frame_end], energy[frame_start:frame_end])
+                      for drum, (env, energy) in features.items()}
+
+    incremental_runs = []
+    real_incremental = process_track.separate_and_analyze_incremental
+
+    def separate_and_analyze_incremental(*args, **kwargs):
+        result = real_incremental(*args, **kwargs)
+        incremental_runs.append(result is not None)
+        return result
+
+    stubs = {
+        (process_track, "separate_stems"): separate_stems,
+        (process_track, "separate_segment"): separate_segment,
+        (process_track, "separate_and_analyze_incremental"): separate_and_analyze_incremental,
+        (process_track, "separation_args"): lambda tier, cpu=None: None,
+        (process_track, "load_model"): lambda args: FakeModel(),
+        (process_track.cpu_inference, "configure_process"): lambda *args, **kwargs: None,
+        (process_track.quality_tiers, "record_run"): lambda *args, **kwargs: None,
+    }
+    originals = {key: getattr(*key) for key in stubs}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            for (module, name), stub in stubs.items():
+                setattr(module, name, stub)
+            mix = 0.3 * audio(60)
+            sf.write("track.wav", mix.T, SR, subtype="FLOAT")
+            process_track.run_pipeline(Path("track.wav"))
+            assert Path("drum-data.json").exists() and Path("drum-data.density.npz").exists()
+            assert (process_track.CHECKPOINT_DIR / incremental.CACHE_NAME).exists()
+            assert incremental_runs == []
+
+            mix[:, 30 * SR:31 * SR] *= 0.5
+            sf.write("track.wav", mix.T, SR, subtype="FLOAT")
+            trigger_data = process_track.run_pipeline(Path("track.wav"))
+            assert incremental_runs == [True]
+            assert json.loads(Path("drum-data.json").read_text()) == trigger_data
+            assert sf.info("drums.wav").frames == mix.shape[1]
+            assert (process_track.CHECKPOINT_DIR / incremental.CACHE_NAME).exists()
+        finally:
+            for (module, name), original in originals.items():
+                setattr(module, name, original)
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,206 @@
+"""
+End-to-end checks for the durable job queue and queue_worker.py.
+
+Workers run as real processes against a temporary database and run the real
+process_track handler, with process_track.py swapped for a stub that runs
+the python code stored in each job's "audio file", so no separation
+dependencies are needed: several workers complete every job exactly once,
+failures retry with backoff and end up dead-lettered, and a job whose worker
+is killed mid-run is picked up again once its lease expires.
+"""
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from testing_support import BACKEND, run_tests
+from separation_pipeline.job_queue import JobQueue
+
+# Starts queue_worker.py with separate_for_overlay() pointed at the stub and a
+# scratch tracks directory. Spawned worker processes re-run this module, so
+# they get the same paths.
+LAUNCHER = """
+import sys
+from pathlib import Path
+sys.path.insert(0, {backend!r})
+import separation_pipeline
+separation_pipeline.PROCESS_TRACK = Path({stub!r})
+separation_pipeline.TRACKS_DIR = Path({tracks!r})
+separation_pipeline.LATEST_DIR = Path({tracks!r}) / "latest"
+import queue_worker
+if __name__ == "__main__":
+    sys.exit(queue_worker.main())
+"""
+
+STUB = "import sys; exec(open(sys.argv[1]).read())\n"
+
+
+def worker_command(tmp):
+    """argv that starts queue_worker.py against the stub process_track.py in ``tmp``."""
+    launcher = tmp / "launch_worker.py"
+    if not launcher.exists():
+        (tmp / "stub_process_track.py").write_text(STUB)
+        launcher.write_text(LAUNCHER.format(backend=str(BACKEND), stub=str(tmp / "stub_process_track.py"),
+                                            tracks=str(tmp / "tracks")))
+    return [sys.executable, str(launcher)]
+
+
+def track_job(queue, tmp, code, **kwargs):
+    """Queue a process_track job whose "audio file" holds the code the stub runs."""
+    inbox = tmp / "inbox"
+    inbox.mkdir(exist_ok=True)
+    audio = inbox / f"track-{len(list(inbox.iterdir()))}.wav"
+    # Distinct contents, so every track gets its own working directory
+    audio.write_text(f"# {audio.name}\n{code}\n")
+    return queue.enqueue("process_track", {"audio_path": str(audio), "args": []}, **kwargs)
+
+
+def run_workers(tmp, db, *args, timeout=60):
+    proc = subprocess.run([*worker_command(tmp), "work", "--db", str(db), "--drain",
+                           "--poll-seconds", "0.1", *args],
+                          capture_output=True, text=True, timeout=timeout)
+    assert proc.returncode == 0, proc.stderr
+    return proc
+
+
+def test_priority_order_and_dedupe():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = JobQueue(Path(tmp) / "jobs.sqlite")
+        backfill = queue.enqueue("process_track", {"n": 1}, priority="backfill")
+        watched = queue.enqueue("process_track", {"n": 2}, priority="watched", dedupe_key="song.wav")
+        assert queue.enqueue("process_track", {"n": 3}, priority="watched", dedupe_key="song.wav") == watched
+        interactive = queue.enqueue("process_track", {"n": 4}, priority="interactive")
+
+        claimed = [queue.claim("w")["id"] for _ in range(3)]
+        assert claimed == [interactive, watched, backfill], claimed
+        assert queue.claim("w") is None
+        # Once the job has finished, the same file can be queued again
+        queue.complete(watched, "w")
+        assert queue.enqueue("process_track", {"n": 5}, dedupe_key="song.wav") != watched
+        queue.close()
+
+
+def test_exactly_once_across_workers():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        db, log = tmp / "jobs.sqlite", tmp / "ran.log"
+        queue = JobQueue(db)
+        ids = [track_job(queue, tmp, f"open({str(log)!r}, 'a').write(sys.argv[1] + '\\n')")
+               for _ in range(24)]
+        run_workers(tmp, db, "--processes", "4")
+
+        ran = log.read_text().split()
+        expected = [queue.get(job_id)["payload"]["audio_path"] for job_id in ids]
+        assert sorted(ran) == sorted(expected), f"jobs ran {len(ran)} times for {len(ids)} jobs"
+        assert all(queue.get(job_id)["state"] == "done" for job_id in ids)
+        # The handler's result points at the track's working directory
+        assert queue.get(ids[0])["result"]["trigger_data"].endswith("drum-data.json")
+        queue.close()
+
+
+def test_retry_with_backoff():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        db, counter = tmp / "jobs.sqlite", tmp / "attempts"
+        queue = JobQueue(db)
+        # Fails twice, then succeeds
+        job_id = track_job(queue, tmp, (
+            f"p = {str(counter)!r}\n"
+            "n = int(open(p).read()) + 1 if __import__('os').path.exists(p) else 1\n"
+            "open(p, 'w').write(str(n))\n"
+            "sys.exit(0 if n >= 3 else 1)\n"))
+        start = time.time()
+        run_workers(tmp, db, "--backoff-base-seconds", "0.5")
+        elapsed = time.time() - start
+
+        job = queue.get(job_id)
+        assert job["state"] == "done" and job["attempts"] == 3, job
+        # Two retries wait roughly 0.5s and 1s (with +-20% jitter)
+        assert elapsed >= 1.2, f"retries took only {elapsed:.2f}s"
+        queue.close()
+
+
+def test_dead_letter_and_requeue():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        db = tmp / "jobs.sqlite"
+        queue = JobQueue(db)
+        job_id = track_job(queue, tmp, "print('boom'); sys.exit(3)", max_attempts=2)
+        run_workers(tmp, db, "--backoff-base-seconds", "0.1")
+
+        job = queue.get(job_id)
+        assert job["state"] == "dead" and job["attempts"] == 2, job
+        assert "process_track.py failed" in job["last_error"] and "boom" in job["last_error"]
+        assert [dead["id"] for dead in queue.dead_letters()] == [job_id]
+
+        assert queue.requeue_dead() == 1
+        job = queue.get(job_id)
+        assert job["state"] == "queued" and job["attempts"] == 0
+        queue.close()
+
+
+def test_requeue_dead_skips_files_queued_again():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = JobQueue(Path(tmp) / "jobs.sqlite")
+        old = []
+        for n in (1, 2):
+            # Queued again under the same key only after the previous job died
+            old.append(queue.enqueue("process_track", {"n": n}, dedupe_key="song.wav:1", max_attempts=1))
+            queue.claim("w")
+            queue.fail(old[-1], "w", "boom")
+        other = queue.enqueue("process_track", {"n": 3}, dedupe_key="other.wav:1", max_attempts=1)
+        queue.claim("w")
+        queue.fail(other, "w", "boom")
+        # The watcher queues the first file again while its old jobs are dead
+        again = queue.enqueue("process_track", {"n": 4}, dedupe_key="song.wav:1")
+
+        assert queue.requeue_dead() == 1
+        assert [queue.get(job_id)["state"] for job_id in (*old, other, again)] == ["dead", "dead", "queued", "queued"]
+
+        # With the key free again, only the newest of the dead duplicates comes back
+        queue.claim("w")
+        queue.complete(again, "w")
+        assert queue.requeue_dead() == 1
+        assert [queue.get(job_id)["state"] for job_id in old] == ["dead", "queued"]
+        queue.close()
+
+
+def test_lease_expiry_after_worker_crash():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        db, marker = tmp / "jobs.sqlite", tmp / "started"
+        queue = JobQueue(db)
+        # The first attempt hangs; the retry finds the marker and succeeds
+        job_id = track_job(queue, tmp, (
+            "import os, time\n"
+            f"if not os.path.exists({str(marker)!r}):\n"
+            f"    open({str(marker)!r}, 'w').close()\n"
+            "    time.sleep(60)\n"))
+
+        worker = subprocess.Popen([*worker_command(tmp), "work", "--db", str(db),
+                                   "--lease-seconds", "1", "--poll-seconds", "0.1"],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        try:
+            deadline = time.time() + 20
+            while not marker.exists():
+                assert time.time() < deadline, "first worker never started the job"
+                time.sleep(0.1)
+        finally:
+            # Kill the worker and its job outright: no release, no more heartbeats
+            os.killpg(worker.pid, signal.SIGKILL)
+            worker.wait()
+        assert queue.get(job_id)["state"] == "leased"
+
+        time.sleep(1.5)
+        run_workers(tmp, db, "--lease-seconds", "1", "--backoff-base-seconds", "0.1")
+        job = queue.get(job_id)
+        assert job["state"] == "done" and job["attempts"] == 2, job
+        assert "expired" in job["last_error"]
+        queue.close()
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
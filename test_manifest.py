@@ -0,0 +1,133 @@
+"""
+Checks for the stage manifest behind resumable process_track.py runs.
+
+Two stages chained like the real pipeline (separate: track -> drums.wav,
+analyze: drums.wav -> hits.json): a manifest reloaded after a restart resumes
+both, a parameter change only invalidates its own stage, new input content
+invalidates the stages that read it, a missing or modified artifact forces a
+rerun, unchanged files are not hashed again, and an unreadable or outdated
+manifest starts over.
+"""
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from testing_support import run_tests
+from separation_pipeline import manifest as manifest_module
+from separation_pipeline.manifest import MANIFEST_NAME, StageManifest
+
+SEPARATE_PARAMS = {"model": "htdemucs", "shifts": 1}
+ANALYZE_PARAMS = {"hit_config": {"kick": {"fmin": 40, "fmax": 150}}, "hop_length": 512}
+
+
+def run_stages(tmp):
+    """Record both stages as a finished run would; returns the manifest."""
+    track, drums, hits = tmp / "track.wav", tmp / "drums.wav", tmp / "hits.json"
+    if not track.exists():
+        track.write_bytes(b"track v1")
+    drums.write_bytes(b"drums of " + track.read_bytes())
+    hits.write_text(json.dumps({"kick": [[0.5, 1.0]]}))
+    manifest = StageManifest(tmp / MANIFEST_NAME)
+    manifest.record("separate", {"track": track}, SEPARATE_PARAMS, {"drums": drums}, meta={"samplerate": 44100})
+    manifest.record("analyze", {"drums": drums}, ANALYZE_PARAMS, {"hits": hits})
+    return manifest
+
+
+def complete(manifest, tmp, separate_params=SEPARATE_PARAMS, analyze_params=ANALYZE_PARAMS):
+    return (manifest.is_complete("separate", {"track": tmp / "track.wav"}, separate_params),
+            manifest.is_complete("analyze", {"drums": tmp / "drums.wav"}, analyze_params))
+
+
+def test_resume_after_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        run_stages(tmp)
+        reloaded = StageManifest(tmp / MANIFEST_NAME)
+        assert complete(reloaded, tmp) == (True, True)
+        assert reloaded.artifact("separate", "drums") == tmp / "drums.wav"
+        assert reloaded.meta("separate") == {"samplerate": 44100}
+
+        # Touching the track without changing it keeps both stages
+        os.utime(tmp / "track.wav", ns=(0, 10 ** 18))
+        assert complete(StageManifest(tmp / MANIFEST_NAME), tmp) == (True, True)
+
+
+def test_param_change_invalidates_only_its_stage():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        manifest = run_stages(tmp)
+        tweaked = {**ANALYZE_PARAMS, "hop_length": 256}
+        assert complete(manifest, tmp, analyze_params=tweaked) == (True, False)
+        assert complete(manifest, tmp, separate_params={**SEPARATE_PARAMS, "shifts": 2}) == (False, True)
+
+
+def test_new_input_invalidates_downstream():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        manifest = run_stages(tmp)
+        (tmp / "track.wav").write_bytes(b"track v2, edited")
+        assert complete(manifest, tmp) == (False, True)
+
+        # Separating again writes a new drum stem, which analysis hasn't seen
+        (tmp / "drums.wav").write_bytes(b"drums of track v2, edited")
+        manifest.record("separate", {"track": tmp / "track.wav"}, SEPARATE_PARAMS, {"drums": tmp / "drums.wav"})
+        assert complete(manifest, tmp) == (True, False)
+
+
+def test_missing_or_modified_artifact():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        manifest = run_stages(tmp)
+        (tmp / "hits.json").unlink()
+        assert complete(manifest, tmp) == (True, False)
+
+        manifest = run_stages(tmp)
+        # Same contents, rewritten: the artifact's mtime no longer matches the record
+        drums = tmp / "drums.wav"
+        os.utime(drums, ns=(0, drums.stat().st_mtime_ns + 10 ** 9))
+        assert complete(manifest, tmp)[0] is False
+
+
+def test_unchanged_files_are_not_hashed_again():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        run_stages(tmp)
+        hashed = []
+        original = manifest_module.file_sha256
+        manifest_module.file_sha256 = lambda path: hashed.append(Path(path).name) or original(path)
+        try:
+            manifest = StageManifest(tmp / MANIFEST_NAME)
+            assert complete(manifest, tmp) == (True, True)
+            assert hashed == []
+
+            (tmp / "track.wav").write_bytes(b"track v1, remastered")
+            assert complete(manifest, tmp) == (False, True)
+            assert hashed == ["track.wav"]
+        finally:
+            manifest_module.file_sha256 = original
+
+
+def test_unreadable_or_outdated_manifest_starts_over():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        path = tmp / MANIFEST_NAME
+        run_stages(tmp)
+
+        data = json.loads(path.read_text())
+        path.write_text(json.dumps({**data, "version": data["version"] + 1}))
+        assert complete(StageManifest(path), tmp) == (False, False)
+
+        path.write_text('{"version": 1, "stages": {')
+        assert complete(StageManifest(path), tmp) == (False, False)
+
+        manifest = run_stages(tmp)
+        manifest.clear()
+        assert complete(StageManifest(path), tmp) == (False, False)
+        # Saved atomically: no temp file is left next to the manifest
+        assert not path.with_name(path.name + ".tmp").exists()
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,161 @@
+"""
+Checks for the priority scheduler and how auto_trigger.py feeds it.
+
+Jobs are small functions that wait on events, so the checks run in
+milliseconds: queued work starts in priority order, a waiting interactive job
+preempts running backfill (which is requeued and finishes later), per-class
+limits hold while other classes keep running, and a dropped file queues one
+job however many filesystem events it produces.
+"""
+import importlib
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from testing_support import run_tests
+from separation_pipeline.scheduler import Job, Preempted, PriorityScheduler
+
+TIMEOUT = 10
+
+
+def wait_until(condition, timeout=TIMEOUT):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_priority_order():
+    scheduler = PriorityScheduler(max_workers=1)
+    gate, order = threading.Event(), []
+    blocker = scheduler.submit(lambda job: gate.wait(TIMEOUT), priority="watched")
+    wait_until(lambda: blocker.state == "running")
+
+    jobs = [scheduler.submit(lambda job, name=name: order.append(name), priority=name)
+            for name in ("backfill", "watched", "interactive")]
+    gate.set()
+    for job in jobs:
+        job.wait(TIMEOUT)
+    assert order == ["interactive", "watched", "backfill"], order
+    scheduler.shutdown()
+
+
+def test_interactive_preempts_backfill():
+    scheduler = PriorityScheduler(max_workers=1)
+    runs, order = [], []
+
+    def backfill(job):
+        runs.append(job.preemptions)
+        stop = threading.Event()
+        job.on_preempt(stop.set)
+        # The first run waits to be preempted, the requeued one finishes
+        if job.preemptions == 0:
+            assert stop.wait(TIMEOUT), "never preempted"
+            raise Preempted(job.name)
+        order.append("backfill")
+        return "catalog done"
+
+    background = scheduler.submit(backfill, priority="backfill")
+    wait_until(lambda: background.state == "running" and background._preempt_hook is not None)
+    urgent = scheduler.submit(lambda job: order.append("interactive"), priority="interactive")
+
+    assert background.wait(TIMEOUT) == "catalog done"
+    urgent.wait(TIMEOUT)
+    assert order == ["interactive", "backfill"], order
+    assert runs == [0, 1] and background.preemptions == 1
+    stats = scheduler.stats()["classes"]
+    assert stats["backfill"]["preempted"] == 1 and stats["backfill"]["completed"] == 1
+    scheduler.shutdown()
+
+
+def test_class_limits():
+    scheduler = PriorityScheduler(max_workers=3, limits={"backfill": 1})
+    gate, lock = threading.Event(), threading.Lock()
+    running = {"backfill": 0, "peak": 0}
+
+    def backfill(job):
+        with lock:
+            running["backfill"] += 1
+            running["peak"] = max(running["peak"], running["backfill"])
+        gate.wait(TIMEOUT)
+        with lock:
+            running["backfill"] -= 1
+
+    jobs = [scheduler.submit(backfill, priority="backfill") for _ in range(3)]
+    # Two workers are idle, but only one backfill job may run; watched work still gets a worker
+    watched = scheduler.submit(lambda job: "watched ran", priority="watched")
+    assert watched.wait(TIMEOUT) == "watched ran"
+    assert scheduler.stats()["classes"]["backfill"]["queued"] == 2
+    gate.set()
+    for job in jobs:
+        job.wait(TIMEOUT)
+    assert running["peak"] == 1, running
+    scheduler.shutdown()
+
+
+class RecordingScheduler:
+    """Stands in for PriorityScheduler: records submissions without running them."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args, priority="watched", name=None, **kwargs):
+        job = Job(fn, args, kwargs, priority, name)
+        self.jobs.append(job)
+        return job
+
+
+def test_watcher_queues_a_dropped_file_once():
+    from watchdog.events import FileCreatedEvent, FileModifiedEvent
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        cwd = os.getcwd()
+        # auto_trigger.py logs to auto_trigger.log in the working directory
+        os.chdir(tmp)
+        try:
+            auto_trigger = importlib.import_module("auto_trigger")
+        finally:
+            os.chdir(cwd)
+
+        workspace = tmp / "audio-workspace"
+        workspace.mkdir()
+        song = workspace / "song.wav"
+        song.write_bytes(b"RIFF" + b"\0" * 1000)
+        scheduler = RecordingScheduler()
+        handler = auto_trigger.AudioFileHandler(tmp, scheduler)
+
+        handler.on_created(FileCreatedEvent(str(song)))
+        for _ in range(3):
+            handler.on_modified(FileModifiedEvent(str(song)))
+        assert len(scheduler.jobs) == 1, f"{len(scheduler.jobs)} jobs for one dropped file"
+
+        def process(job, audio_file, edit=False):
+            st = audio_file.stat()
+            if edit:
+                audio_file.write_bytes(audio_file.read_bytes() + b"\1")
+            handler.index.record(audio_file, st, tmp / "result")
+
+        # Done and unchanged: later events don't queue it again
+        handler.process_audio_file = process
+        handler.run_job(scheduler.jobs[0], song)
+        handler.on_modified(FileModifiedEvent(str(song)))
+        handler.on_created(FileCreatedEvent(str(song)))
+        assert len(scheduler.jobs) == 1
+
+        # Edited while it was processed: queued once more after the run
+        handler.on_modified(FileModifiedEvent(str(song)))
+        song.write_bytes(b"RIFF" + b"\2" * 1000)
+        handler.on_modified(FileModifiedEvent(str(song)))
+        assert len(scheduler.jobs) == 2
+        handler.process_audio_file = lambda job, audio_file: process(job, audio_file, edit=True)
+        handler.run_job(scheduler.jobs[1], song)
+        assert len(scheduler.jobs) == 3
+        handler.index.close()
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
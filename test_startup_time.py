@@ -0,0 +1,158 @@
+"""
+Startup-time regression check for the CLI entry points.
+
+Each case runs a script in a fresh interpreter and measures how long it takes
+to get through argument parsing (or a fully checkpointed rerun), and which
+heavy modules got imported on the way. None of these paths need torch,
+demucs, librosa or scipy, so none of them should load them.
+
+STARTUP_BUDGET_SECONDS overrides the time budget (default 1.0).
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from testing_support import AUDIO_WORKSPACE, BACKEND, ROOT, run_tests
+
+PROCESS_TRACK = AUDIO_WORKSPACE / "process_track.py"
+
+BUDGET_SECONDS = float(os.environ.get("STARTUP_BUDGET_SECONDS", "1.0"))
+HEAVY_MODULES = ["torch", "torchaudio", "demucs", "librosa", "scipy", "numba", "soundfile", "mido"]
+
+# Runs the target with runpy inside the child so interpreter startup itself
+# isn't counted, then reports the elapsed time and the heavy modules loaded.
+PROBE = r"""
+import json, os, runpy, sys, time
+script, args, heavy = sys.argv[1], json.loads(sys.argv[2]), json.loads(sys.argv[3])
+sys.argv = [script] + args
+sys.path.insert(0, os.path.dirname(script))
+start = time.perf_counter()
+code = 0
+try:
+    runpy.run_path(script, run_name="__main__")
+except SystemExit as e:
+    code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+elapsed = time.perf_counter() - start
+loaded = [m for m in heavy if m in sys.modules]
+sys.stdout.flush()
+print("\nSTARTUP " + json.dumps({"elapsed": elapsed, "code": code, "loaded": loaded}))
+"""
+
+
+def probe(script, args=(), cwd=None):
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE, str(script), json.dumps(list(args)), json.dumps(HEAVY_MODULES)],
+        cwd=cwd, capture_output=True, text=True, encoding="utf-8",
+    )
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith("STARTUP "):
+            return json.loads(line[len("STARTUP "):])
+    raise AssertionError(f"probe of {script} failed:\n{proc.stdout}\n{proc.stderr}")
+
+
+def check(result, expected_code, label):
+    assert result["code"] == expected_code, f"{label}: exit code {result['code']}, expected {expected_code}"
+    assert not result["loaded"], f"{label}: imported {', '.join(result['loaded'])}"
+    assert result["elapsed"] < BUDGET_SECONDS, \
+        f"{label}: took {result['elapsed']:.2f}s (budget {BUDGET_SECONDS:.2f}s)"
+    print(f"  {label}: {result['elapsed'] * 1000:.0f} ms")
+
+
+def test_process_track_help():
+    check(probe(PROCESS_TRACK, ["--help"]), 0, "process_track.py --help")
+
+
+def test_process_track_usage_error():
+    check(probe(PROCESS_TRACK, []), 2, "process_track.py (no arguments)")
+
+
+def test_process_track_missing_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        check(probe(PROCESS_TRACK, [str(Path(tmp) / "missing.wav")], cwd=tmp), 1,
+              "process_track.py missing.wav")
+
+
+def test_analyze_drums_help():
+    check(probe(ROOT / "scripts" / "analyze_drums.py", ["--help"]), 0, "scripts/analyze_drums.py --help")
+
+
+def test_analyze_drums_usage_error():
+    check(probe(ROOT / "drum-logo-overlay" / "analyze_drums.py", []), 1,
+          "drum-logo-overlay/analyze_drums.py (no arguments)")
+
+
+def test_cpu_inference_help():
+    check(probe(AUDIO_WORKSPACE / "cpu_inference.py", ["--help"]), 0, "cpu_inference.py --help")
+
+
+def test_queue_worker_help():
+    check(probe(BACKEND / "queue_worker.py", ["work", "--help"]), 0, "queue_worker.py work --help")
+
+
+def write_checkpoints(tmp, precision="fp32", precision_check=None):
+    """A working directory whose stages are all current, like one a finished run left behind."""
+    sys.path.insert(0, str(AUDIO_WORKSPACE))
+    import process_track
+    from separation_pipeline.manifest import MANIFEST_NAME, StageManifest
+
+    cwd = os.getcwd()
+    # Manifest paths are relative to the working directory, like a real run.
+    os.chdir(tmp)
+    try:
+        Path("track.wav").write_bytes(b"track")
+        Path("drums.wav").write_bytes(b"drums")
+        hits = process_track.CHECKPOINT_DIR / "hits.json"
+        hits.parent.mkdir()
+        hits.write_text(json.dumps({drum: [[0.5, 1.0]] for drum in process_track.HIT_CONFIG}))
+
+        meta = {"samplerate": 44100}
+        if precision_check is not None:
+            meta["precision_check"] = precision_check
+        manifest = StageManifest(Path(MANIFEST_NAME))
+        manifest.record("separate", {"track": (tmp / "track.wav").resolve()},
+                        process_track.separation_params("standard", 1, 60.0, 5.0, precision),
+                        {"drums": Path("drums.wav")}, meta=meta)
+        manifest.record("analyze", {"drums": Path("drums.wav")},
+                        {"hit_config": process_track.HIT_CONFIG, "samplerate": 44100, "hop_length": 512},
+                        {"hits": hits})
+    finally:
+        os.chdir(cwd)
+
+
+def test_checkpointed_rerun():
+    """A rerun whose stages are all current only reads checkpoints and republishes the JSON."""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        write_checkpoints(tmp)
+        check(probe(PROCESS_TRACK, ["track.wav"], cwd=tmp), 0, "process_track.py (checkpointed rerun)")
+        assert (tmp / "drum-data.json").exists()
+        assert (tmp / "drum-data.density.npz").exists()
+
+
+def test_checkpointed_rerun_with_reduced_precision():
+    """The precision verdict comes from the checkpoint, so resuming an int8 run doesn't load torch."""
+    for used in ("int8", "fp32"):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            write_checkpoints(tmp, used, {"requested": "int8", "min_accuracy_db": 30.0, "used": used})
+            check(probe(PROCESS_TRACK, ["track.wav", "--precision", "int8"], cwd=tmp), 0,
+                  f"process_track.py --precision int8 (checkpointed rerun, ran at {used})")
+            assert (tmp / "drum-data.json").exists()
+
+
+def test_backend_package_import():
+    with tempfile.TemporaryDirectory() as tmp:
+        probe_script = Path(tmp) / "import_backend.py"
+        probe_script.write_text(
+            "import sys\n"
+            f"sys.path.insert(0, {str(BACKEND)!r})\n"
+            "from separation_pipeline import separate_for_overlay\n")
+        check(probe(probe_script), 0, "import separation_pipeline")
+
+
+if __name__ == "__main__":
+    print(f"Startup budget: {BUDGET_SECONDS:.2f}s")
+    sys.exit(run_tests(globals()))
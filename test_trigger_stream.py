@@ -0,0 +1,100 @@
+"""
+Checks for the partial hit stream and atomic publishing (trigger_stream.py).
+
+Records come out in order (start, hits with a growing ``until``, complete),
+the final JSON replaces the old one without leaving temp files, runs that
+only have hits at the end never create a stream, and two runs publishing to
+the same output don't truncate or retire each other's stream.
+"""
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+from testing_support import run_tests
+from separation_pipeline.trigger_stream import TriggerStreamWriter, partial_path_for, write_json_atomic
+
+DRUMS = ("kick", "snare")
+
+
+def read_records(path):
+    return [json.loads(line) for line in Path(path).read_text().splitlines()]
+
+
+def test_record_order():
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "drum-data.json"
+        writer = TriggerStreamWriter(output, DRUMS)
+        kicks = [[t, 1.0] for t in (0.5, 1.5, 2.5, 3.5)]
+        # A growing hit list: only hits past the previous ``until`` are written again
+        writer.append("kick", kicks[:2], 2.0)
+        writer.append("kick", kicks[:3], 3.0)
+        writer.append("snare", [], 3.0)
+        records = read_records(partial_path_for(output))
+
+        assert records[0] == {"type": "start", "drums": list(DRUMS), "started_at": records[0]["started_at"]}
+        assert [(r["drum"], r["until"], r["hits"]) for r in records[1:]] == [
+            ("kick", 2.0, kicks[:2]), ("kick", 3.0, kicks[2:3]), ("snare", 3.0, [])]
+
+        writer.append("snare", [[9.0, 1.0]], 10.0)
+        writer.abort("boom")
+        records = read_records(partial_path_for(output))
+        assert records[-1] == {"type": "failed", "reason": "boom"}
+        assert not output.exists()
+
+
+def test_commit_replaces_atomically():
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "drum-data.json"
+        write_json_atomic(output, {"kick": [[0.1, 1.0]], "snare": []})
+        final = {"kick": [[0.5, 1.0], [1.5, 0.5]], "snare": [[1.0, 1.0]]}
+
+        writer = TriggerStreamWriter(output, DRUMS)
+        writer.append("kick", final["kick"][:1], 1.0)
+        partial = partial_path_for(output)
+        partial_lines = partial.read_text()
+        writer.commit(final)
+
+        assert json.loads(output.read_text()) == final
+        # The partial file is retired and no temp files are left behind
+        assert sorted(p.name for p in Path(tmp).iterdir()) == ["drum-data.json"]
+        # Until the commit the stream held only what was appended
+        assert [r["type"] for r in map(json.loads, partial_lines.splitlines())] == ["start", "hits"]
+
+
+def test_no_stream_without_early_hits():
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "drum-data.json"
+        partial = partial_path_for(output)
+        # A stream an earlier run left behind when it failed
+        partial.write_text('{"type": "start", "drums": []}\n{"type": "failed", "reason": "boom"}\n')
+
+        TriggerStreamWriter(output, DRUMS).commit({"kick": [], "snare": []})
+        assert sorted(p.name for p in Path(tmp).iterdir()) == ["drum-data.json"]
+
+        # A live stream from another run is left alone
+        partial.write_text('{"type": "start", "drums": []}\n')
+        TriggerStreamWriter(output, DRUMS).commit({"kick": [], "snare": []})
+        assert partial.exists()
+
+
+def test_concurrent_runs_keep_their_own_stream():
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "drum-data.json"
+        first, second = TriggerStreamWriter(output, DRUMS), TriggerStreamWriter(output, DRUMS)
+        first.append("kick", [[0.5, 1.0]], 1.0)
+        second.append("kick", [[0.7, 1.0]], 1.0)
+        first.append("kick", [[0.5, 1.0], [1.5, 1.0]], 2.0)
+
+        # The newest run owns the path, and the first run's commit doesn't retire it
+        first.commit({"kick": [[0.5, 1.0], [1.5, 1.0]], "snare": []})
+        records = read_records(partial_path_for(output))
+        assert [r.get("hits") for r in records] == [None, [[0.7, 1.0]]]
+
+        second.commit({"kick": [[0.7, 1.0]], "snare": []})
+        assert not partial_path_for(output).exists()
+        assert json.loads(output.read_text())["kick"] == [[0.7, 1.0]]
+
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,31 @@
+"""
+Shared setup for the root-level test_*.py checks.
+
+Each check runs under pytest or directly (``python test_<name>.py``, which
+calls run_tests()). Importing this module puts the backend package on the
+path; checks that need the audio-workspace scripts add AUDIO_WORKSPACE
+themselves, since it holds modules named like the root-level scripts.
+"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+AUDIO_WORKSPACE = ROOT / "drum-overlay-system" / "audio-workspace"
+BACKEND = ROOT / "drum-overlay-system" / "backend"
+
+if str(BACKEND) not in sys.path:
+    sys.path.insert(0, str(BACKEND))
+
+
+def run_tests(namespace) -> int:
+    """Run every test_* function in ``namespace`` (a module's globals()); returns the exit code."""
+    failures = 0
+    for name, fn in list(namespace.items()):
+        if name.startswith("test_") and callable(fn):
+            try:
+                fn()
+                print(f"  ✓ {name}")
+            except AssertionError as e:
+                failures += 1
+                print(f"  ✗ {name}: {e}")
+    return 1 if failures else 0